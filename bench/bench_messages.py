@@ -0,0 +1,58 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Microbenchmark of the byte template message builders against the former
+str.format() builders (which also needed CR-LF appended and the result
+encoded) for the send-heavy commands.
+
+Run from the repository root: ``python -m bench.bench_messages``
+"""
+
+import timeit
+
+from fredirc import messages
+from fredirc.messages import Cmd
+
+NUMBER = 200000
+TEXT = 'The quick brown fox jumps over the lazy dog – schöne Grüße'
+
+
+def _format_privmsg(target, message):
+    line = ':{sender} {msg_cmd} {target} :{message}'.format(
+        sender='', msg_cmd=Cmd.PRIVMSG, target=target, message=message)
+    return (line + '\r\n').encode('utf-8')
+
+
+def _format_join(channels):
+    line = '{join_cmd} {channels}'.format(
+        join_cmd=Cmd.JOIN, channels=','.join(channels))
+    return (line + '\r\n').encode('utf-8')
+
+
+def _format_pong(server):
+    line = '{pong_cmd} :{server}'.format(pong_cmd=Cmd.PONG, server=server)
+    return (line + '\r\n').encode('utf-8')
+
+
+CASES = [
+    ('privmsg', lambda: _format_privmsg('#channel', TEXT),
+     lambda: messages.privmsg('#channel', TEXT)),
+    ('join', lambda: _format_join(['#a', '#b', '#c']),
+     lambda: messages.join(['#a', '#b', '#c'])),
+    ('pong', lambda: _format_pong('irc.example.com'),
+     lambda: messages.pong('irc.example.com')),
+]
+
+
+def main():
+    for name, old, new in CASES:
+        old_time = timeit.timeit(old, number=NUMBER) / NUMBER
+        new_time = timeit.timeit(new, number=NUMBER) / NUMBER
+        print('{:8} str.format: {:5.2f} us  templates: {:5.2f} us'.format(
+            name, old_time * 1e6, new_time * 1e6))
+
+
+if __name__ == '__main__':
+    main()
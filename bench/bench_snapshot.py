@@ -0,0 +1,56 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Benchmark of writing and loading state snapshots with 1000 channels.
+
+Run from the repository root: ``python -m bench.bench_snapshot``
+"""
+
+import os
+import tempfile
+import time
+
+from fredirc import snapshot
+from fredirc.client import IRCClientState
+from fredirc.info import ChannelInfo
+
+CHANNELS = 1000
+MEMBERS = 100
+ROUNDS = 10
+
+
+def _state():
+    state = IRCClientState()
+    state.isupport = {'CHANTYPES': '#', 'PREFIX': '(ov)@+', 'NICKLEN': '30'}
+    for i in range(CHANNELS):
+        info = ChannelInfo('#channel{}'.format(i))
+        info._set_topic('Topic of channel {}'.format(i))
+        info._add_nicks(*('nick{}'.format((i + j) % 5000)
+                          for j in range(MEMBERS)))
+        state.channels[info.name] = info
+    return state
+
+
+def main():
+    state = _state()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'state.json')
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            snapshot.write_snapshot(state, path)
+        write_time = (time.perf_counter() - start) / ROUNDS
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            snapshot.read_snapshot(IRCClientState(), path)
+        read_time = (time.perf_counter() - start) / ROUNDS
+        size = os.path.getsize(path)
+    print('{} channels with {} members, {} KiB'.format(
+        CHANNELS, MEMBERS, size // 1024))
+    print('write: {:.1f} ms'.format(write_time * 1000))
+    print('load:  {:.1f} ms'.format(read_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
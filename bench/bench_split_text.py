@@ -0,0 +1,48 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Benchmark of splitting large pastes into lines that fit into IRC messages.
+
+Run from the repository root: ``python -m bench.bench_split_text``
+"""
+
+import random
+import time
+
+from fredirc import messages
+
+# Text length of a PRIVMSG to a channel with a typical prefix
+MAX_BYTES = 420
+ROUNDS = 5
+
+
+def _pastes():
+    rng = random.Random(0)
+    words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'größer', 'über',
+             '日本語', 'テキスト', '\x02bold\x02', '\x1ditalic\x1d', '😀']
+    prose = ' '.join(rng.choice(words) for _ in range(200000))
+    code = '\n'.join('    ' + ' '.join(rng.choice(words)
+                                        for _ in range(rng.randint(0, 30)))
+                     for _ in range(20000))
+    return [('prose', prose),
+            ('code', code),
+            ('one word', 'x' * 1000000),
+            ('multi-byte word', '日本' * 500000)]
+
+
+def main():
+    for name, text in _pastes():
+        size = len(text.encode('utf-8'))
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            lines = messages.split_text(text, MAX_BYTES)
+        elapsed = (time.perf_counter() - start) / ROUNDS
+        print('{:16} {:6.2f} MB {:6} lines {:7.1f} ms {:6.1f} MB/s'.format(
+            name, size / 1e6, len(lines), elapsed * 1000,
+            size / 1e6 / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Benchmark of 100k pending calls in a TimerWheel and as timers of the event
+loop (``loop.call_later()``): time to schedule, cancel and run them, the
+memory they take and the number of times the event loop wakes up.
+
+Run from the repository root: ``python -m bench.bench_timer_wheel``
+"""
+
+import asyncio
+import random
+import time
+import tracemalloc
+
+from fredirc.task import TimerWheel
+
+TIMERS = 100000
+# Delays of the calls that are run, in seconds
+RUN_DELAY = 1.0
+# Delays of the calls that are only scheduled and cancelled
+LONG_DELAY = 3600.0
+
+
+def _callback(counter):
+    counter[0] += 1
+
+
+def _measure(loop, schedule):
+    delays = [random.uniform(0.0, LONG_DELAY) for _ in range(TIMERS)]
+    counter = [0]
+    tracemalloc.start()
+    handles = [schedule(delay, _callback, counter) for delay in delays]
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    for handle in handles:
+        handle.cancel()
+    # Let the loop drop the cancelled timers
+    loop.run_until_complete(asyncio.sleep(0))
+    start = time.perf_counter()
+    handles = [schedule(delay, _callback, counter) for delay in delays]
+    schedule_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for handle in handles:
+        handle.cancel()
+    cancel_time = time.perf_counter() - start
+    loop.run_until_complete(asyncio.sleep(0))
+
+    wakeups = [0]
+    run_once = loop._run_once
+
+    def counting_run_once():
+        wakeups[0] += 1
+        run_once()
+    loop._run_once = counting_run_once
+    start = time.perf_counter()
+    for _ in range(TIMERS):
+        schedule(random.uniform(0.0, RUN_DELAY), _callback, counter)
+    loop.run_until_complete(asyncio.sleep(RUN_DELAY + 0.2))
+    run_time = time.perf_counter() - start - RUN_DELAY - 0.2
+    del loop._run_once
+    assert counter[0] == TIMERS
+    return schedule_time, cancel_time, memory, run_time, wakeups[0]
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = [('call_later', _measure(loop, loop.call_later)),
+               ('TimerWheel', _measure(loop, TimerWheel().schedule))]
+    loop.close()
+    print('{} timers'.format(TIMERS))
+    for name, (schedule_time, cancel_time, memory, run_time, wakeups) \
+            in results:
+        print('{:<10}  schedule: {:5.0f} ms  cancel: {:4.0f} ms  '
+              'memory: {:5.1f} MiB  run: {:5.0f} ms  wakeups: {}'.format(
+                  name, schedule_time * 1000, cancel_time * 1000,
+                  memory / 2 ** 20, run_time * 1000, wakeups))
+
+
+if __name__ == '__main__':
+    main()
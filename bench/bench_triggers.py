@@ -0,0 +1,93 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Benchmark of a TriggerEngine with 10k keywords and 10k regular expressions:
+time to add them, to add one more keyword between messages and throughput of
+scanning messages.
+
+Run from the repository root: ``python -m bench.bench_triggers``
+"""
+
+import random
+import string
+import time
+
+from fredirc.triggers import TriggerEngine
+
+PATTERNS = 10000
+CHANNELS = 100
+MESSAGES = 2000
+ROUNDS = 100
+
+
+def _word(length):
+    return ''.join(random.choice(string.ascii_lowercase)
+                   for _ in range(length))
+
+
+def _callback(channel, message, sender, match):
+    pass
+
+
+def _messages():
+    return [' '.join(_word(random.randint(2, 8)) for _ in range(12))
+            for _ in range(MESSAGES)]
+
+
+def _scan_rate(engine, messages):
+    start = time.perf_counter()
+    for i, message in enumerate(messages):
+        engine.scan(message, '#channel{}'.format(i % CHANNELS))
+    return len(messages) / (time.perf_counter() - start)
+
+
+def _add_latency(engine, message):
+    """ Average time to add a keyword and scan the next message. """
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        engine.add_keyword(_word(6), _callback)
+        engine.scan(message)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def _keywords(channels):
+    engine = TriggerEngine()
+    start = time.perf_counter()
+    for i in range(PATTERNS):
+        engine.add_keyword(
+            _word(random.randint(4, 10)), _callback,
+            channels=['#channel{}'.format(i % CHANNELS)] if channels else None)
+    add_time = time.perf_counter() - start
+    return engine, add_time
+
+
+def main():
+    random.seed(0)
+    messages = _messages()
+    print('{} keywords for all channels'.format(PATTERNS))
+    engine, add_time = _keywords(False)
+    print('  add all:          {:8.1f} ms'.format(add_time * 1000))
+    print('  scan:             {:8.0f} messages/s'.format(
+        _scan_rate(engine, messages)))
+    print('  add one and scan: {:8.2f} ms'.format(
+        _add_latency(engine, messages[0]) * 1000))
+    print('{} keywords in {} channels'.format(PATTERNS, CHANNELS))
+    engine, add_time = _keywords(True)
+    print('  add all:          {:8.1f} ms'.format(add_time * 1000))
+    print('  scan:             {:8.0f} messages/s'.format(
+        _scan_rate(engine, messages)))
+    print('{} regular expressions for all channels'.format(PATTERNS))
+    engine = TriggerEngine()
+    start = time.perf_counter()
+    for _ in range(PATTERNS):
+        engine.add_regex(r'\b{}\d+'.format(_word(5)), _callback)
+    print('  add all:          {:8.1f} ms'.format(
+        (time.perf_counter() - start) * 1000))
+    print('  scan:             {:8.0f} messages/s'.format(
+        _scan_rate(engine, messages)))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,22 +2,44 @@
 #
 # Distributed under terms of the (2-clause) BSD license.
 
+from .cache import *
 from .client import *
+from .commands import *
 from .errors import *
+from .events import *
 from .handler import *
+from .handoff import *
+from .hostmask import *
 from .info import *
 from .messages import *
+from .outbound import *
 from .parsing import *
+from .plugins import *
 from .processor import *
+from .ratelimit import *
+from .snapshot import *
+from .stream import *
 from .task import *
+from .triggers import *
 
 __all__ = (
+        cache.__all__ +
         client.__all__ +
+        commands.__all__ +
         errors.__all__ +
+        events.__all__ +
         handler.__all__ +
+        handoff.__all__ +
+        hostmask.__all__ +
         info.__all__ +
         messages.__all__ +
+        outbound.__all__ +
         parsing.__all__ +
+        plugins.__all__ +
         processor.__all__ +
-        task.__all__ )
+        ratelimit.__all__ +
+        snapshot.__all__ +
+        stream.__all__ +
+        task.__all__ +
+        triggers.__all__ )
 
@@ -0,0 +1,130 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Caching of responses to bot commands.
+"""
+
+__all__ = ['ResponseCache']
+
+import asyncio
+import collections
+import time
+
+from fredirc.task import _ensure_future
+
+
+class ResponseCache(object):
+    """ A cache for results of functions, e.g. the responses of bot commands
+    (see :py:meth:`CommandRouter.add_command()<.CommandRouter.add_command>`).
+
+    Results expire ``ttl`` seconds after they were computed. If the cache is
+    full, the least recently used result is evicted.
+
+    Functions may return coroutines. While such a coroutine runs, further
+    requests for the same key don't start another one but share its result
+    (single-flight). Results of coroutines that raise an exception are not
+    cached.
+
+    Args:
+        max_size (int): maximum number of cached results
+        ttl (float): time in seconds a result is valid
+    """
+
+    def __init__(self, max_size=1000, ttl=60.0):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1.')
+        if ttl <= 0.0:
+            raise ValueError('ttl must be greater than 0.')
+        self._max_size = max_size
+        self._ttl = ttl
+        # key: key, value: (time.monotonic() of expiry, result), least
+        # recently used first
+        self._results = collections.OrderedDict()
+        # Futures of coroutines that are running.
+        # key: key, value: asyncio.Future
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key, func, *args):
+        """ Return the cached result for a key or compute it via
+        ``func(*args)``.
+
+        Args:
+            key: hashable key of the result
+            func (callable): function that computes the result
+            args: arguments for the function
+        Returns:
+            the result or, if the function returned a coroutine, an
+            :py:class:`asyncio.Future` of the result
+        """
+        entry = self._results.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._results.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._results[key]
+        future = self._pending.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return future
+        self.misses += 1
+        result = func(*args)
+        if asyncio.iscoroutine(result):
+            future = _ensure_future(result)
+            self._pending[key] = future
+            future.add_done_callback(
+                lambda future: self._complete(key, future))
+            return future
+        self._store(key, result)
+        return result
+
+    def invalidate(self, key):
+        """ Remove the cached result for a key. Has no effect if there is
+        none.
+        """
+        self._results.pop(key, None)
+
+    def clear(self):
+        """ Remove all cached results. """
+        self._results.clear()
+
+    def stats(self):
+        """ Return the statistics of the cache.
+
+        Returns:
+            dict: numbers of ``'hits'``, ``'misses'``, requests that shared
+            the result of a running coroutine (``'coalesced'``), results that
+            were evicted because the cache was full (``'evictions'``) and the
+            current number of cached results (``'size'``)
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'size': len(self._results)}
+
+    def __len__(self):
+        return len(self._results)
+
+    def __contains__(self, key):
+        entry = self._results.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def _store(self, key, result):
+        self._results[key] = (time.monotonic() + self._ttl, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self._max_size:
+            self._results.popitem(last=False)
+            self.evictions += 1
+
+    def _complete(self, key, future):
+        if self._pending.get(key) is future:
+            del self._pending[key]
+        if not future.cancelled() and future.exception() is None:
+            self._store(key, future.result())
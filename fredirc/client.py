@@ -10,16 +10,34 @@ __all__ = ['IRCClient']
 
 import asyncio
 import codecs
+import collections
 import logging
 import time
 
+from fredirc import handoff
 from fredirc import messages
+from fredirc import parsing
+from fredirc import snapshot
 from fredirc.errors import ConnectionTimeoutError
+from fredirc.errors import FredIRCError
+from fredirc.handler import _ignores
+from fredirc.hostmask import HostmaskMatcher
+from fredirc.info import SyncPolicy
+from fredirc.info import _ChannelDict
 from fredirc.info import _ReadOnlyDict
 from fredirc.messages import ChannelMode
+from fredirc.messages import Cmd
+from fredirc.outbound import CommandCoalescer
+from fredirc.outbound import FloodControl
+from fredirc.outbound import OutboundQueue
 from fredirc.parsing import ChannelModeChange
 from fredirc.processor import MessageProcessor
+from fredirc.ratelimit import InboundRateLimiter
+from fredirc.stream import EventStream
+from fredirc.stream import Overflow
+from fredirc.stream import _create_event
 from fredirc.task import Task
+from fredirc.task import TimerWheel
 
 
 class IRCClient(asyncio.Protocol):
@@ -78,12 +96,39 @@ class IRCClient(asyncio.Protocol):
                  password=None):
         asyncio.Protocol.__init__(self)
         self._handler = handler
+        # Object the events are passed to: the handler or an _EventTap that
+        # also passes them to the event streams
+        self._dispatch_handler = handler
+        self._transport = None
         self._state = IRCClientState()
         self._buffer = []
         self._last_broken_message = None
         # Variable to determine if we want to reconnect the transport and
         # re-run the event loop automatically after it was stopped:
         self._reconnect = False
+        # File and Task for periodic state snapshots (see
+        # enable_state_snapshots())
+        self._snapshot_path = None
+        self._snapshot_task = None
+        # FloodControl for outgoing messages or None if disabled
+        self._flood_control = None
+        # CommandCoalescer for JOIN, PART and MODE or None if disabled
+        self._coalescer = None
+        # OutboundQueue for messages that can't be sent or None if disabled
+        self._outbound_queue = None
+        # State of the client when the outbound queue was last flushed
+        self._outbound_queue_flushed = None
+        # TimerWheel for delayed messages, created on first use
+        self._timer_wheel = None
+        # Whether the connection was passed to or is taken over from another
+        # process (see hand_off())
+        self._handing_off = False
+        self._handed_off = False
+        # Handoff data of the predecessor until the connection is taken over
+        self._adoption = None
+        # Open EventStreams and those whose queue is full (see events())
+        self._streams = []
+        self._full_streams = set()
         # Register customized decoding error handler
         codecs.register_error('log_and_replace', self._decoding_error_handler)
         # Configure logger
@@ -96,8 +141,9 @@ class IRCClient(asyncio.Protocol):
         self.enable_logging(True)
         self._logger.info('Initializing IRC client')
         # Init message processor
-        self._processor = MessageProcessor(self._handler, self._state,
-                                           self._logger)
+        self._processor = MessageProcessor(
+            self._dispatch_handler, self._state, self._logger,
+            self._handle_exception)
         # Connection and registration info
         self._configured_nick = nick
         self._configured_server = server
@@ -108,7 +154,7 @@ class IRCClient(asyncio.Protocol):
         # Pass this client object to the handler
         self._handler.handle_client_init(self)
 
-    def run(self):
+    def run(self, handoff_path=None, handoff_timeout=None):
         """ Start the client's event loop.
 
         An endless event loop which will call the ``handle_*`` methods from
@@ -119,17 +165,32 @@ class IRCClient(asyncio.Protocol):
         exiting the event loop via :py:meth:`reconnect()<.reconnect>`.
         To terminate the event loop use :py:meth:`terminate()<.terminate>`.
         Afterwards run() will return.
+
+        Instead of connecting to the server, the client can take over the
+        connection of another process that calls :py:meth:`.hand_off`.
+
+        Args:
+            handoff_path (str): path of a Unix socket on which the client
+                                waits for the connection of another process
+            handoff_timeout (float): time in seconds to wait for the
+                                     connection or None to wait forever
         """
         loop = asyncio.get_event_loop()
         if not loop.is_running():
             try:
                 while True:
                     self._reconnect = False
-                    self._connect()
+                    if handoff_path:
+                        self._adopt(handoff_path, handoff_timeout)
+                        handoff_path = None
+                    else:
+                        self._connect()
                     loop.run_forever()
                     if not self._reconnect:
                         break
             finally:
+                if self._snapshot_path:
+                    self._write_snapshot()
                 loop.close()
 
     def reconnect(self, delay=0.0):
@@ -177,6 +238,499 @@ class IRCClient(asyncio.Protocol):
         """
         self._logger.setLevel(level)
 
+    def enable_state_snapshots(self, path, interval=300.0):
+        """ Persist the client's state to a file and restore it on startup.
+
+        If the file already exists, the snapshot is loaded immediately. This
+        restores channels (including topic and members) and the
+        server's ISUPPORT information, so that handlers can answer queries
+        (e.g. via :py:attr:`.channel_info`) right after a restart, while the
+        client rejoins the channels and synchronizes them with the server.
+        Restored channels are marked as
+        :py:attr:`restored<.ChannelInfo.restored>` until
+        :py:meth:`handle_own_join()<.IRCHandler.handle_own_join>` was called
+        for them. Since they are contained in :py:attr:`.channels`, a handler
+        can rejoin all of them at once in
+        :py:meth:`handle_register()<.IRCHandler.handle_register>`.
+
+        Afterwards a snapshot is written every ``interval`` seconds, when the
+        connection is lost and when :py:meth:`.run` returns.
+        Call this method before :py:meth:`.run`.
+
+        Args:
+            path (str): path of the snapshot file
+            interval (float): time between two snapshots in seconds
+        """
+        self._snapshot_path = path
+        try:
+            if snapshot.read_snapshot(self._state, path):
+                self._logger.info('Restored client state from {}'.format(path))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self._logger.error(
+                'Cannot restore client state from {}: {}'.format(path, e))
+        if self._snapshot_task:
+            self._snapshot_task.stop()
+        self._snapshot_task = Task(interval, True, lambda: self._write_snapshot())
+        self._snapshot_task.start()
+
+    def enable_names_streaming(self, enable):
+        """ Enable or disable streaming of channel members.
+
+        When the client joins a channel, the server sends the channel's
+        members in possibly many chunks.
+        :py:meth:`handle_own_join()<.IRCHandler.handle_own_join>` is called
+        only after the last one was received. If streaming is enabled, each
+        chunk is additionally passed to
+        :py:meth:`handle_channel_members()<.IRCHandler.handle_channel_members>`
+        as soon as it arrives.
+
+        Streaming is disabled by default.
+
+        Args:
+            enable (bool): ``True`` to enable streaming, ``False`` disable it
+        """
+        self._processor.stream_names = enable
+
+    def set_pending_channel_timeout(self, timeout):
+        """ Set the time to wait for the complete member list of a joined
+        channel.
+
+        If the end of the member list is not received in time, the channel is
+        considered joined anyway and
+        :py:meth:`handle_own_join()<.IRCHandler.handle_own_join>` is called.
+
+        Args:
+            timeout (float): time in seconds (default: 60)
+        """
+        if timeout < 0.0:
+            raise ValueError('timeout must not be negative.')
+        self._processor.pending_channel_timeout = timeout
+
+    def set_sync_policy(self, policy, *channels):
+        """ Define how much information about channel members is tracked.
+
+        Tracking the members of many large channels needs a lot of memory and
+        delays :py:meth:`handle_own_join()<.IRCHandler.handle_own_join>` until
+        the complete member list was received. Bots that don't need this
+        information can reduce the tracking via a
+        :py:class:`SyncPolicy<fredirc.SyncPolicy>`.
+
+        The policy applies to channels that are joined afterwards.
+
+        Args:
+            policy (str): one of the constants of
+                          :py:class:`SyncPolicy<fredirc.SyncPolicy>`
+            channels (str): channels (case-insensitive) the policy applies
+                            to. If no channel is given, the policy is used for
+                            all channels without an explicit policy.
+        """
+        if policy not in (SyncPolicy.FULL, SyncPolicy.COUNT, SyncPolicy.NONE):
+            raise ValueError('Unknown sync policy: {}'.format(policy))
+        if channels:
+            for channel in channels:
+                self._processor._set_sync_policy(channel, policy)
+        else:
+            self._processor.sync_policy = policy
+
+    def enable_netsplit_detection(self, enable, window=1.0):
+        """ Enable or disable the detection of netsplits.
+
+        A netsplit results in QUIT messages for all users on the servers
+        that split off, and a JOIN message per user and channel when they
+        return. If detection is enabled, these are collected and passed to
+        :py:meth:`handle_netsplit()<.IRCHandler.handle_netsplit>` and
+        :py:meth:`handle_netjoin()<.IRCHandler.handle_netjoin>` all at once,
+        instead of calling
+        :py:meth:`handle_quit()<.IRCHandler.handle_quit>` and
+        :py:meth:`handle_join()<.IRCHandler.handle_join>` for each of them.
+
+        Detection is disabled by default.
+
+        Args:
+            enable (bool): ``True`` to enable detection, ``False`` disable it
+            window (float): time in seconds to collect the messages of a
+                            netsplit or netjoin before the handler is called
+        """
+        if window < 0.0:
+            raise ValueError('window must not be negative.')
+        self._processor.netsplit_window = window
+        self._processor.detect_netsplits = enable
+        if not enable:
+            self._processor._flush_netsplits()
+
+    def request_mask_list(self, channel, mode=ChannelMode.BAN):
+        """ Request the bans, ban exceptions or invite exceptions of a
+        channel from the server.
+
+        The list is stored in the channel's :py:class:`.ChannelInfo` (e.g.
+        :py:attr:`ChannelInfo.bans<.ChannelInfo.bans>`) and kept up to date
+        from mode changes afterwards, so it only needs to be requested once
+        after joining a channel (see :py:attr:`MaskList.complete<.MaskList.complete>`).
+
+        Args:
+            channel (str): the channel
+            mode (str): ``ChannelMode.BAN`` (``'b'``),
+                        ``ChannelMode.BAN_EXCEPTION`` (``'e'``) or
+                        ``ChannelMode.INVITE_EXCEPTION`` (``'I'``)
+        """
+        self._send_message(messages.channel_mode_list(channel, mode))
+
+    def ignore(self, *masks):
+        """ Ignore messages from users.
+
+        Channel and private messages of users that match one of the
+        hostmasks are dropped before any handler is called. Joins, parts etc.
+        of these users are still processed.
+
+        Args:
+            masks (str): hostmasks like ``nick``, ``*!*@*.example.com`` or
+                         ``nick!user@host`` (see
+                         :py:class:`HostmaskMatcher<fredirc.HostmaskMatcher>`)
+        """
+        if self._processor.ignore_list is None:
+            self._processor.ignore_list = HostmaskMatcher(
+                self._state.isupport.get('CASEMAPPING', 'rfc1459'))
+        for mask in masks:
+            self._processor.ignore_list.add(mask)
+
+    def unignore(self, *masks):
+        """ Stop ignoring messages from users.
+
+        Args:
+            masks (str): hostmasks previously passed to :py:meth:`.ignore`
+        """
+        if self._processor.ignore_list is not None:
+            for mask in masks:
+                self._processor.ignore_list.remove(mask)
+
+    def enable_rate_limiting(self, enable, user_burst=5, user_interval=1.0,
+                             channel_burst=20, channel_interval=0.25,
+                             max_entries=10000):
+        """ Enable or disable limiting the rate of incoming channel and
+        private messages.
+
+        With rate limiting enabled, each user may send up to ``user_burst``
+        messages at once and afterwards one message every ``user_interval``
+        seconds. Likewise each channel may receive up to ``channel_burst``
+        messages at once and afterwards one every ``channel_interval``
+        seconds. Messages exceeding these rates are dropped before any
+        handler is called. Users are identified by ``user@host``, so nick
+        changes don't reset their limit.
+
+        The rates of at most ``max_entries`` users and channels are tracked;
+        the least recently active ones are forgotten first. The numbers of
+        dropped messages are available via :py:meth:`.rate_limit_stats`.
+
+        Rate limiting is disabled by default.
+
+        Args:
+            enable (bool): ``True`` to enable rate limiting, ``False``
+                           disable it
+            user_burst (int): number of messages a user may send at once
+            user_interval (float): time in seconds per message of a user
+                                   when the burst is exhausted
+            channel_burst (int): number of messages a channel may receive at
+                                 once
+            channel_interval (float): time in seconds per message of a
+                                      channel when the burst is exhausted
+            max_entries (int): maximum number of users and of channels to
+                               track
+        """
+        if enable:
+            self._processor.rate_limiter = InboundRateLimiter(
+                self._logger, user_burst, user_interval, channel_burst,
+                channel_interval, max_entries)
+        else:
+            self._processor.rate_limiter = None
+
+    def rate_limit_stats(self):
+        """ Numbers of messages dropped by rate limiting (see
+        :py:meth:`.enable_rate_limiting`).
+
+        Returns:
+            dict: the total number of dropped messages (``'dropped'``) and
+            dicts that map users (``user@host``) and channels (both in lower
+            case) to their number of dropped messages (``'users'`` and
+            ``'channels'``), for the users and channels that are still
+            tracked. ``None`` if rate limiting is disabled.
+        """
+        if self._processor.rate_limiter is None:
+            return None
+        return self._processor.rate_limiter.stats()
+
+    def enable_mode_batching(self, enable, window=0.0):
+        """ Enable or disable batching of channel mode changes.
+
+        If batching is enabled, all changes of a MODE message are passed to
+        :py:meth:`handle_mode_changes()<.IRCHandler.handle_mode_changes>` at
+        once, instead of calling a handler (e.g.
+        :py:meth:`handle_got_op()<.IRCHandler.handle_got_op>`) per change.
+        With a ``window`` greater than 0, the changes of all MODE messages
+        received within that time are collected per channel and initiator,
+        which reduces the number of calls during mode bursts even further.
+        Collected changes are passed on early when someone leaves a channel.
+
+        Batching is disabled by default.
+
+        Args:
+            enable (bool): ``True`` to enable batching, ``False`` disable it
+            window (float): time in seconds to collect mode changes
+        """
+        if window < 0.0:
+            raise ValueError('window must not be negative.')
+        self._processor.mode_batch_window = window
+        self._processor.batch_modes = enable
+        self._processor._flush_mode_batches()
+
+    def enable_message_batching(self, enable, max_size=1000):
+        """ Enable or disable batching of channel messages.
+
+        If batching is enabled, channel messages are collected during an
+        iteration of the event loop and passed to
+        :py:meth:`handle_channel_messages()<.IRCHandler.handle_channel_messages>`
+        at once, instead of calling
+        :py:meth:`handle_channel_message()<.IRCHandler.handle_channel_message>`
+        per message. This suits handlers that process many messages in bulk,
+        e.g. to insert them into a database. A batch is passed on early when
+        it reaches ``max_size`` messages or before any other event, so the
+        order of events is kept.
+
+        Note that handlers like the :py:class:`.CommandRouter` only handle
+        single channel messages.
+
+        Batching is disabled by default.
+
+        Args:
+            enable (bool): ``True`` to enable batching, ``False`` disable it
+            max_size (int): maximum number of messages in a batch
+        """
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1.')
+        self._processor._flush_message_batch()
+        self._processor.message_batch_size = max_size
+        self._processor.batch_messages = enable
+
+    def enable_flood_control(self, enable, burst=5, interval=2.0):
+        """ Enable or disable limiting the rate of outgoing messages.
+
+        Servers usually disconnect clients that send too many messages in a
+        short time. With flood control enabled, up to ``burst`` messages are
+        sent at once and afterwards one message every ``interval`` seconds.
+        Exceeding messages are queued and sent in order. Queued messages
+        are discarded when the connection is lost.
+
+        Flood control is disabled by default.
+
+        Args:
+            enable (bool): ``True`` to enable flood control, ``False`` disable
+                           it
+            burst (int): number of messages that may be sent at once
+            interval (float): time in seconds between two messages when the
+                              burst is exhausted
+        """
+        queued = (self._flood_control.clear()
+                  if self._flood_control is not None else [])
+        if enable:
+            self._flood_control = FloodControl(self._write, burst, interval)
+        else:
+            self._flood_control = None
+        for data in queued:
+            self._write_or_throttle(data)
+
+    def enable_command_coalescing(self, enable, window=0.2):
+        """ Enable or disable merging of JOIN, PART and MODE commands.
+
+        If enabled, :py:meth:`.join`, :py:meth:`.part`, :py:meth:`.give_op`,
+        :py:meth:`.revoke_op`, :py:meth:`.give_voice` and
+        :py:meth:`.revoke_voice` don't send their command immediately.
+        Instead the commands of ``window`` seconds are collected and
+        merged into as few messages as possible:
+
+        * Channels to join or part are sent as comma separated lists.
+        * Mode changes of a channel are combined up to the number of modes
+          per message the server permits (see ISUPPORT token MODES).
+          Of several changes of the same mode for the same user only the
+          last one is sent.
+
+        Coalescing is disabled by default.
+
+        Args:
+            enable (bool): ``True`` to enable coalescing, ``False`` disable it
+            window (float): time in seconds to collect commands
+        """
+        if self._coalescer is not None:
+            self._coalescer.flush()
+        if enable:
+            self._coalescer = CommandCoalescer(
+                self._send_message, window, self._max_targets,
+                self._max_modes, self._processor._casemapping)
+        else:
+            self._coalescer = None
+
+    def enable_outbound_queue(self, enable, max_size=1000, ttl=300.0,
+                              path=None):
+        """ Enable or disable queueing of messages while the client is
+        disconnected.
+
+        Without the queue, channel and private messages that are sent while
+        the client is not connected and registered to a server are lost.
+        With the queue enabled, they are held back and sent (through flood
+        control, if enabled) once the client is registered again. Messages to
+        a channel are sent after the client rejoined it.
+
+        Messages that could not be sent within ``ttl`` seconds are discarded,
+        as well as the oldest messages if more than ``max_size`` are queued.
+        If a ``path`` is given, the queue is additionally stored in that file
+        and loaded from it, so that messages even survive a restart.
+
+        The queue is disabled by default.
+
+        Args:
+            enable (bool): ``True`` to enable the queue, ``False`` disable it
+            max_size (int): maximum number of queued messages
+            ttl (float): time in seconds after which a message is discarded
+            path (str): optional path of a file that backs the queue
+        """
+        if enable:
+            self._outbound_queue = OutboundQueue(max_size, ttl, path)
+        else:
+            self._outbound_queue = None
+        self._outbound_queue_flushed = None
+
+    def pause_events(self, max_events=10000):
+        """ Stop passing events to the handler and record them instead.
+
+        Messages are still received and processed, so the client's state
+        (channels, members, ...) stays up to date. The recorded events are
+        passed to the handler by :py:meth:`.resume_events`.
+
+        Args:
+            max_events (int): maximum number of recorded events. If more
+                              events occur, the oldest ones are discarded
+                              and their number is logged on resume.
+        """
+        if isinstance(self._handler, _EventRecorder):
+            return
+        self._set_handler(_EventRecorder(self._handler, max_events))
+
+    def resume_events(self, handler=None):
+        """ Pass the events recorded since :py:meth:`.pause_events` to the
+        handler and continue passing events to it.
+
+        Args:
+            handler (IRCHandler): a new handler that replaces the current one
+                                  or None to keep the current handler
+        """
+        recorder = self._handler
+        if not isinstance(recorder, _EventRecorder):
+            if handler is not None:
+                self.replace_handler(handler)
+            return
+        if handler is None:
+            handler = recorder.handler
+        else:
+            handler.handle_client_init(self)
+        self._set_handler(handler)
+        if recorder.dropped:
+            self._logger.warning(
+                'Too many paused events, discarded the oldest {}.'.format(
+                    recorder.dropped))
+        for name, args, kwargs in recorder.events:
+            getattr(handler, name)(*args, **kwargs)
+
+    def events(self, names=None, filter=None, max_size=1000,
+               overflow=Overflow.PAUSE):
+        """ Open a stream of the client's events for ``async for``.
+
+        The events are passed to the handler as usual and queued in the
+        stream as :py:class:`.Event` objects. See :py:class:`.EventStream`.
+
+        Args:
+            names (iterable of str): names of the events to receive (the
+                                     handler methods of
+                                     :py:class:`.IRCHandler` without the
+                                     ``handle_`` prefix, e.g.
+                                     ``'channel_message'``) or None for all
+                                     events
+            filter (callable): function that is called with each event and
+                               returns whether the stream receives it, or
+                               None
+            max_size (int): maximum number of queued events
+            overflow (str): what happens when the queue is full, one of the
+                            :py:class:`.Overflow` policies
+        Returns:
+            EventStream: the stream. Close it via
+            :py:meth:`EventStream.close()<.EventStream.close>` when it is not
+            needed any more.
+        """
+        stream = EventStream(self, names, filter, max_size, overflow)
+        self._streams.append(stream)
+        if len(self._streams) == 1:
+            self._set_handler(self._handler)
+        return stream
+
+    def replace_handler(self, handler):
+        """ Replace the handler while the client is running, e.g. with an
+        instance of a reloaded handler class.
+
+        The connection and the client's state are kept; the new handler
+        receives :py:meth:`handle_client_init()<.IRCHandler.handle_client_init>`,
+        but not the events that already happened (like
+        :py:meth:`handle_connect()<.IRCHandler.handle_connect>`). If events
+        are paused, they are passed to the new handler when they are resumed.
+
+        Args:
+            handler (IRCHandler): the new handler
+        """
+        if isinstance(self._handler, _EventRecorder):
+            self._handler.handler = handler
+            handler.handle_client_init(self)
+            return
+        self.pause_events()
+        self.resume_events(handler)
+
+    def hand_off(self, path, timeout=10.0):
+        """ Pass the connection to the server to another process and
+        terminate the event loop, e.g. to upgrade a bot without reconnecting.
+
+        The other process must wait for the connection via
+        :py:meth:`run(handoff_path=path)<.run>`. It continues with the state
+        of this client (nick, channels, members, ...), lines that were
+        received but not processed yet, outgoing messages held back by
+        flood control, delayed messages (see :py:meth:`.send_message`) and
+        the messages of the outbound queue (see
+        :py:meth:`.enable_outbound_queue`). Commands collected for coalescing
+        are sent before. Its handler receives neither
+        :py:meth:`handle_connect()<.IRCHandler.handle_connect>` nor
+        :py:meth:`handle_register()<.IRCHandler.handle_register>`. Member
+        lists that are still being received, cached ban lists etc. and the
+        netsplits and mode changes that were collected for the handler are
+        passed on as well.
+
+        Reading from the server stops immediately, the connection is passed
+        as soon as all outgoing data was written. If the other process can't
+        be reached, an error is logged and the client continues to run.
+
+        Only available on systems that support passing sockets over Unix
+        domain sockets (like Linux).
+
+        Args:
+            path (str): path of the Unix socket of the other process
+            timeout (float): time in seconds to wait for the other process
+        """
+        if not handoff.is_supported():
+            raise FredIRCError(
+                'Socket handoff is not supported on this platform.')
+        if not self._state.connected:
+            raise FredIRCError('The client is not connected.')
+        self._transport.pause_reading()
+        # Batched messages were already processed by this client
+        self._processor._flush_message_batch()
+        if self._coalescer is not None:
+            self._coalescer.flush()
+        self._handing_off = True
+        self._hand_off(path, timeout)
+
     def terminate(self):
         """ Shutdown the IRCClient by terminating the event loop.
 
@@ -238,7 +792,10 @@ class IRCClient(asyncio.Protocol):
         Args:
             channel (str): one or more channels
         """
-        self._send_message(messages.join((channel,) + channels))
+        if self._coalescer is not None:
+            self._coalescer.join((channel,) + channels)
+        else:
+            self._send_message(messages.join((channel,) + channels))
 
     def part(self, message, channel, *channels):
         """ Leave the specified channel(s).
@@ -247,7 +804,10 @@ class IRCClient(asyncio.Protocol):
             message (str): part message
             channel (str): one or more channels
         """
-        self._send_message(messages.part((channel,) + channels, message))
+        if self._coalescer is not None:
+            self._coalescer.part((channel,) + channels, message)
+        else:
+            self._send_message(messages.part((channel,) + channels, message))
 
     def quit(self, message=None):
         """ Disconnect from the IRC server.
@@ -262,23 +822,73 @@ class IRCClient(asyncio.Protocol):
     def send_message(self, channel, message, delay=0.0):
         """ Send a message to a channel.
 
+        Messages that exceed the length limit of IRC are split into several
+        lines, preferably between words. Line breaks in the message also
+        start a new line.
+
         Args:
             channel (str): the addressed channel
             message (str): the message to send
             delay (float): the delay in second before sending message
                            the bot is not blocked during delay
         """
-        def send():
-            self._send_message(messages.privmsg(channel, message, self._state.nick))
         if delay > 0.0:
-            task = Task(delay, False, send)
-            task.start()
+            if self._timer_wheel is None:
+                self._timer_wheel = TimerWheel()
+            self._timer_wheel.schedule(delay, self._send_privmsg, channel,
+                                       message)
         else:
-            send()
+            self._send_privmsg(channel, message)
+
+    def broadcast(self, message, target, *targets):
+        """ Send the same message to several channels and/or users.
+
+        Instead of sending a message per target, the targets are packed
+        into as few messages as the server permits (see ISUPPORT token
+        TARGMAX) and the length limit of IRC messages allows. Long messages
+        are split like in :py:meth:`.send_message`.
+
+        Args:
+            message (str): the message to send
+            target (str): one or more channels or users (case-insensitive)
+        """
+        # Remove duplicates but keep the order
+        unique_targets = []
+        seen = set()
+        for t in (target,) + targets:
+            if t.lower() not in seen:
+                seen.add(t.lower())
+                unique_targets.append(t)
+        max_targets = self._max_targets(Cmd.PRIVMSG)
+        # Every line must fit with the longest target alone
+        longest = max(unique_targets, key=lambda t: len(t.encode('utf-8')))
+        lines = messages.split_text(
+            message, self._max_privmsg_text_length(longest))
+        for line in lines:
+            # Bytes left for the comma-separated list of targets
+            room = self._max_privmsg_text_length('') - len(line)
+            group = []
+            group_length = -1
+            for t in unique_targets:
+                t_length = len(t.encode('utf-8')) + 1
+                if group and (len(group) == max_targets or
+                              group_length + t_length > room):
+                    group_target = ','.join(group)
+                    self._send_message(messages.privmsg(
+                        group_target, line, self._state.nick), group_target)
+                    group = []
+                    group_length = -1
+                group.append(t)
+                group_length += t_length
+            group_target = ','.join(group)
+            self._send_message(messages.privmsg(
+                group_target, line, self._state.nick), group_target)
 
     def send_private_message(self, user, message):
         """ Send a private message to a user.
 
+        Long messages are split like in :py:meth:`.send_message`.
+
         Args:
             user (str):  the addressed user
             message (str): the message tro send
@@ -287,8 +897,7 @@ class IRCClient(asyncio.Protocol):
             self._logger.warn("Detained private message to {} which seems to be"
                               "a channel instead of a user.".format(user))
             return
-        self._send_message(
-            messages.privmsg(user, message, self._state.nick))
+        self._send_privmsg(user, message)
 
     def kick(self, user, channel, reason=None):
         """ Forcefully remove a user from a channel.
@@ -316,7 +925,7 @@ class IRCClient(asyncio.Protocol):
             channel (str): the channel
         """
         mode_change = ChannelModeChange(True, ChannelMode.OPERATOR, (user,))
-        self._send_message(messages.channel_mode(channel, mode_change))
+        self._send_mode(channel, mode_change)
 
     def revoke_op(self, user, channel):
         """ Revoke operator rights from user on a channel.
@@ -330,7 +939,7 @@ class IRCClient(asyncio.Protocol):
             channel (str): the channel
         """
         mode_change = ChannelModeChange(False, ChannelMode.OPERATOR, (user,))
-        self._send_message(messages.channel_mode(channel, mode_change))
+        self._send_mode(channel, mode_change)
 
     def give_voice(self, user, channel):
         """ Grant voice rights to a user on a channel.
@@ -344,7 +953,7 @@ class IRCClient(asyncio.Protocol):
             channel (str): the channel
         """
         mode_change = ChannelModeChange(True, ChannelMode.VOICE, (user,))
-        self._send_message(messages.channel_mode(channel, mode_change))
+        self._send_mode(channel, mode_change)
 
     def revoke_voice(self, user, channel):
         """ Revoke voice rights from user on a channel.
@@ -358,7 +967,7 @@ class IRCClient(asyncio.Protocol):
             channel (str): the channel
         """
         mode_change = ChannelModeChange(False, ChannelMode.VOICE, (user,))
-        self._send_message(messages.channel_mode(channel, mode_change))
+        self._send_mode(channel, mode_change)
 
     def is_op_in(self, channel):
         """
@@ -384,16 +993,294 @@ class IRCClient(asyncio.Protocol):
 
     # --- Private methods ---
 
-    def _send_message(self, message):
+    def _send_privmsg(self, target, message):
+        """ Send a message to a target, split into as many PRIVMSG commands
+        as needed to fit the length limit of IRC messages.
+        """
+        max_bytes = self._max_privmsg_text_length(target)
+        for line in messages.split_text(message, max_bytes):
+            self._send_message(
+                messages.privmsg(target, line, self._state.nick), target)
+
+    def _send_mode(self, channel, mode_change):
+        if self._coalescer is not None:
+            self._coalescer.mode(channel, mode_change)
+        else:
+            self._send_message(messages.channel_mode(channel, mode_change))
+
+    def _max_modes(self):
+        """ Maximum number of mode changes with a parameter the server
+        accepts in a MODE command.
+
+        Returns:
+            int: the limit or None if there is no limit
+        """
+        modes = self._state.isupport.get('MODES')
+        if modes is None:
+            return 3  # As defined by RFC 2812
+        return int(modes) if modes.isdigit() else None
+
+    def _max_targets(self, command):
+        """ Maximum number of targets the server accepts for a command.
+
+        Returns:
+            int: the limit or None if there is no limit
+        """
+        isupport = self._state.isupport
+        if 'TARGMAX' in isupport:
+            limits = parsing.parse_targmax(isupport['TARGMAX'])
+            if command in limits:
+                return limits[command]
+        # RFC 2812 permits lists of channels for JOIN and PART
+        if command in (Cmd.JOIN, Cmd.PART):
+            return None
+        if isupport.get('MAXTARGETS', '').isdigit():
+            return int(isupport['MAXTARGETS'])
+        return 1
+
+    def _max_privmsg_text_length(self, target):
+        """ Maximum length of the text in bytes in a PRIVMSG to target.
+
+        The server relays the message to others with the client's full prefix
+        ":nick!user@host" prepended, which must fit into the limit of 512
+        bytes as well.
+        """
+        nick = self._state.nick or self._configured_nick
+        user = self._state.user
+        host = self._state.host
+        if not user:
+            # Assume the worst: servers prepend '~' if there is no identd
+            user = '~' + self._configured_user_name
+        prefix_length = len(':{}!{}@ PRIVMSG {} :\r\n'.format(
+            nick, user, target).encode('utf-8'))
+        # Use the maximum length of a host name if the host is unknown
+        prefix_length += len(host.encode('utf-8')) if host else 63
+        return messages.MAX_MESSAGE_LENGTH - prefix_length
+
+    def _send_message(self, message, target=None):
         """ Send a message to the server.
 
         Args:
-            message (str): A valid IRC message. Only carriage return and line
-                           feed are appended automatically.
+            message (bytes): A valid, encoded IRC message including the
+                             terminating carriage return and line feed, as
+                             created by the functions in
+                             :py:mod:`fredirc.messages`.
+            target (str): Target(s) of a channel or private message. If given
+                          and the outbound queue is enabled, the message is
+                          queued while it can't be sent.
+        """
+        if target is not None and self._outbound_queue is not None and \
+           (not self._state.registered or
+                self._outbound_queue.has_target(target)):
+            # Keep the order of the messages to the target. Queued messages
+            # are sent as soon as the target becomes sendable (see
+            # data_received()).
+            self._outbound_queue.put(target, message)
+            return
+        if not self._state.connected:
+            self._logger.warning('Not connected. Message discarded: {}'.format(
+                message[:-2].decode('utf-8', 'replace')))
+            return
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('Sending message: {}'.format(
+                message[:-2].decode('utf-8', 'replace')))
+        self._write_or_throttle(message)
+
+    def _write_or_throttle(self, data):
+        """ Write data to the transport, via flood control if enabled. """
+        if self._flood_control is not None:
+            self._flood_control.send(data)
+        else:
+            self._write(data)
+
+    def _write(self, data):
+        self._transport.write(data)
+
+    def _flush_outbound_queue(self):
+        """ Send all messages of the outbound queue that can be sent now. """
+        # Only check again if something relevant changed
+        state = (self._state.registered, len(self._state.channels),
+                 self._processor._own_joins)
+        if not self._state.registered or state == self._outbound_queue_flushed:
+            return
+        self._outbound_queue_flushed = state
+        for data in self._outbound_queue.pop(self._can_send_to):
+            self._write_or_throttle(data)
+
+    def _can_send_to(self, target):
+        """ Check if a channel or private message to target(s) can be sent.
+        Messages to channels can be sent after the client (re)joined them.
+        """
+        casemapping = self._processor._casemapping()
+        for t in target.split(','):
+            if t.startswith('#') or t.startswith('+') or t.startswith('&'):
+                channel_info = self._state.channels.find(t, casemapping)
+                if not channel_info or channel_info.restored:
+                    return False
+        return True
+
+    def _write_snapshot(self):
+        """ Write the client state to the configured snapshot file. """
+        # Without registration the state is empty and would overwrite the
+        # last useful snapshot.
+        if not self._state.registered:
+            return
+        try:
+            snapshot.write_snapshot(self._state, self._snapshot_path)
+        except OSError as e:
+            self._logger.error('Cannot write state snapshot to {}: {}'.format(
+                self._snapshot_path, e))
+
+    def _process_buffer(self):
+        """ Process the received messages in the buffer. """
+        # Messages are removed before they are processed, so that a handoff
+        # (which stops processing) passes on only the unprocessed ones.
+        while self._buffer and not self._handing_off and \
+                not self._full_streams:
+            message = self._buffer.pop(0)
+            self._logger.debug('Incoming message: {}'.format(message))
+            self._processor.process(message)
+
+    def _process_buffer_guarded(self):
+        """ Process the buffer outside of data_received(), with the same
+        handling of unhandled exceptions.
+        """
+        try:
+            self._process_buffer()
+        except Exception as e:
+            self._handle_exception(e)
+
+    def _handle_exception(self, e):
+        """ Shutdown the client on an unhandled exception, as EventLoop does
+        not provide a handle_error() method so far.
+        """
+        self._logger.exception(('Unhandled Exception while running an ' +
+                               'IRCClient: {}').format(e))
+        self._logger.critical('Shutting down the client, due to an ' +
+                              'unhandled exception!')
+        self.terminate()
+
+    def _hand_off(self, path, timeout):
+        if self._transport.get_write_buffer_size():
+            asyncio.get_event_loop().call_later(
+                0.01, self._hand_off, path, timeout)
+            return
+        unsent = []
+        if self._flood_control is not None:
+            unsent = self._flood_control.clear()
+        delayed = self._take_delayed_messages()
+        queued = []
+        if self._outbound_queue is not None:
+            queued = self._outbound_queue.clear()
+        data = {
+            'state': handoff.state_to_dict(self._state),
+            'processor': handoff.processor_to_dict(self._processor),
+            'lines': list(self._buffer),
+            'partial_line': self._last_broken_message,
+            'unsent': [message.decode('utf-8') for message in unsent],
+            # [seconds until sent, channel, message]
+            'delayed': delayed,
+            # [target, message, seconds until expiration]
+            'queued': [[target, message.decode('utf-8'), ttl]
+                       for target, message, ttl in queued],
+        }
+        try:
+            handoff.send(path, self._transport.get_extra_info('socket'),
+                         data, timeout)
+        except OSError as e:
+            self._logger.error('Cannot hand off the connection: {}'.format(e))
+            for message in unsent:
+                self._write_or_throttle(message)
+            self._restore_outgoing(delayed, queued)
+            self._handing_off = False
+            self._transport.resume_reading()
+            asyncio.get_event_loop().call_soon(self._process_buffer_guarded)
+            return
+        self._logger.info('Handed off the connection.')
+        self._handed_off = True
+        self._transport.close()
+        self.terminate()
+
+    def _take_delayed_messages(self):
+        """ Cancel the delayed messages of send_message() and return them
+        as [seconds until sent, channel, message] lists.
+        """
+        if self._timer_wheel is None:
+            return []
+        delayed = []
+        for delay, timer in self._timer_wheel._pending_calls():
+            if timer._func == self._send_privmsg:
+                delayed.append([delay] + list(timer._args))
+                timer.cancel()
+        return delayed
+
+    def _restore_outgoing(self, delayed, queued):
+        """ Schedule delayed messages and queue messages again, that were
+        taken for a handoff.
+        """
+        for delay, channel, message in delayed:
+            self.send_message(channel, message, delay)
+        for target, message, ttl in queued:
+            if self._outbound_queue is not None:
+                self._outbound_queue.put(target, message, ttl)
+            else:
+                self._send_message(message, target)
+
+    def _adopt(self, path, timeout):
+        """ Take over the connection of another process (see hand_off()). """
+        loop = asyncio.get_event_loop()
+        self._logger.info('Waiting for connection on {}'.format(path))
+        sock, data = handoff.receive(path, timeout)
+        if not handoff.restore_state(self._state, data['state']) or \
+                'processor' in data and \
+                not handoff.restore_processor(self._processor,
+                                              data['processor']):
+            sock.close()
+            raise FredIRCError('Incompatible handoff data.')
+        self._adoption = data
+        loop.run_until_complete(loop.create_connection(self, sock=sock))
+
+    def _continue_adopted(self, data):
+        """ Continue the work of the predecessor (see _adopt()).
+
+        Called on connection_made(), before any further data is received.
         """
-        self._logger.debug('Sending message: {}'.format(message))
-        message += '\r\n'
-        self._transport.write(message.encode('utf-8'))
+        self._last_broken_message = data['partial_line']
+        for message in data['unsent']:
+            self._send_message(message.encode('utf-8'))
+        self._restore_outgoing(
+            data.get('delayed', ()),
+            [(target, message.encode('utf-8'), ttl)
+             for target, message, ttl in data.get('queued', ())])
+        self._buffer[:0] = data['lines']
+        self._process_buffer_guarded()
+
+    def _set_handler(self, handler):
+        self._handler = handler
+        self._dispatch_handler = _EventTap(handler, self._streams) \
+            if self._streams else handler
+        self._processor._handler = self._dispatch_handler
+
+    def _remove_stream(self, stream):
+        self._streams.remove(stream)
+        if not self._streams:
+            self._set_handler(self._handler)
+
+    def _pause_for_stream(self, stream):
+        """ Stop reading from the server while the queue of a stream with
+        Overflow.PAUSE is full.
+        """
+        if not self._full_streams and self._transport is not None:
+            self._transport.pause_reading()
+        self._full_streams.add(stream)
+
+    def _resume_for_stream(self, stream):
+        self._full_streams.discard(stream)
+        if self._full_streams or self._transport is None or \
+           self._handing_off or not self._state.connected:
+            return
+        self._transport.resume_reading()
+        asyncio.get_event_loop().call_soon(self._process_buffer_guarded)
 
     def _connect(self):
         """ Create a connection to the configured server using asyncio's
@@ -414,8 +1301,27 @@ class IRCClient(asyncio.Protocol):
 
     def _disconnect(self):
         """ Tell the IRCClient that it lost its connection to the server. """
+        if not self._state.connected:
+            return
+        self._processor._flush_message_batch()
+        if self._snapshot_path and not self._handed_off:
+            # The state is reset below
+            self._write_snapshot()
         self._state.connected = False
-        self._handler.handle_disconnect()
+        self._processor._reset()
+        if self._handed_off:
+            return  # the connection lives on in another process
+        if self._flood_control is not None:
+            unsent = self._flood_control.clear()
+            if self._outbound_queue is not None:
+                # Channel and private messages can be sent later
+                for data in unsent:
+                    _, command, params = parsing.parse(
+                        data[:-2].decode('utf-8', 'replace'))
+                    if command == Cmd.PRIVMSG:
+                        self._outbound_queue.put(params[0], data)
+        self._outbound_queue_flushed = None
+        self._dispatch_handler.handle_disconnect()
 
     def _decoding_error_handler(self, error):
         """ Error handler that is used with the byte.decode() method.
@@ -443,12 +1349,19 @@ class IRCClient(asyncio.Protocol):
         """ Implementation of inherited method
             (from :class:`asyncio.Protocol`).
         """
-        self._logger.info('Connected to server.')
         self._transport = transport
+        if self._full_streams:
+            transport.pause_reading()
+        if self._adoption is not None:
+            data, self._adoption = self._adoption, None
+            self._logger.info('Took over connection to server.')
+            self._continue_adopted(data)
+            return
+        self._logger.info('Connected to server.')
         self._state.connected = True
-        self._handler.handle_connect()
+        self._dispatch_handler.handle_connect()
 
-    def connect_lost(self, exc):
+    def connection_lost(self, exc):
         """ Implementation of inherited method
             (from :class:`asyncio.Protocol`).
         """
@@ -482,31 +1395,11 @@ class IRCClient(asyncio.Protocol):
             if received_broken_message:
                 self._last_broken_message = data.pop()
             self._buffer += data
-            # ### TODO ###
-            # Do we really need to create a copy here?
-            # There's probably a better way to allow pop during iteration.
-            # Alternatives:
-            # 1. Make buffer a byte string (and just append incoming data),
-            #    then loop 'while self._buffer', look for terminator and remove
-            #    the message.
-            # 2. Make buffer a byte string, split lines to list, iterate list,
-            #    clear buffer. Con: While handling messages in loop, buffer
-            #    stays the same (empty or with all messages that were received)
-            # Con of buffer byte string: more difficult to debug
-            #
-            tmp_buffer = list(self._buffer)
-            for message in tmp_buffer:
-                self._logger.debug('Incoming message: {}'.format(message))
-                self._processor.process(message)
-                self._buffer.pop(0)
-        # Shutdown client if unhandled exception occurs, as EventLoop does not
-        # provide a handle_error() method so far.
+            self._process_buffer()
+            if self._outbound_queue is not None and len(self._outbound_queue):
+                self._flush_outbound_queue()
         except Exception as e:
-            self._logger.exception(('Unhandled Exception while running an ' +
-                                   'IRCClient: {}').format(e))
-            self._logger.critical('Shutting down the client, due to an ' +
-                                  'unhandled exception!')
-            self.terminate()
+            self._handle_exception(e)
 
     def _get_channel_info(self):
         return _ReadOnlyDict(self._state.channels)
@@ -551,6 +1444,67 @@ class IRCClient(asyncio.Protocol):
     """
 
 
+class _EventRecorder(object):
+    """ Stand-in for the handler of an IRCClient that records all handler
+    calls while events are paused.
+    """
+
+    def __init__(self, handler, max_events):
+        self.handler = handler
+        # The oldest events are discarded when it is full
+        self.events = collections.deque(maxlen=max_events)
+        self.dropped = 0
+
+    def __getattr__(self, name):
+        if not name.startswith('handle_'):
+            raise AttributeError(name)
+        events = self.events
+
+        def record(*args, **kwargs):
+            if len(events) == events.maxlen:
+                self.dropped += 1
+            events.append((name, args, kwargs))
+        # Look up each handler method only once
+        setattr(self, name, record)
+        return record
+
+
+class _EventTap(object):
+    """ Stand-in for the handler of an IRCClient that passes all handler
+    calls on to the handler and to the open event streams.
+    """
+
+    def __init__(self, handler, streams):
+        self.handler = handler
+        self._streams = streams
+
+    def _ignores(self, event):
+        return _ignores(self.handler, event) and \
+            not any(stream.wants(event) for stream in self._streams)
+
+    def __getattr__(self, name):
+        if not name.startswith('handle_'):
+            raise AttributeError(name)
+        if name == 'handle_client_init':
+            return getattr(self.handler, name)
+        event_name = name[len('handle_'):]
+        handler = self.handler
+        streams = self._streams
+
+        def tap(*args, **kwargs):
+            # Not bound in advance, e.g. an EventBus replaces its methods
+            getattr(handler, name)(*args, **kwargs)
+            event = None
+            for stream in list(streams):
+                if stream.wants(event_name):
+                    if event is None:
+                        event = _create_event(event_name, args, kwargs)
+                    stream._put(event)
+        # Look up each handler method only once
+        setattr(self, name, tap)
+        return tap
+
+
 class IRCClientState(object):
     """ Stores the state of an IRCClient.
 
@@ -597,9 +1551,16 @@ class IRCClientState(object):
         # Note: Nicks in server messages always have the case in which they
         #       were registered.
         self.nick = None
+        # User name and host of the client as seen by other users. Unknown
+        # (None) until the server reveals them.
+        self.user = None
+        self.host = None
+        # Tokens of RPL_ISUPPORT (e.g. 'CHANMODES', 'PREFIX')
+        # keys: token name, values: token value as string
+        self.isupport = {}
         # keys: channel name, values: ChannelInfo
         # Note: Channel names will always be saved lower case
-        self.channels = {}
+        self.channels = _ChannelDict()
         # Channels, where the client is channel operator in:
         self.operator_in = []
         # Channels, where the client has voice rights in:
@@ -636,7 +1597,9 @@ class IRCClientState(object):
     def _unregister(self):
         """ Reset all attributes that require registration to a server. """
         self.nick = None
-        self.channels = {}
+        self.user = None
+        self.host = None
+        self.channels = _ChannelDict()
         self.operator_in = []
         self.has_voice_in = []
 
@@ -644,3 +1607,4 @@ class IRCClientState(object):
         """ Reset all attributes that require connection to a server. """
         self._unregister()
         self.server = None
+        self.isupport = {}
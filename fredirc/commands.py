@@ -0,0 +1,247 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Routing of bot commands (like "!help") in channel and private messages.
+"""
+
+__all__ = ['CommandRouter']
+
+import asyncio
+import collections
+import logging
+import time
+
+from fredirc.handler import IRCHandler
+from fredirc.task import _ensure_future
+
+# Key of the trie node entry that holds the command ending at that node
+_COMMAND = None
+
+
+class CommandRouter(IRCHandler):
+    """ An :py:class:`.IRCHandler` that calls functions for bot commands in
+    channel and private messages.
+
+    A command is a message that starts with a prefix directly followed by the
+    command name (case-insensitive), e.g. ``!help topic``. The rest of the
+    message is split into arguments at whitespace. Commands are registered
+    via :py:meth:`.add_command` and compiled into a trie, so a message is
+    matched in time proportional to the length of the command name,
+    regardless of the number of commands. Messages that don't start with
+    the first character of a prefix are rejected after a single check.
+
+    Use the router as the client's handler, subscribe it to an
+    :py:class:`.EventBus` or call :py:meth:`.route` from your own handler.
+    Commands that reply via their return value (see :py:meth:`.add_command`)
+    need the client, which the router receives in
+    :py:meth:`handle_client_init()<.IRCHandler.handle_client_init>`.
+
+    Args:
+        prefixes (iterable of str): prefixes that mark a command
+    """
+
+    def __init__(self, prefixes=('!',)):
+        self._prefixes = tuple(prefixes)
+        if not self._prefixes or not all(self._prefixes):
+            raise ValueError('At least one non-empty prefix is required.')
+        if any(c.isspace() for prefix in self._prefixes for c in prefix):
+            raise ValueError('Prefixes must not contain whitespace.')
+        self._first_chars = frozenset(prefix[0].lower()
+                                      for prefix in self._prefixes)
+        # Nested dicts with a character as key; the entry _COMMAND of a node
+        # holds the command whose name (including prefix) ends there
+        self._trie = {}
+        # key: command name, value: _Command
+        self._commands = {}
+        self._client = None
+
+    def add_command(self, name, func, aliases=(), min_args=0, max_args=None,
+                    cooldown=0.0, reply=False, cache=None, per_channel=False):
+        """ Register a command.
+
+        The function is called with the sender's nick, the channel (None for
+        private messages) and the arguments as strings::
+
+            func(sender, channel, *args)
+
+        With ``reply`` the function returns the response (a string, None for
+        no response or a coroutine that returns one), which is sent to the
+        channel or, for private messages, to the sender. Responses can be
+        cached in a :py:class:`.ResponseCache`, keyed by the command and its
+        arguments (and the channel, if ``per_channel`` is set). A cached
+        response is sent without calling the function, so it must not depend
+        on the sender.
+
+        Args:
+            name (str): name of the command without prefix
+            func (callable): function that executes the command
+            aliases (iterable of str): other names for the command
+            min_args (int): minimum number of arguments. The command is
+                            ignored if there are less.
+            max_args (int): maximum number of arguments or None for no limit.
+                            The last argument holds the rest of the message,
+                            including whitespace.
+            cooldown (float): time in seconds the command is ignored in a
+                              channel (or query) after it was executed there
+            reply (bool): send the return value of the function as response
+            cache (ResponseCache): cache for the responses or None. Implies
+                                   ``reply``.
+            per_channel (bool): cache responses separately for each channel
+        """
+        names = (name,) + tuple(aliases)
+        for command_name in names:
+            if not command_name or any(c.isspace() for c in command_name):
+                raise ValueError(
+                    'Invalid command name: {!r}'.format(command_name))
+            if command_name.lower() in self._commands:
+                raise ValueError(
+                    'Command already exists: {}'.format(command_name))
+        command = _Command(name, func, min_args, max_args, cooldown,
+                           reply or cache is not None, cache, per_channel)
+        for command_name in names:
+            self._commands[command_name.lower()] = command
+            for prefix in self._prefixes:
+                node = self._trie
+                for c in (prefix + command_name).lower():
+                    node = node.setdefault(c, {})
+                node[_COMMAND] = command
+
+    def remove_command(self, name):
+        """ Remove a command and all its aliases. """
+        command = self._commands.get(name.lower())
+        if command is None:
+            return
+        for command_name in [n for n, c in self._commands.items()
+                             if c is command]:
+            del self._commands[command_name]
+            for prefix in self._prefixes:
+                self._remove_from_trie((prefix + command_name).lower())
+
+    def route(self, message, sender, channel=None):
+        """ Execute the command contained in a message, if any.
+
+        Args:
+            message (str): the message text
+            sender (str): nick of the sender
+            channel (str): the channel or None for a private message
+        Returns:
+            bool: True, if the message was a command (even if it was ignored
+            because of its cooldown or arguments)
+        """
+        if not message or message[0].lower() not in self._first_chars:
+            return False
+        node = self._trie
+        end = len(message)
+        for i, c in enumerate(message):
+            if c.isspace():
+                end = i
+                break
+            node = node.get(c.lower())
+            if node is None:
+                return False
+        command = node.get(_COMMAND)
+        if command is None:
+            return False
+        result = command._execute(sender, channel, message[end:])
+        if result is not None and command.reply:
+            if asyncio.iscoroutine(result):
+                result = _ensure_future(result)
+            if isinstance(result, asyncio.Future):
+                result.add_done_callback(
+                    lambda future: self._reply_when_done(
+                        command, sender, channel, future))
+            else:
+                self._send_reply(sender, channel, result)
+        return True
+
+    def handle_client_init(self, client):
+        self._client = client
+
+    def handle_channel_message(self, channel, message, sender=None):
+        self.route(message, sender, channel)
+
+    def handle_private_message(self, message, sender=None):
+        self.route(message, sender)
+
+    def _send_reply(self, sender, channel, response):
+        if response is None or self._client is None:
+            return
+        if channel is None:
+            self._client.send_private_message(sender, response)
+        else:
+            self._client.send_message(channel, response)
+
+    def _reply_when_done(self, command, sender, channel, future):
+        if future.cancelled():
+            return
+        exception = future.exception()
+        if exception is not None:
+            logger = self._client._logger if self._client is not None \
+                else logging.getLogger('FredIRC')
+            logger.error('Command {} of {} failed: {!r}'.format(
+                command.name, sender, exception))
+            return
+        self._send_reply(sender, channel, future.result())
+
+    def _remove_from_trie(self, key):
+        path = [self._trie]
+        for c in key:
+            path.append(path[-1][c])
+        del path[-1][_COMMAND]
+        # Remove nodes that lead to no other command
+        for depth in range(len(key), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][key[depth - 1]]
+
+
+class _Command(object):
+    """ A command registered at the CommandRouter. """
+
+    def __init__(self, name, func, min_args, max_args, cooldown, reply,
+                 cache, per_channel):
+        self.name = name
+        self.func = func
+        self.min_args = min_args
+        self.max_args = max_args
+        self.cooldown = cooldown
+        self.reply = reply
+        self.cache = cache
+        self.per_channel = per_channel
+        # key: channel or sender, value: time.monotonic() of the last
+        # execution there, least recently executed first. Entries whose
+        # cooldown is over are removed.
+        self.last_executed = collections.OrderedDict()
+
+    def _execute(self, sender, channel, text):
+        """ Execute the command and return the result of the function (or
+        None if the command was ignored).
+        """
+        if self.max_args is None:
+            args = text.split()
+        elif self.max_args == 0:
+            args = []
+        else:
+            args = text.strip().split(None, self.max_args - 1)
+        if len(args) < self.min_args:
+            return None
+        if self.cooldown > 0.0:
+            scope = channel if channel is not None else sender
+            now = time.monotonic()
+            last_executed = self.last_executed
+            while last_executed:
+                oldest = next(iter(last_executed))
+                if now - last_executed[oldest] < self.cooldown:
+                    break
+                del last_executed[oldest]
+            if scope in last_executed:
+                return None
+            last_executed[scope] = now
+        if self.cache is None:
+            return self.func(sender, channel, *args)
+        key = (self.name.lower(), tuple(args))
+        if self.per_channel:
+            key += (channel.lower() if channel is not None else None,)
+        return self.cache.get(key, self.func, sender, channel, *args)
@@ -0,0 +1,165 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+An event bus that passes the events of an IRCClient to many listeners.
+"""
+
+__all__ = ['EventBus']
+
+import inspect
+
+from fredirc.handler import IRCHandler
+from fredirc.handler import _ignores
+
+# Names of the events, i.e. the handler methods of IRCHandler without the
+# 'handle_' prefix.
+_EVENTS = frozenset(name[len('handle_'):] for name in dir(IRCHandler)
+                    if name.startswith('handle_'))
+
+
+class EventBus(IRCHandler):
+    """ An :py:class:`.IRCHandler` that passes each event to any number of
+    listeners.
+
+    Pass the bus to the :py:class:`.IRCClient` instead of a handler and
+    subscribe listeners to single events via :py:meth:`.subscribe` or whole
+    handlers via :py:meth:`.subscribe_handler`. Events are named like the
+    handler methods of :py:class:`.IRCHandler` without the ``handle_``
+    prefix (e.g. ``'channel_message'``) and listeners are called with the
+    same arguments as those methods.
+
+    When listeners are subscribed or unsubscribed, the bus builds a
+    dispatch function for the event that calls all of them in order of
+    their priority. Events without listeners are not dispatched at all and
+    the client does not even build the arguments of the more expensive ones
+    (e.g. channel messages, mode changes and netsplits).
+
+    Args:
+        handler (IRCHandler): optional handler that is subscribed with
+                              priority 0 (see :py:meth:`.subscribe_handler`)
+    """
+
+    def __init__(self, handler=None):
+        # key: event, value: list of (-priority, sequence number, callback,
+        # listener) tuples
+        self._listeners = {}
+        self._sequence = 0
+        # The client the bus is attached to, so that handlers subscribed
+        # later can be initialized
+        self._client = None
+        self.subscribe('client_init', self._set_client, float('inf'))
+        if handler is not None:
+            self.subscribe_handler(handler)
+
+    def subscribe(self, event, callback, priority=0, channel=None, nick=None):
+        """ Subscribe a listener to an event.
+
+        Args:
+            event (str): name of the event, e.g. ``'join'``
+            callback (callable): function that is called with the arguments
+                                 of the event
+            priority (int): listeners with a higher priority are called first,
+                            listeners with the same priority in the order they
+                            were subscribed.
+            channel (str): only pass events for this channel. The event must
+                           have a ``channel`` argument.
+            nick (str): only pass events caused by this nick (the ``nick`` or
+                        ``sender`` argument of the event).
+        Returns:
+            callable: the callback
+        """
+        if event not in _EVENTS:
+            raise ValueError('Unknown event: {}'.format(event))
+        listener = callback
+        if channel is not None:
+            listener = _filter(listener, event, ('channel',), channel)
+        if nick is not None:
+            listener = _filter(listener, event, ('nick', 'sender'), nick)
+        self._sequence += 1
+        self._listeners.setdefault(event, []).append(
+            (-priority, self._sequence, callback, listener))
+        self._update(event)
+        return callback
+
+    def unsubscribe(self, event, callback):
+        """ Remove all subscriptions of a callback to an event.
+
+        Has no effect if the callback is not subscribed.
+        """
+        listeners = self._listeners.get(event, [])
+        listeners[:] = [entry for entry in listeners if entry[2] != callback]
+        self._update(event)
+
+    def subscribe_handler(self, handler, priority=0):
+        """ Subscribe all handler methods that an :py:class:`.IRCHandler`
+        overrides (i.e. that differ from the empty methods of IRCHandler).
+
+        If the bus is already attached to a client,
+        :py:meth:`handle_client_init()<.IRCHandler.handle_client_init>` of the
+        handler is called immediately.
+
+        Args:
+            handler (IRCHandler): the handler
+            priority (int): priority of the handler's methods
+        """
+        for event in _EVENTS:
+            if not _ignores(handler, event):
+                method = getattr(handler, 'handle_' + event)
+                self.subscribe(event, method, priority)
+                if event == 'client_init' and self._client is not None:
+                    method(self._client)
+
+    def unsubscribe_handler(self, handler):
+        """ Remove all handler methods of a handler. """
+        for event in list(self._listeners):
+            self.unsubscribe(event, getattr(handler, 'handle_' + event))
+
+    def has_listeners(self, event):
+        """ Return True if at least one listener is subscribed to an event. """
+        return bool(self._listeners.get(event))
+
+    def _set_client(self, client):
+        self._client = client
+
+    def _update(self, event):
+        """ Rebuild the dispatch function of an event. """
+        method_name = 'handle_' + event
+        listeners = self._listeners.get(event)
+        if not listeners:
+            self._listeners.pop(event, None)
+            # Fall back to the empty method of IRCHandler
+            self.__dict__.pop(method_name, None)
+            return
+        listeners.sort(key=lambda entry: entry[:2])
+        callbacks = tuple(entry[3] for entry in listeners)
+        if len(callbacks) == 1:
+            dispatch = callbacks[0]
+        else:
+            def dispatch(*args, **kwargs):
+                for callback in callbacks:
+                    callback(*args, **kwargs)
+        setattr(self, method_name, dispatch)
+
+
+def _filter(callback, event, arg_names, value):
+    """ Wrap a callback so that it is only called if the first existing
+    argument from arg_names equals value (case-insensitive).
+    """
+    params = list(inspect.signature(
+        getattr(IRCHandler, 'handle_' + event)).parameters)[1:]  # skip self
+    for name in arg_names:
+        if name in params:
+            break
+    else:
+        raise ValueError('Event {} has no {} argument.'.format(
+            event, ' or '.join(arg_names)))
+    index = params.index(name)
+    value = value.lower()
+
+    def filtered(*args, **kwargs):
+        arg = args[index] if index < len(args) else kwargs.get(name)
+        if arg is not None and arg.lower() == value:
+            callback(*args, **kwargs)
+    return filtered
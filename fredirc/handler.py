@@ -61,6 +61,22 @@ class IRCHandler(object):
         """
         pass
 
+    def handle_channel_messages(self, messages):
+        """ Received messages to channels.
+
+        Only called if enabled via
+        :py:meth:`IRCClient.enable_message_batching()<.IRCClient.enable_message_batching>`.
+        In this case all channel messages received during an iteration of the
+        event loop are passed to this method at once and
+        :py:meth:`.handle_channel_message` is not called.
+
+        Args:
+            messages (list): the messages as tuples ``(timestamp, channel,
+                sender, message)`` in the order they were received, where
+                timestamp is the time of receipt (:py:func:`time.time`)
+        """
+        pass
+
     def handle_private_message(self, message, sender=None):
         """ Received private message (query).
 
@@ -93,6 +109,22 @@ class IRCHandler(object):
         """
         pass
 
+    def handle_channel_members(self, channel, nicks):
+        """ Received a part of the member list of a channel the IRCClient is
+        joining.
+
+        Only called if enabled via
+        :py:meth:`IRCClient.enable_names_streaming()<.IRCClient.enable_names_streaming>`.
+        Large member lists are sent in several chunks by the server, so this
+        might be called multiple times for a channel before
+        :py:meth:`.handle_own_join` is called.
+
+        Args:
+            channel (str): name of the channel
+            nicks (tuple of str): nicks of (some of) the channel's members
+        """
+        pass
+
     def handle_quit(self, nick, message=None):
         """ A user disconnected from the server.
 
@@ -104,6 +136,39 @@ class IRCHandler(object):
         """
         pass
 
+    def handle_netsplit(self, servers, nicks, members):
+        """ Users were disconnected by a netsplit.
+
+        Only called if enabled via
+        :py:meth:`IRCClient.enable_netsplit_detection()<.IRCClient.enable_netsplit_detection>`.
+        In this case :py:meth:`.handle_quit` is not called for those users.
+
+        Args:
+            servers (tuple of str): name of the server that is still
+                connected to the network and of the server that split off
+            nicks (frozenset of str): nicks of all users that quit
+            members (dict): channel names mapped to a frozenset of the nicks
+                that left that channel. Only contains channels whose members
+                are tracked (see :py:class:`SyncPolicy<fredirc.SyncPolicy>`).
+        """
+        pass
+
+    def handle_netjoin(self, servers, nicks, members):
+        """ Users that were lost in a netsplit returned.
+
+        Only called if enabled via
+        :py:meth:`IRCClient.enable_netsplit_detection()<.IRCClient.enable_netsplit_detection>`.
+        In this case :py:meth:`.handle_join` is not called for those users.
+
+        Args:
+            servers (tuple of str): the servers of the preceding netsplit
+                (see :py:meth:`.handle_netsplit`)
+            nicks (frozenset of str): nicks of all users that returned
+            members (dict): channel names mapped to a frozenset of the nicks
+                that joined that channel
+        """
+        pass
+
     def handle_part(self, channel, nick, message=None):
         """ Called when another user left the channel.
 
@@ -224,6 +289,26 @@ class IRCHandler(object):
         """
         pass
 
+    def handle_mode_changes(self, channel, mode_changes, initiator):
+        """ Modes of a channel changed.
+
+        Only called if enabled via
+        :py:meth:`IRCClient.enable_mode_batching()<.IRCClient.enable_mode_batching>`.
+        In this case all mode changes are passed to this method and the
+        handlers for single changes (e.g. :py:meth:`.handle_got_op`) are not
+        called. The client's own operator and voice status is already
+        updated when this method is called.
+
+        Args:
+            channel (str): name of the channel
+            mode_changes (tuple): the changes as
+                :py:class:`ChannelModeChange` objects in the order they were
+                received. Each has the attributes ``added`` (bool), ``mode``
+                (str) and ``params`` (list of str or None).
+            initiator (str): the user who changed the modes
+        """
+        pass
+
     def handle_nick_change(self, old_nick, new_nick):
         """ A user's nick name changed.
 
@@ -319,3 +404,16 @@ class BaseIRCHandler(IRCHandler):
 
     def handle_ping(self, server):
         self.client.pong()
+
+
+def _ignores(handler, event):
+    """ Return True if a handler ignores an event, i.e. its method for the
+    event is the empty one of IRCHandler (as for events without listeners of
+    an EventBus), so that the arguments of the event need not be built.
+    """
+    ignores = getattr(handler, '_ignores', None)
+    if ignores is not None:
+        return ignores(event)
+    name = 'handle_' + event
+    return getattr(getattr(handler, name), '__func__', None) is \
+        getattr(IRCHandler, name)
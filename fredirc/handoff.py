@@ -0,0 +1,286 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Functions to pass the connection of an IRCClient to another process, so that
+the client can be upgraded without reconnecting to the server.
+
+The socket is passed over a Unix domain socket as ancillary data
+(SCM_RIGHTS), which is only supported on Unix systems like Linux.
+"""
+
+__all__ = []
+
+import array
+import json
+import os
+import socket
+import struct
+import time
+
+from fredirc import snapshot
+from fredirc.info import ChannelInfo
+from fredirc.info import SyncPolicy
+from fredirc.parsing import ChannelModeChange
+
+# Header of a handoff message: length of the JSON data that follows
+_HEADER = struct.Struct('!I')
+
+
+def is_supported():
+    """ Return True if sockets can be passed to other processes. """
+    return hasattr(socket, 'AF_UNIX') and hasattr(socket, 'SCM_RIGHTS')
+
+
+def state_to_dict(state):
+    """ Convert an IRCClientState into a dict for the successor process.
+
+    Unlike a snapshot this includes the nick, registration and the operator
+    and voice status, as the server connection stays the same.
+    """
+    data = snapshot.state_to_dict(state)
+    data.update({
+        'nick': state.nick,
+        'user': state.user,
+        'host': state.host,
+        'registered': state.registered,
+        'operator_in': list(state.operator_in),
+        'has_voice_in': list(state.has_voice_in),
+    })
+    return data
+
+
+def restore_state(state, data):
+    """ Restore an IRCClientState from a dict created by
+    :py:func:`state_to_dict`.
+
+    Returns:
+        bool: ``True`` if the data could be restored.
+    """
+    if not snapshot.restore_state(state, data):
+        return False
+    # The channels are current, not restored from an old snapshot
+    for info in state.channels.values():
+        info._restored = False
+    state.connected = True
+    state.registered = data['registered']
+    state.nick = data['nick']
+    state.user = data['user']
+    state.host = data['host']
+    state.operator_in[:] = data['operator_in']
+    state.has_voice_in[:] = data['has_voice_in']
+    return True
+
+
+def processor_to_dict(processor):
+    """ Convert the work in progress of a MessageProcessor into a dict for
+    the successor process: channels whose member lists are still being
+    received, netsplits and mode changes that were collected but not passed
+    to the handler yet, the users of past netsplits and the mask lists (bans
+    etc.) of all channels.
+
+    Points in time are passed as the seconds since (or until) then.
+    """
+    now = time.monotonic()
+    channels = list(processor._state.channels.items()) + \
+        list(processor._pending_channel_info.items())
+    return {
+        # channel name: [topic, [nicks], sync policy, member count,
+        # seconds until the channel is considered complete]
+        'pending_channels': {
+            name: [info.topic, list(info.nicks), info.sync_policy,
+                   info.member_count,
+                   processor._pending_channel_deadlines[name] - now]
+            for name, info in processor._pending_channel_info.items()},
+        # channel name: {mode: [complete, [[mask, set by, set at], ...]]}
+        'mask_lists': {
+            name: {mode: [mask_list.complete,
+                          [list(entry)
+                           for entry in mask_list._entries.values()]]
+                   for mode, mask_list in info._mask_lists.items()}
+            for name, info in channels if info._mask_lists},
+        # [channel, mode, [[mask, set by, set at], ...]]
+        'mask_list_replies': [
+            [channel, mode, [list(entry) for entry in entries]]
+            for (channel, mode), entries
+            in processor._mask_list_replies.items()],
+        # [[server, remote server], [nicks]]
+        'netsplits': [[list(servers), list(nicks)]
+                      for servers, nicks in processor._netsplits.items()],
+        # [[server, remote server], {channel: [nicks]}]
+        'netjoins': [[list(servers),
+                      {channel: list(nicks)
+                       for channel, nicks in joined.items()}]
+                     for servers, joined in processor._netjoins.items()],
+        # nick: [server, remote server]
+        'split_nicks': {nick: list(servers)
+                        for nick, servers in processor._split_nicks.items()},
+        # [[server, remote server], seconds since the split]
+        'split_times': [[list(servers), now - split_time]
+                        for servers, split_time
+                        in processor._split_times.items()],
+        # [[server, remote server], seconds since the first netjoin]
+        'rejoin_times': [[list(servers), now - rejoin_time]
+                         for servers, rejoin_time
+                         in processor._rejoin_times.items()],
+        # [channel, initiator, [[added, mode, params], ...]]
+        'mode_batches': [
+            [channel, initiator,
+             [[change.added, change.mode, change.params]
+              for change in changes]]
+            for (channel, initiator), changes
+            in processor._mode_batches.items()],
+    }
+
+
+def restore_processor(processor, data):
+    """ Restore the work in progress of a MessageProcessor from a dict
+    created by :py:func:`processor_to_dict`. The client state must be
+    restored first.
+
+    Returns:
+        bool: ``True`` if the data could be restored.
+    """
+    now = time.monotonic()
+    casemapping = processor._casemapping()
+    # Build everything first, so that invalid data leaves the processor
+    # untouched
+    try:
+        pending = {}
+        deadlines = {}
+        for name, (topic, nicks, policy, count, remaining) \
+                in data['pending_channels'].items():
+            info = ChannelInfo(name, policy, casemapping)
+            info._set_topic(topic)
+            info._add_nicks(*nicks)
+            if policy == SyncPolicy.COUNT:
+                info._count = count
+            pending[name] = info
+            deadlines[name] = now + remaining
+        mask_lists = []
+        for name, lists in data['mask_lists'].items():
+            info = pending.get(name) or processor._state.channels.get(name)
+            if info is None:
+                continue
+            for mode, (complete, entries) in lists.items():
+                mask_lists.append((info, mode, complete,
+                                   [tuple(entry) for entry in entries]))
+        mask_list_replies = {
+            (channel, mode): [tuple(entry) for entry in entries]
+            for channel, mode, entries in data['mask_list_replies']}
+        netsplits = {tuple(servers): set(nicks)
+                     for servers, nicks in data['netsplits']}
+        netjoins = {tuple(servers): {channel: set(nicks)
+                                     for channel, nicks in joined.items()}
+                    for servers, joined in data['netjoins']}
+        split_nicks = {nick: tuple(servers)
+                       for nick, servers in data['split_nicks'].items()}
+        split_times = {tuple(servers): now - age
+                       for servers, age in data['split_times']}
+        rejoin_times = {tuple(servers): now - age
+                        for servers, age in data['rejoin_times']}
+        mode_batches = {
+            (channel, initiator): [ChannelModeChange(*change)
+                                   for change in changes]
+            for channel, initiator, changes in data['mode_batches']}
+    except (KeyError, TypeError, ValueError):
+        return False
+    processor._pending_channel_info.update(pending)
+    processor._pending_channel_deadlines.update(deadlines)
+    if deadlines:
+        processor._next_pending_deadline = min(
+            processor._pending_channel_deadlines.values())
+    for info, mode, complete, entries in mask_lists:
+        mask_list = info._mask_list(mode)
+        mask_list._replace(entries)
+        mask_list._complete = complete
+    processor._mask_list_replies.update(mask_list_replies)
+    processor._netsplits.update(netsplits)
+    processor._netjoins.update(netjoins)
+    processor._split_nicks.update(split_nicks)
+    processor._split_times.update(split_times)
+    processor._rejoin_times.update(rejoin_times)
+    processor._mode_batches.update(mode_batches)
+    if netsplits or netjoins:
+        processor._schedule_netsplit_flush()
+    if mode_batches:
+        processor._schedule_mode_batch_flush()
+    return True
+
+
+def send(path, sock, data, timeout=10.0):
+    """ Pass a socket and JSON-compatible data to the process listening on the
+    Unix socket path.
+
+    Args:
+        path (str): path of the Unix socket of the successor
+        sock (socket.socket): the socket to pass
+        data (dict): data for the successor
+        timeout (float): timeout in seconds for the connection
+    """
+    payload = json.dumps({'family': int(sock.family), 'data': data},
+                         separators=(',', ':')).encode('utf-8')
+    message = _HEADER.pack(len(payload)) + payload
+    fds = array.array('i', [sock.fileno()])
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as unix_sock:
+        unix_sock.settimeout(timeout)
+        unix_sock.connect(path)
+        sent = unix_sock.sendmsg(
+            [message], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+        unix_sock.sendall(message[sent:])
+        # Wait until the successor closes the connection, i.e. received all
+        unix_sock.recv(1)
+
+
+def receive(path, timeout=None):
+    """ Wait for a predecessor process to pass its socket via
+    :py:func:`send`.
+
+    Args:
+        path (str): path of the Unix socket to create. An existing file is
+                    replaced.
+        timeout (float): time in seconds to wait or None to wait forever
+    Returns:
+        tuple: the received socket (socket.socket) and data (dict)
+    """
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.settimeout(timeout)
+        server.bind(path)
+        server.listen(1)
+        try:
+            connection, _ = server.accept()
+        finally:
+            os.unlink(path)
+        with connection:
+            connection.settimeout(timeout)
+            fds = array.array('i')
+            data, ancdata, _, _ = connection.recvmsg(
+                65536, socket.CMSG_SPACE(fds.itemsize))
+            for level, type_, cmsg_data in ancdata:
+                if level == socket.SOL_SOCKET and type_ == socket.SCM_RIGHTS:
+                    fds.frombytes(cmsg_data[:len(cmsg_data) -
+                                            len(cmsg_data) % fds.itemsize])
+            if not fds:
+                raise OSError('No socket received.')
+            data = bytearray(data)
+            while len(data) < _HEADER.size:
+                data += _receive_chunk(connection)
+            length = _HEADER.unpack_from(data)[0]
+            del data[:_HEADER.size]
+            while len(data) < length:
+                data += _receive_chunk(connection)
+    payload = json.loads(data.decode('utf-8'))
+    sock = socket.socket(payload['family'], socket.SOCK_STREAM, 0, fds[0])
+    return sock, payload['data']
+
+
+def _receive_chunk(connection):
+    chunk = connection.recv(65536)
+    if not chunk:
+        raise OSError('Connection closed before all data was received.')
+    return chunk
@@ -0,0 +1,183 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Matching of users against hostmasks like ``nick!user@*.example.com``.
+"""
+
+__all__ = ['HostmaskMatcher']
+
+import re
+
+from fredirc import parsing
+
+
+class HostmaskMatcher(object):
+    """ A set of hostmasks that can be matched against users efficiently.
+
+    A hostmask has the form ``nick!user@host``, where each part may contain
+    the wildcards ``*`` (any number of characters) and ``?`` (exactly one
+    character). Incomplete masks are completed: ``nick`` means
+    ``nick!*@*`` and ``user@host`` means ``*!user@host``. Comparisons are
+    case-insensitive according to the casemapping of the server.
+
+    The masks are indexed by their literal parts: masks with a literal nick
+    by that nick and masks whose host ends in literal labels (like
+    ``*.example.com``) by these labels. Matching a user only checks the masks
+    of the user's nick and host suffixes, plus the few masks that have no
+    literal part.
+
+    Args:
+        casemapping (str): casemapping of the server (see
+                           :py:func:`parsing.irc_lower`)
+    """
+
+    def __init__(self, casemapping='rfc1459'):
+        self._casemapping = casemapping
+        # key: normalized mask, value: [value or None for the normalized
+        # mask, compiled mask or None if it has not been compiled yet, mask
+        # as added]
+        self._masks = {}
+        # key: lower case nick, value: set of normalized masks
+        self._by_nick = {}
+        # key: lower case host suffix of complete labels, value: set of
+        # normalized masks
+        self._by_host = {}
+        # Masks without literal nick or host suffix
+        self._unindexed = set()
+
+    def add(self, mask, value=None):
+        """ Add a hostmask.
+
+        Args:
+            mask (str): the hostmask
+            value: value that is returned by :py:meth:`.match` for this mask.
+                   Defaults to the normalized mask.
+        Returns:
+            str: the normalized mask (completed and in lower case)
+        """
+        original = mask
+        mask = self._normalize(mask)
+        self.remove(mask)
+        self._masks[mask] = [value, None, original]
+        index, key = self._index_of(mask)
+        if index is None:
+            self._unindexed.add(mask)
+        else:
+            index.setdefault(key, set()).add(mask)
+        return mask
+
+    def remove(self, mask):
+        """ Remove a hostmask. Has no effect if it was not added. """
+        mask = self._normalize(mask)
+        if self._masks.pop(mask, None) is None:
+            return
+        index, key = self._index_of(mask)
+        if index is None:
+            self._unindexed.discard(mask)
+        else:
+            index[key].discard(mask)
+            if not index[key]:
+                del index[key]
+
+    def match(self, nick, user=None, host=None):
+        """ Find the masks that match a user.
+
+        Args:
+            nick (str): nick of the user
+            user (str): user name or None if unknown
+            host (str): host or None if unknown
+        Returns:
+            list: values of the matching masks (see :py:meth:`.add`)
+        """
+        if not self._masks:
+            return []
+        nick = parsing.irc_lower(nick, self._casemapping)
+        user = parsing.irc_lower(user or '', self._casemapping)
+        host = parsing.irc_lower(host or '', self._casemapping)
+        hostmask = '{}!{}@{}'.format(nick, user, host)
+        candidates = list(self._unindexed)
+        candidates.extend(self._by_nick.get(nick, ()))
+        labels = host.split('.')
+        for i in range(len(labels)):
+            candidates.extend(self._by_host.get('.'.join(labels[i:]), ()))
+        matches = []
+        for mask in candidates:
+            entry = self._masks[mask]
+            if entry[1] is None:
+                entry[1] = _compile(mask)
+            if entry[1](hostmask):
+                matches.append(mask if entry[0] is None else entry[0])
+        return matches
+
+    def match_prefix(self, prefix):
+        """ Like :py:meth:`.match` for a message prefix
+        (``nick[!user][@host]``).
+        """
+        return self.match(*parsing.parse_user_prefix(prefix))
+
+    def set_casemapping(self, casemapping):
+        """ Change the casemapping and re-index all masks as they were
+        added.
+        """
+        if casemapping == self._casemapping:
+            return
+        masks = [(original, value)
+                 for value, _, original in self._masks.values()]
+        self._casemapping = casemapping
+        self._masks = {}
+        self._by_nick = {}
+        self._by_host = {}
+        self._unindexed = set()
+        for mask, value in masks:
+            self.add(mask, value)
+
+    def __contains__(self, mask):
+        return self._normalize(mask) in self._masks
+
+    def __len__(self):
+        return len(self._masks)
+
+    def __iter__(self):
+        return iter(list(self._masks))
+
+    def _normalize(self, mask):
+        if '!' not in mask and '@' not in mask:
+            mask += '!*@*'
+        elif '!' not in mask:
+            mask = '*!' + mask
+        elif '@' not in mask:
+            mask += '@*'
+        return parsing.irc_lower(mask, self._casemapping)
+
+    def _index_of(self, mask):
+        """ Return the index (dict) and key for a normalized mask or
+        (None, None) if it has no literal nick or host suffix.
+        """
+        nick, _, host = mask.partition('!')
+        host = host.partition('@')[2]
+        if not _has_wildcard(nick):
+            return self._by_nick, nick
+        # Complete labels after the last wildcard of the host
+        tail = re.split(r'[*?]', host)[-1]
+        if tail != host:
+            tail = tail.partition('.')[2]
+        if tail:
+            return self._by_host, tail
+        return None, None
+
+
+def _has_wildcard(text):
+    return '*' in text or '?' in text
+
+
+def _compile(mask):
+    """ Compile a normalized mask into a function that matches a normalized
+    'nick!user@host' string.
+    """
+    if not _has_wildcard(mask):
+        return mask.__eq__
+    pattern = ''.join('.*' if c == '*' else '.' if c == '?' else re.escape(c)
+                      for c in mask)
+    return re.compile(pattern + r'\Z', re.DOTALL).match
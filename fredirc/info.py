@@ -6,9 +6,37 @@
 Classes that provide some irc-related (read-only) information.
 """
 
-__all__ = ['ChannelInfo']
+__all__ = ['ChannelInfo',
+           'MaskList',
+           'SyncPolicy']
 
-import collections
+import collections.abc
+
+from fredirc import parsing
+from fredirc.hostmask import HostmaskMatcher
+from fredirc.messages import ChannelMode
+
+
+class SyncPolicy:
+    """ Policies that define how much information about the members of a
+    channel is tracked by the client.
+
+    See :py:meth:`IRCClient.set_sync_policy()<.IRCClient.set_sync_policy>`.
+    """
+
+    FULL = 'full'
+    """ Track the nicks of all members (default). """
+    COUNT = 'count'
+    """ Only track the number of members.
+
+    Users that quit or change their nick can't be assigned to a channel
+    without knowing the members, so the count only reflects joins, parts and
+    kicks after the initial member list was received.
+    """
+    NONE = 'none'
+    """ Don't track members at all. The channel is considered joined as soon
+    as the server confirms the join, without waiting for the member list.
+    """
 
 
 class ChannelInfo(object):
@@ -17,21 +45,95 @@ class ChannelInfo(object):
     A ChannelInfo object is a view on a channel and is automatically updated
     as long as the client is in the channel. Afterwards the ChannelInfo becomes
     invalid and should not be used any longer.
+
+    How much information about the channel's members is available depends on
+    its :py:attr:`.sync_policy`.
     """
 
-    def __init__(self, name):
+    def __init__(self, name, sync_policy=SyncPolicy.FULL,
+                 casemapping='rfc1459'):
         self._name = name
         self._topic = ""
+        self._sync_policy = sync_policy
+        # Casemapping of the server for the masks of the mask lists
+        self._casemapping = casemapping
         self._nicks = set()
+        self._count = 0
+        self._restored = False
+        # key: list mode (ChannelMode.BAN etc.), value: MaskList
+        self._mask_lists = {}
 
     def _add_nicks(self, *nicks):
-        self._nicks.update(nicks)
+        if self._sync_policy == SyncPolicy.FULL:
+            self._nicks.update(nicks)
+        elif self._sync_policy == SyncPolicy.COUNT:
+            self._count += len(nicks)
 
     def _remove_nick(self, nick):
-        try:
-            self._nicks.remove(nick)
-        except KeyError:
-            pass
+        if self._sync_policy == SyncPolicy.FULL:
+            try:
+                self._nicks.remove(nick)
+            except KeyError:
+                pass
+        elif self._sync_policy == SyncPolicy.COUNT:
+            self._count = max(self._count - 1, 0)
+
+    def _remove_nicks(self, nicks):
+        """ Remove all given nicks that are members of this channel.
+
+        Args:
+            nicks (set): nicks to remove
+        Returns:
+            set: the removed nicks. Always empty if members are not tracked.
+        """
+        if self._sync_policy != SyncPolicy.FULL:
+            return set()
+        removed = self._nicks & nicks
+        self._nicks -= removed
+        return removed
+
+    def _has_nick(self, nick):
+        return nick in self._nicks
+
+    def _mask_list(self, mode):
+        """ Return the MaskList for a list mode, create it if necessary. """
+        mask_list = self._mask_lists.get(mode)
+        if mask_list is None:
+            mask_list = MaskList(mode, self._casemapping)
+            self._mask_lists[mode] = mask_list
+        return mask_list
+
+    def _set_casemapping(self, casemapping):
+        self._casemapping = casemapping
+        for mask_list in self._mask_lists.values():
+            mask_list._set_casemapping(casemapping)
+
+    def matching_bans(self, nick, user=None, host=None):
+        """ Find the bans of this channel that match a user.
+
+        Exceptions (mode +e) are not taken into account, see
+        :py:meth:`.is_banned`.
+
+        Args:
+            nick (str): nick of the user
+            user (str): user name or None if unknown
+            host (str): host or None if unknown
+        Returns:
+            list of str: the matching ban masks
+        """
+        return self.bans.match(nick, user, host)
+
+    def is_banned(self, nick, user=None, host=None):
+        """ Check if a user matches a ban and no ban exception of this
+        channel.
+
+        Only as reliable as the cached lists, see :py:attr:`MaskList.complete`.
+
+        Returns:
+            bool
+        """
+        return bool(self.bans.match(nick, user, host)) and \
+            not self.ban_exceptions.match(nick, user, host)
 
     def _set_topic(self, topic):
         self._topic = topic
@@ -45,6 +147,28 @@ class ChannelInfo(object):
     def _get_nicks(self):
         return iter(self._nicks)
 
+    def _get_member_count(self):
+        if self._sync_policy == SyncPolicy.FULL:
+            return len(self._nicks)
+        elif self._sync_policy == SyncPolicy.COUNT:
+            return self._count
+        return None
+
+    def _get_sync_policy(self):
+        return self._sync_policy
+
+    def _is_restored(self):
+        return self._restored
+
+    def _get_bans(self):
+        return self._mask_list(ChannelMode.BAN)
+
+    def _get_ban_exceptions(self):
+        return self._mask_list(ChannelMode.BAN_EXCEPTION)
+
+    def _get_invite_exceptions(self):
+        return self._mask_list(ChannelMode.INVITE_EXCEPTION)
+
     name = property(_get_name)
     """ Name of the channel (*read-only*).
 
@@ -62,12 +186,160 @@ class ChannelInfo(object):
     nicks = property(_get_nicks)
     """ Nicks of all visible users in this channel. (*read-only*).
 
+    Only available with :py:attr:`SyncPolicy.FULL<.SyncPolicy.FULL>`,
+    otherwise the iterator is empty.
+
     Returns:
         iterator: over nick names
     """
 
+    member_count = property(_get_member_count)
+    """ Number of visible users in this channel (*read-only*).
+
+    Returns:
+        int: number of members or ``None`` with
+        :py:attr:`SyncPolicy.NONE<.SyncPolicy.NONE>`
+    """
+
+    sync_policy = property(_get_sync_policy)
+    """ How members of this channel are tracked (*read-only*).
+
+    Returns:
+        str: one of the constants of :py:class:`.SyncPolicy`
+    """
+
+    restored = property(_is_restored)
+    """ Whether this information was restored from a state snapshot and has
+    not yet been confirmed by the server (*read-only*).
+
+    See :py:meth:`IRCClient.enable_state_snapshots()<.IRCClient.enable_state_snapshots>`.
+
+    Returns:
+        bool: ``True`` until the client rejoined the channel and received its
+        current members.
+    """
+
+    bans = property(_get_bans)
+    """ Bans (mode +b) of the channel (*read-only*).
+
+    The server only sends the list on request, see
+    :py:meth:`IRCClient.request_mask_list()<.IRCClient.request_mask_list>`.
+    Afterwards it is kept up to date from mode changes.
+
+    Returns:
+        :py:class:`.MaskList`
+    """
+
+    ban_exceptions = property(_get_ban_exceptions)
+    """ Ban exceptions (mode +e) of the channel (*read-only*).
+
+    Returns:
+        :py:class:`.MaskList`
+    """
+
+    invite_exceptions = property(_get_invite_exceptions)
+    """ Invite exceptions (mode +I) of the channel (*read-only*).
+
+    Returns:
+        :py:class:`.MaskList`
+    """
+
+
+class MaskList(object):
+    """ A list of hostmasks of a channel, like its bans (*read-only*).
+
+    The masks are indexed by a :py:class:`HostmaskMatcher<fredirc.HostmaskMatcher>`, so
+    the masks that match a user are found quickly even in long lists.
+    """
+
+    def __init__(self, mode, casemapping='rfc1459'):
+        self._mode = mode
+        self._matcher = HostmaskMatcher(casemapping)
+        # key: normalized mask, value: (mask, set by, set at)
+        self._entries = collections.OrderedDict()
+        self._complete = False
+
+    def match(self, nick, user=None, host=None):
+        """ Find the masks that match a user.
+
+        Args:
+            nick (str): nick of the user
+            user (str): user name or None if unknown
+            host (str): host or None if unknown
+        Returns:
+            list of str: the matching masks as set in the channel
+        """
+        return self._matcher.match(nick, user, host)
+
+    def info(self, mask):
+        """ Return who set a mask and when.
+
+        Returns:
+            tuple: the nick (or hostmask) that set the mask and the unix time
+            (int) it was set. Both are None if unknown.
+        Raises:
+            KeyError: if the mask is not in the list
+        """
+        return self._entries[self._matcher._normalize(mask)][1:]
+
+    def _add(self, mask, set_by=None, set_at=None):
+        key = self._matcher.add(mask, mask)
+        self._entries[key] = (mask, set_by, set_at)
+
+    def _remove(self, mask):
+        self._matcher.remove(mask)
+        self._entries.pop(self._matcher._normalize(mask), None)
+
+    def _replace(self, entries):
+        """ Replace all masks by a complete list of (mask, set by, set at)
+        tuples received from the server.
+        """
+        self._matcher = HostmaskMatcher(self._matcher._casemapping)
+        self._entries.clear()
+        for entry in entries:
+            self._add(*entry)
+        self._complete = True
+
+    def _set_casemapping(self, casemapping):
+        """ Re-index the masks for another casemapping. """
+        if casemapping == self._matcher._casemapping:
+            return
+        entries = list(self._entries.values())
+        self._matcher = HostmaskMatcher(casemapping)
+        self._entries.clear()
+        for entry in entries:
+            self._add(*entry)
+
+    def _get_mode(self):
+        return self._mode
+
+    def _is_complete(self):
+        return self._complete
 
-class _ReadOnlyDict(collections.Mapping):
+    def __iter__(self):
+        return (entry[0] for entry in list(self._entries.values()))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, mask):
+        return mask in self._matcher
+
+    mode = property(_get_mode)
+    """ The channel mode of the list (e.g. ``'b'`` for bans). """
+
+    complete = property(_is_complete)
+    """ Whether the complete list was received from the server.
+
+    Otherwise the list only contains masks that were set while the client
+    was in the channel.
+
+    Returns:
+        bool
+    """
+
+
+class _ReadOnlyDict(collections.abc.Mapping):
     """ A mapping that serves as a read-only view on a dict. """
 
     def __init__(self, data):
@@ -90,3 +362,48 @@ class _ReadOnlyDict(collections.Mapping):
 
     def values(self):
         return self._data.values()
+
+
+class _ChannelDict(dict):
+    """ A dict of channel names and ChannelInfos that also finds channels by
+    names in another case (see :py:meth:`.find`).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        # key: normalized channel name, value: channel name
+        self._index = {}
+        self._casemapping = 'rfc1459'
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, name, info):
+        super().__setitem__(name, info)
+        self._index[parsing.irc_lower(name, self._casemapping)] = name
+
+    def __delitem__(self, name):
+        super().__delitem__(name)
+        self._index.pop(parsing.irc_lower(name, self._casemapping), None)
+
+    def pop(self, name, *default):
+        if name in self:
+            self._index.pop(parsing.irc_lower(name, self._casemapping), None)
+        return super().pop(name, *default)
+
+    def update(self, *args, **kwargs):
+        for name, info in dict(*args, **kwargs).items():
+            self[name] = info
+
+    def clear(self):
+        super().clear()
+        self._index.clear()
+
+    def find(self, name, casemapping='rfc1459'):
+        """ Return the ChannelInfo of a channel name in any case or None. """
+        info = self.get(name)
+        if info is not None:
+            return info
+        if casemapping != self._casemapping:
+            self._casemapping = casemapping
+            self._index = {parsing.irc_lower(key, casemapping): key
+                           for key in self}
+        return self.get(self._index.get(parsing.irc_lower(name, casemapping)))
@@ -10,6 +10,16 @@ Specification: RFC 2812 'IRC: Client Protocol'.
 
 __all__ = ['Err']
 
+import re
+
+# Maximum length of an irc message in bytes, including CR-LF
+MAX_MESSAGE_LENGTH = 512
+
+# Line breaks that split a text into several messages. Unlike
+# str.splitlines() this does not split at other control characters like the
+# italics formatting code \x1d.
+_LINE_BREAK = re.compile(r'\r\n|\r|\n')
+
 
 class Cmd:
     """ Commands """
@@ -52,6 +62,10 @@ class ChannelMode:
     # Channel modes affecting a single user
     OPERATOR = 'o'
     VOICE = 'v'
+    # Channel modes with lists of hostmasks
+    BAN = 'b'
+    BAN_EXCEPTION = 'e'
+    INVITE_EXCEPTION = 'I'
     # Channel modes affecting the channel itself
     # Not yet implemented...
 
@@ -59,9 +73,16 @@ class ChannelMode:
 class Rpl:
     """ Command Replies """
     WELCOME = 1
+    ISUPPORT = 5
     NAMREPLY = 353
     ENDOFNAMES = 366
     TOPIC = 332
+    INVITELIST = 346
+    ENDOFINVITELIST = 347
+    EXCEPTLIST = 348
+    ENDOFEXCEPTLIST = 349
+    BANLIST = 367
+    ENDOFBANLIST = 368
 
 
 class Err:
@@ -189,62 +210,94 @@ class Err:
     }
 
 
+# Pre-encoded parts of messages. The functions below join them with the
+# encoded arguments, so a message is encoded only once and no intermediate
+# strings are created.
+_CRLF = b'\r\n'
+_NICK = Cmd.NICK.encode('ascii') + b' '
+_PASS = Cmd.PASS.encode('ascii')
+_PASS_WITH_ARG = _PASS + b' :'
+_USER = Cmd.USER.encode('ascii') + b' '
+_QUIT = Cmd.QUIT.encode('ascii')
+_QUIT_WITH_ARG = _QUIT + b' :'
+_JOIN = Cmd.JOIN.encode('ascii') + b' '
+_PONG = Cmd.PONG.encode('ascii') + b' :'
+_PRIVMSG = Cmd.PRIVMSG.encode('ascii') + b' '
+_PART = Cmd.PART.encode('ascii') + b' '
+_KICK = Cmd.KICK.encode('ascii') + b' '
+_MODE = Cmd.MODE.encode('ascii') + b' '
+
+
+def _encode(value):
+    """ Encode a str as UTF-8. Bytes are returned unchanged. """
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+
+def _encode_list(values):
+    """ Encode a sequence of str as comma separated list. """
+    return ','.join(values).encode('utf-8')
+
+
+# The following functions create complete messages as bytes, including the
+# terminating CR-LF.
+
 def nick(name):
-    return '{nick_cmd} {name}'.format(
-            nick_cmd=Cmd.NICK, name=name)
+    return b''.join((_NICK, _encode(name), _CRLF))
 
 
 def password(pwd=None):
     if pwd:
-        return '{pass_cmd} :{password}'.format(
-                pass_cmd=Cmd.PASS, password=pwd)
+        return b''.join((_PASS_WITH_ARG, _encode(pwd), _CRLF))
     else:
-        return Cmd.PASS
+        return _PASS + _CRLF
 
 
 def user(user_name, real_name, invisible=False, receive_wallops=False):
     # TODO set mode correctly
-    mode = 0
-    return '{user_cmd} {user} {mode} * :{real_name}'.format(
-            user_cmd=Cmd.USER, user=user_name, mode=mode, real_name=real_name)
+    mode = b'0'
+    return b''.join((_USER, _encode(user_name), b' ', mode, b' * :',
+                     _encode(real_name), _CRLF))
 
 
 def quit(message=None):
     if message:
-        return '{quit_cmd} :{message}'.format(
-                quit_cmd=Cmd.QUIT, message=message)
+        return b''.join((_QUIT_WITH_ARG, _encode(message), _CRLF))
     else:
-        return Cmd.QUIT
+        return _QUIT + _CRLF
 
 
 def join(channels):
-    return '{join_cmd} {channels}'.format(
-            join_cmd=Cmd.JOIN, channels=','.join(channels))
+    return b''.join((_JOIN, _encode_list(channels), _CRLF))
 
 
 def pong(server):
-    return '{pong_cmd} :{server}'.format(
-            pong_cmd=Cmd.PONG, server=server)
+    return b''.join((_PONG, _encode(server), _CRLF))
 
 
 def privmsg(target, message, sender=None):
-    if not sender:
-        sender = ''
-    return ':{sender} {msg_cmd} {target} :{message}'.format(
-            sender=sender, msg_cmd=Cmd.PRIVMSG, target=target, message=message)
+    """
+    Args:
+        target (str): the target(s)
+        message (str or bytes): the text, bytes must be UTF-8 encoded
+        sender (str): optional prefix
+    """
+    if sender:
+        return b''.join((b':', _encode(sender), b' ', _PRIVMSG,
+                         _encode(target), b' :', _encode(message), _CRLF))
+    return b''.join((_PRIVMSG, _encode(target), b' :', _encode(message),
+                     _CRLF))
 
 
 def part(channels, message):
-    return '{part_cmd} {channels} :{message}'.format(
-            part_cmd=Cmd.PART, channels=','.join(channels), message=message)
+    return b''.join((_PART, _encode_list(channels), b' :', _encode(message),
+                     _CRLF))
 
 
 def kick(channels, users, message=None):
-    if not message:
-        message = ''
-    return '{kick_cmd} {channels} {users} :{message}'.format(
-        kick_cmd=Cmd.KICK, channels=','.join(channels), users=','.join(users),
-        message=message)
+    return b''.join((_KICK, _encode_list(channels), b' ', _encode_list(users),
+                     b' :', _encode(message) if message else b'', _CRLF))
 
 
 def channel_mode(channel, mode_change):
@@ -252,7 +305,83 @@ def channel_mode(channel, mode_change):
     Args:
         mode_change (ChannelModelChange)
     """
-    change = '+' if mode_change.added else '-'
-    return '{mode_cmd} {channel} {change}{mode} {params}'.format(
-            mode_cmd=Cmd.MODE, channel=channel, change=change,
-            mode=mode_change.mode, params=' '.join(mode_change.params))
\ No newline at end of file
+    change = b'+' if mode_change.added else b'-'
+    return b''.join((_MODE, _encode(channel), b' ', change,
+                     _encode(mode_change.mode), b' ',
+                     _encode(' '.join(mode_change.params)), _CRLF))
+
+
+def channel_mode_list(channel, mode):
+    """ Request a list of hostmasks (e.g. the bans) of a channel.
+
+    Args:
+        mode (str): the list mode, e.g. ChannelMode.BAN
+    """
+    return b''.join((_MODE, _encode(channel), b' +', _encode(mode), _CRLF))
+
+
+def split_text(text, max_bytes):
+    """ Split a text into lines that do not exceed a length limit when
+    encoded as UTF-8.
+
+    Line breaks (CR, LF or CR-LF) in the text always start a new line; empty
+    lines are dropped. Other control characters, like IRC formatting codes,
+    are kept.
+    Lines are filled as much as possible. They are split at the last space
+    that fits, unless the following word would have to be split anyway.
+    Otherwise they are split at the last complete UTF-8 character.
+    The text is processed in linear time.
+
+    Args:
+        text (str): the text to split
+        max_bytes (int): maximum length of a line in bytes
+    Returns:
+        list of bytes: the UTF-8 encoded lines (at least one, which might be
+        empty)
+    """
+    if max_bytes < 4:
+        raise ValueError('max_bytes must be at least 4.')
+    lines = []
+    for text_line in _LINE_BREAK.split(text):
+        data = text_line.encode('utf-8')
+        start = 0
+        while len(data) - start > max_bytes:
+            end = start + max_bytes
+            cut = data.rfind(b' ', start + 1, end + 1)
+            # Only break at the space, if the next word fits in a line
+            if cut != -1:
+                next_space = data.find(b' ', cut + 1, cut + max_bytes + 2)
+                if next_space == -1 and len(data) - cut - 1 > max_bytes:
+                    cut = -1
+            if cut != -1:
+                lines.append(data[start:cut])
+                start = cut + 1
+            else:
+                # Don't cut inside of a multi-byte character
+                while data[end] & 0xC0 == 0x80:
+                    end -= 1
+                lines.append(data[start:end])
+                start = end
+        lines.append(data[start:])
+    lines = [line for line in lines if line]
+    return lines if lines else [b'']
+
+
+def channel_modes(channel, mode_changes):
+    """
+    Args:
+        mode_changes (sequence of ChannelModeChange)
+    """
+    modes = []
+    params = []
+    last_added = None
+    for mode_change in mode_changes:
+        if mode_change.added != last_added:
+            modes.append('+' if mode_change.added else '-')
+            last_added = mode_change.added
+        modes.append(mode_change.mode)
+        if mode_change.params:
+            params.extend(mode_change.params)
+    return b''.join((_MODE, _encode(channel), b' ', _encode(''.join(modes)),
+                     _encode(''.join(' ' + param for param in params)),
+                     _CRLF))
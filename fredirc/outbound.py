@@ -0,0 +1,457 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Classes that control how messages are sent to the server.
+"""
+
+__all__ = []
+
+import asyncio
+import collections
+import os
+import time
+
+from fredirc import messages
+from fredirc import parsing
+
+
+class FloodControl(object):
+    """ Limits the rate of outgoing messages, so that the server does not
+    disconnect the client for flooding.
+
+    Up to ``burst`` messages are written immediately. Afterwards one message
+    is written every ``interval`` seconds, while messages exceeding the rate
+    are queued in order.
+
+    Args:
+        write (function): function that writes a message to the server
+        burst (int): number of messages that may be sent at once
+        interval (float): time in seconds between two messages when the
+                          burst is exhausted
+    """
+
+    def __init__(self, write, burst=5, interval=2.0):
+        if burst < 1:
+            raise ValueError('burst must be at least 1.')
+        if interval < 0.0:
+            raise ValueError('interval must not be negative.')
+        self._write = write
+        self._burst = burst
+        self._interval = interval
+        self._loop = asyncio.get_event_loop()
+        self._queue = collections.deque()
+        # Number of messages that may be sent right now and the point in
+        # time (loop.time()) it was last updated.
+        self._tokens = float(burst)
+        self._updated = self._loop.time()
+        self._handle = None
+
+    def send(self, message):
+        """ Send a message or queue it if the rate limit is exceeded.
+
+        Args:
+            message: the message, passed unchanged to the write function
+        """
+        if not self._queue and self._take_token():
+            self._write(message)
+        else:
+            self._queue.append(message)
+            self._schedule()
+
+    def clear(self):
+        """ Discard all queued messages.
+
+        Returns:
+            list: the discarded messages
+        """
+        messages = list(self._queue)
+        self._queue.clear()
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        return messages
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _take_token(self):
+        now = self._loop.time()
+        if self._interval > 0.0:
+            self._tokens = min(
+                self._tokens + (now - self._updated) / self._interval,
+                self._burst)
+        else:
+            self._tokens = self._burst
+        self._updated = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    def _schedule(self):
+        if not self._handle:
+            delay = (1.0 - self._tokens) * self._interval
+            self._handle = self._loop.call_later(max(delay, 0.0), self._drain)
+
+    def _drain(self):
+        self._handle = None
+        while self._queue and self._take_token():
+            self._write(self._queue.popleft())
+        if self._queue:
+            self._schedule()
+
+
+class CommandCoalescer(object):
+    """ Collects JOIN, PART and channel MODE commands for a short time and
+    sends them merged into as few messages as possible.
+
+    Channels of JOIN and PART commands (with the same part message) are
+    combined into comma separated lists. Mode changes of a channel are
+    combined up to the number of modes per message the server permits.
+    Of several changes of the same mode for the same user (e.g. +o and -o)
+    only the last one is sent.
+
+    Args:
+        send (function): function that sends a message (bytes) to the
+                         server
+        window (float): time in seconds to collect commands
+        max_targets (function): function that returns the maximum number of
+            targets (or None for no limit) for a command name
+        max_modes (function): function that returns the maximum number of
+            mode changes per message (or None for no limit)
+        casemapping (function): function that returns the casemapping of
+            the server (see :py:func:`.parsing.irc_lower`)
+    """
+
+    def __init__(self, send, window, max_targets, max_modes,
+                 casemapping=lambda: 'rfc1459'):
+        self._send = send
+        self._window = window
+        self._max_targets = max_targets
+        self._max_modes = max_modes
+        self._casemapping = casemapping
+        self._loop = asyncio.get_event_loop()
+        self._handle = None
+        # key: lower case channel name, value: channel name
+        self._joins = collections.OrderedDict()
+        # key: part message, value: OrderedDict like self._joins
+        self._parts = collections.OrderedDict()
+        # key: lower case channel name, value: channel name and
+        # OrderedDict with key (mode, lower case param), value:
+        # ChannelModeChange
+        self._modes = collections.OrderedDict()
+
+    def join(self, channels):
+        """ Add channels to join. """
+        keys = [self._lower(channel) for channel in channels]
+        if any(key in parts for key in keys for parts in self._parts.values()):
+            # Keep the order of parting and rejoining
+            self.flush()
+        for key, channel in zip(keys, channels):
+            self._joins[key] = channel
+        self._schedule()
+
+    def part(self, channels, message):
+        """ Add channels to leave. """
+        keys = [self._lower(channel) for channel in channels]
+        if any(key in self._joins for key in keys):
+            self.flush()
+        parts = self._parts.setdefault(message, collections.OrderedDict())
+        for key, channel in zip(keys, channels):
+            parts[key] = channel
+        self._schedule()
+
+    def mode(self, channel, mode_change):
+        """ Add a change of a channel mode that takes a single parameter.
+
+        Args:
+            channel (str): the channel
+            mode_change (ChannelModeChange): the change
+        """
+        _, changes = self._modes.setdefault(
+            self._lower(channel), (channel, collections.OrderedDict()))
+        key = (mode_change.mode, self._lower(mode_change.params[0]))
+        # A pending change for the same mode and user is obsolete. The later
+        # change is kept, because the user's status before is unknown.
+        changes.pop(key, None)
+        changes[key] = mode_change
+        self._schedule()
+
+    def flush(self):
+        """ Send all collected commands. """
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        joins, self._joins = self._joins, collections.OrderedDict()
+        parts, self._parts = self._parts, collections.OrderedDict()
+        modes, self._modes = self._modes, collections.OrderedDict()
+        for channels in _pack(list(joins.values()),
+                              self._max_targets(messages.Cmd.JOIN),
+                              lambda group: messages.join(group)):
+            self._send(messages.join(channels))
+        for channel, changes in modes.values():
+            for group in _pack(list(changes.values()), self._max_modes(),
+                               lambda group: messages.channel_modes(
+                                   channel, group)):
+                self._send(messages.channel_modes(channel, group))
+        for message, channels in parts.items():
+            for group in _pack(list(channels.values()),
+                               self._max_targets(messages.Cmd.PART),
+                               lambda group: messages.part(group, message)):
+                self._send(messages.part(group, message))
+
+    def _lower(self, name):
+        return parsing.irc_lower(name, self._casemapping())
+
+    def _schedule(self):
+        if not self._handle:
+            self._handle = self._loop.call_later(self._window, self.flush)
+
+
+def _pack(items, max_items, build):
+    """ Split items into groups, so that no group has more than max_items
+    items and the message created by build(group) fits into the length limit
+    of irc messages.
+
+    Returns:
+        list of lists
+    """
+    groups = []
+    group = []
+    for item in items:
+        if group and (len(group) == max_items or
+                      len(build(group + [item])) > messages.MAX_MESSAGE_LENGTH):
+            groups.append(group)
+            group = []
+        group.append(item)
+    if group:
+        groups.append(group)
+    return groups
+
+
+class OutboundQueue(object):
+    """ Holds messages that can't be sent, because the client is not
+    connected, until they can be sent again.
+
+    Each message has a target (channel or nick) and expires after ``ttl``
+    seconds. If more than ``max_size`` messages are queued, the oldest ones
+    are discarded. Optionally the queue is backed by an append-only file, so
+    that messages survive a restart of the process.
+
+    Messages are kept per target, so that messages to a target that can't
+    be sent yet (e.g. a channel that was not rejoined) don't delay others.
+
+    Args:
+        max_size (int): maximum number of queued messages
+        ttl (float): time in seconds after which a message is discarded
+        path (str): path of the file that backs the queue or None
+    """
+
+    def __init__(self, max_size=1000, ttl=300.0, path=None):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1.')
+        self._max_size = max_size
+        self._ttl = ttl
+        self._path = path
+        self._next_id = 0
+        # All entries in the order they were queued, including removed ones,
+        # which are skipped. Entries: [id, expiration time, target, message,
+        # removed]
+        self._entries = collections.deque()
+        # key: target, value: deque of its entries, in the order the targets
+        # were first queued
+        self._targets = collections.OrderedDict()
+        self._size = 0
+        # Number of records in the file (entries and removals)
+        self._file_records = 0
+        # Number of messages discarded because the queue was full
+        self.dropped = 0
+        if path:
+            self._load()
+
+    def put(self, target, message, ttl=None):
+        """ Add a message to the queue.
+
+        Args:
+            target (str): the target of the message
+            message (bytes): the message
+            ttl (float): time in seconds after which the message is discarded
+                         or None for the ttl of the queue
+        """
+        if ttl is None:
+            ttl = self._ttl
+        entry = self._add(self._next_id, time.time() + ttl, target, message)
+        records = [_encode_entry(entry)]
+        if self._size > self._max_size:
+            records.append(_encode_removal([self._remove_oldest()]))
+            self.dropped += 1
+        self._append(records)
+
+    def has_target(self, target):
+        """ Return True if messages to the target are queued. """
+        entries = self._targets.get(target)
+        if entries is None:
+            return False
+        removed = self._expire(target, entries, time.time())
+        if removed:
+            self._compact_entries()
+            self._append([_encode_removal(removed)])
+        return target in self._targets
+
+    def pop(self, sendable):
+        """ Remove and return the unexpired messages of all targets that are
+        accepted by the function ``sendable``.
+
+        Expired messages are discarded.
+
+        Args:
+            sendable (function): called with a target, returns True if
+                                 messages to it can be sent now.
+        Returns:
+            list of bytes: the messages in the order they were queued
+        """
+        now = time.time()
+        popped = []
+        removed = []
+        for target, entries in list(self._targets.items()):
+            removed.extend(self._expire(target, entries, now))
+            if target in self._targets and sendable(target):
+                del self._targets[target]
+                for entry in entries:
+                    entry[4] = True
+                    removed.append(entry[0])
+                    popped.append(entry)
+                self._size -= len(entries)
+        if removed:
+            self._compact_entries()
+            self._append([_encode_removal(removed)])
+        popped.sort(key=lambda entry: entry[0])
+        return [entry[3] for entry in popped]
+
+    def clear(self):
+        """ Remove all messages.
+
+        Returns:
+            list: the unexpired messages as (target, message, seconds until
+            expiration) tuples in the order they were queued
+        """
+        now = time.time()
+        messages = [(entry[2], entry[3], entry[1] - now)
+                    for entry in self._entries
+                    if not entry[4] and entry[1] >= now]
+        self._entries.clear()
+        self._targets.clear()
+        self._size = 0
+        if self._path:
+            self._save()
+        return messages
+
+    def __len__(self):
+        return self._size
+
+    def _add(self, entry_id, expiration, target, message):
+        entry = [entry_id, expiration, target, message, False]
+        self._next_id = max(self._next_id, entry_id + 1)
+        self._entries.append(entry)
+        self._targets.setdefault(target, collections.deque()).append(entry)
+        self._size += 1
+        return entry
+
+    def _remove_oldest(self):
+        """ Remove the oldest entry and return its id. """
+        while self._entries[0][4]:
+            self._entries.popleft()
+        entry = self._entries.popleft()
+        entry[4] = True
+        entries = self._targets[entry[2]]
+        entries.popleft()
+        if not entries:
+            del self._targets[entry[2]]
+        self._size -= 1
+        return entry[0]
+
+    def _expire(self, target, entries, now):
+        """ Remove the expired entries of a target and return their ids. """
+        removed = []
+        while entries and entries[0][1] < now:
+            entry = entries.popleft()
+            entry[4] = True
+            removed.append(entry[0])
+        if not entries:
+            del self._targets[target]
+        self._size -= len(removed)
+        return removed
+
+    def _compact_entries(self):
+        while self._entries and self._entries[0][4]:
+            self._entries.popleft()
+        # Removed entries in the middle are only dropped once they are the
+        # majority
+        if len(self._entries) > 2 * self._size + 16:
+            self._entries = collections.deque(
+                entry for entry in self._entries if not entry[4])
+
+    def _append(self, records):
+        if not self._path:
+            return
+        self._file_records += len(records)
+        if self._file_records > 2 * self._size + 100:
+            self._save()
+            return
+        with open(self._path, 'ab') as f:
+            f.write(b''.join(records))
+
+    def _load(self):
+        try:
+            with open(self._path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        now = time.time()
+        entries = collections.OrderedDict()
+        for line in data.split(b'\r\n'):
+            try:
+                if line.startswith(b'-'):
+                    for entry_id in line[1:].split(b','):
+                        entries.pop(int(entry_id), None)
+                    continue
+                entry_id, expiration, target, message = line.split(b' ', 3)
+                entries[int(entry_id)] = (float(expiration),
+                                          target.decode('utf-8'),
+                                          message + b'\r\n')
+            except ValueError:
+                continue  # incomplete last line or garbage
+        for entry_id, (expiration, target, message) in entries.items():
+            if expiration >= now:
+                self._add(entry_id, expiration, target, message)
+        while self._size > self._max_size:
+            self._remove_oldest()
+        self._compact_entries()
+        self._save()
+
+    def _save(self):
+        """ Rewrite the file with the current entries only. """
+        tmp_path = self._path + '.tmp'
+        records = [_encode_entry(entry) for entry in self._entries
+                   if not entry[4]]
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(records))
+        os.replace(tmp_path, self._path)
+        self._file_records = len(records)
+
+
+def _encode_entry(entry):
+    """ Encode an entry of the OutboundQueue as record for its file. """
+    entry_id, expiration, target, message, _ = entry
+    return '{} {:.3f} {} '.format(entry_id, expiration, target).encode(
+        'utf-8') + message
+
+
+def _encode_removal(entry_ids):
+    """ Encode the removal of entries of the OutboundQueue as record for its
+    file.
+    """
+    return '-{}\r\n'.format(','.join(str(i) for i in entry_ids)).encode(
+        'ascii')
@@ -13,6 +13,8 @@ the irc message grammar (as described in RFC 2812).
 
 __all__ = []
 
+import re
+
 from fredirc.errors import ParserError
 from fredirc.messages import ChannelMode
 
@@ -52,10 +54,15 @@ def parse(message):
     command = tmp_split[0]
     # Parameters
     if len(tmp_split) == 2:
-        param_split = tmp_split[1].split(':', 1)
-        params = param_split[0].split()
-        if len(param_split) == 2:
-            params.append(param_split[1])
+        # Only a colon at the start of a parameter marks the trailing one,
+        # other parameters may contain colons (e.g. "CHANLIMIT=#:20").
+        if tmp_split[1].startswith(':'):
+            params = [tmp_split[1][1:]]
+        else:
+            param_split = tmp_split[1].split(' :', 1)
+            params = param_split[0].split()
+            if len(param_split) == 2:
+                params.append(param_split[1])
     return prefix, command, params
 
 
@@ -129,46 +136,69 @@ def parse_message_target(msg_target):
     return tuple(targets)
 
 
-def parse_channel_mode_params(params):
+def parse_channel_mode_params(params, chanmodes=None, prefix=None):
     """ Parse parameters of a channel mode message.
 
     The channel name must not be included in the parameter list!
-    .. warning::
-        This is incomplete! So far we only parse those modes that are
-        handled by FredIRC.
+
+    Which modes take a parameter is defined by the server's ISUPPORT tokens
+    CHANMODES and PREFIX. If they are not given, the modes of RFC 2811 are
+    assumed.
 
     Parses: *( ( "-" / "+" ) *<modes> *<modeparams> )
 
+    Args:
+        params (list of str): parameters of the mode message
+        chanmodes (str): value of the ISUPPORT token CHANMODES
+        prefix (str): value of the ISUPPORT token PREFIX
     Returns:
-        tuple of ChannelModeChange
+        tuple of ChannelModeChange, one for each changed mode
     """
     if not params[0].startswith('+') and not params[0].startswith('-'):
         raise ParserError(str(params))  # TODO ParserError expects the whole message
+    always_param, set_param = _mode_param_types(chanmodes, prefix)
     mode_changes = []
+    i = 0
+    while i < len(params):
+        modes = params[i]
+        i += 1
+        if not modes.startswith('+') and not modes.startswith('-'):
+            continue  # surplus parameter
+        added = True
+        for mode in modes:
+            if mode == '+':
+                added = True
+            elif mode == '-':
+                added = False
+            else:
+                mode_params = None
+                if mode in always_param or (added and mode in set_param):
+                    if i < len(params):
+                        mode_params = [params[i]]
+                        i += 1
+                mode_changes.append(
+                    ChannelModeChange(added, mode, mode_params))
+    return tuple(mode_changes)
 
-    for param in params:
-        added = None
-        if param.startswith('+'):
-            added = True
-        elif param.startswith('-'):
-            added = False
-
-        if added is None:
-            # param contains <modeparams> for the previous modeChange
-            if len(mode_changes):
-                if not mode_changes[-1].params:
-                    mode_changes[-1].params = []
-                mode_changes[-1].params.append(param)
-        else:   # param contains <modes>
-            # Easy so far, as we are only looking for a 'o' or 'v' at the end of
-            # the modes (they must be at the end, because they expect a
-            # parameter)
-            mode = param[-1:]
-            if mode == ChannelMode.OPERATOR or \
-               mode == ChannelMode.VOICE:
-                mode_changes.append(ChannelModeChange(added, mode))
 
-    return tuple(mode_changes)
+def _mode_param_types(chanmodes, prefix):
+    """ Determine which channel modes take a parameter.
+
+    Returns:
+        2-element tuple: a string of modes that always take a parameter and a
+        string of modes that take a parameter only when they are set.
+    """
+    if chanmodes:
+        types = chanmodes.split(',')
+        types += [''] * (4 - len(types))
+        list_modes, key_modes, set_modes = types[0], types[1], types[2]
+    else:
+        list_modes, key_modes, set_modes = 'beI', 'k', 'l'
+    if prefix and prefix.startswith('('):
+        prefix_modes = prefix[1:].split(')', 1)[0]
+    else:
+        prefix_modes = ChannelMode.OPERATOR + ChannelMode.VOICE
+    return list_modes + key_modes + prefix_modes, set_modes
 
 
 def parse_name_list(params):
@@ -194,6 +224,79 @@ def parse_name_list(params):
     nicks = [nick.lstrip("@+") for nick in params[-1].split()]
     return ChannelNickList(channel, tuple(nicks))
 
+
+def parse_isupport(params):
+    """ Parse the parameters of an RPL_ISUPPORT (005) message.
+
+    Parses: <target> 1*( ( [ "-" ] <key> ) / ( <key> "=" [ <value> ] ) )
+            :<text>
+
+    Escaped characters in values (e.g. "\\x20" for a space) are decoded.
+
+    Returns:
+        dict: tokens advertised by the server. Keys are upper case, values
+        are strings (empty if the token has no value) or None for negated
+        tokens ("-KEY") that the server withdrew.
+    """
+    tokens = {}
+    # Skip the target and the trailing human readable text
+    for param in params[1:-1]:
+        if param.startswith('-'):
+            tokens[param[1:].upper()] = None
+            continue
+        key, _, value = param.partition('=')
+        if '\\x' in value:
+            value = re.sub(r'\\x([0-9A-Fa-f]{2})',
+                           lambda m: chr(int(m.group(1), 16)), value)
+        tokens[key.upper()] = value
+    return tokens
+
+
+def parse_targmax(value):
+    """ Parse the value of the ISUPPORT token TARGMAX.
+
+    Parses: [ <command> ":" [ <limit> ] *( "," <command> ":" [ <limit> ] ) ]
+
+    Returns:
+        dict: upper case command names mapped to the maximum number of
+        targets (int) or None if there is no limit.
+    """
+    limits = {}
+    for item in value.split(','):
+        command, _, limit = item.partition(':')
+        if command:
+            limits[command.upper()] = int(limit) if limit.isdigit() else None
+    return limits
+
+
+# Translation tables for irc_lower(): the characters []\~ are the upper case
+# forms of {}|^ in the casemappings of RFC 1459.
+_CASEMAPPINGS = {
+    'ascii': str.maketrans(
+        'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'),
+    'strict-rfc1459': str.maketrans(
+        'ABCDEFGHIJKLMNOPQRSTUVWXYZ[]\\', 'abcdefghijklmnopqrstuvwxyz{}|'),
+    'rfc1459': str.maketrans(
+        'ABCDEFGHIJKLMNOPQRSTUVWXYZ[]\\~', 'abcdefghijklmnopqrstuvwxyz{}|^'),
+}
+
+
+def irc_lower(text, casemapping='rfc1459'):
+    """ Convert a nick, channel name or hostmask to lower case according to
+    the casemapping of the server (ISUPPORT token CASEMAPPING).
+
+    Unknown casemappings are treated as 'rfc1459'.
+
+    Args:
+        text (str): the text to convert
+        casemapping (str): 'ascii', 'rfc1459' or 'strict-rfc1459'
+    Returns:
+        str
+    """
+    table = _CASEMAPPINGS.get(casemapping, _CASEMAPPINGS['rfc1459'])
+    return text.translate(table)
+
+
 class ChannelNickList(object):
     """ Object that contains a tuple of nick names in a channel. """
 
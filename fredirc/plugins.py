@@ -0,0 +1,189 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Plugins that are imported when they are used for the first time.
+"""
+
+__all__ = ['PluginManager']
+
+import importlib
+import sys
+import time
+
+from fredirc.commands import CommandRouter
+from fredirc.events import EventBus
+
+
+class PluginManager(EventBus):
+    """ An :py:class:`.EventBus` that loads plugins on demand.
+
+    A plugin is an :py:class:`.IRCHandler` subclass in its own module. It is
+    registered with a few metadata: where to find the class, the events it
+    handles and the commands it provides. The module is only imported and the
+    plugin instantiated when one of these events occurs or one of the
+    commands is used for the first time. From then on all handler methods of
+    the plugin are subscribed to the bus (see
+    :py:meth:`EventBus.subscribe_handler()<.EventBus.subscribe_handler>`).
+    Loaded plugins can be replaced by instances of their reloaded modules via
+    :py:meth:`.reload` and put back into their unloaded state via
+    :py:meth:`.unload`.
+
+    Commands are routed by a :py:class:`.CommandRouter` and call methods of
+    the plugin with the arguments ``(sender, channel, *args)``.
+
+    Args:
+        handler (IRCHandler): optional handler that is subscribed with
+                              priority 0
+        command_prefixes (iterable of str): prefixes of the plugins' commands
+    """
+
+    def __init__(self, handler=None, command_prefixes=('!',)):
+        EventBus.__init__(self, handler)
+        self._router = CommandRouter(command_prefixes)
+        self._router_subscribed = False
+        # key: plugin name, value: _Plugin
+        self._plugins = {}
+
+    def register(self, name, target, events=(), commands=None, priority=0):
+        """ Register a plugin without importing it.
+
+        Args:
+            name (str): unique name of the plugin
+            target (str): module and class of the plugin as
+                          ``'package.module:ClassName'``
+            events (iterable of str): events that load the plugin, named like
+                                      in :py:meth:`EventBus.subscribe()<.EventBus.subscribe>`
+            commands (dict): command names mapped to the names of the plugin
+                             methods that execute them
+            priority (int): priority of the plugin's handler methods
+        """
+        if name in self._plugins:
+            raise ValueError('Plugin already registered: {}'.format(name))
+        module_name, _, class_name = target.partition(':')
+        if not module_name or not class_name:
+            raise ValueError('Invalid plugin target: {}'.format(target))
+        plugin = _Plugin(name, module_name, class_name, priority)
+        self._plugins[name] = plugin
+        for event in events:
+            stub = self._event_stub(plugin, event)
+            plugin.stubs.append((event, stub))
+            self.subscribe(event, stub, priority)
+        for command, method_name in (commands or {}).items():
+            self._router.add_command(
+                command, self._command_stub(plugin, method_name))
+            if not self._router_subscribed:
+                self.subscribe_handler(self._router)
+                self._router_subscribed = True
+
+    def load(self, name):
+        """ Import and instantiate a plugin, if it is not loaded yet.
+
+        Returns:
+            IRCHandler: the plugin instance
+        """
+        plugin = self._plugins[name]
+        if plugin.instance is None:
+            instance = self._instantiate(plugin, importlib.import_module,
+                                         plugin.module_name)
+            for event, stub in plugin.stubs:
+                self.unsubscribe(event, stub)
+            plugin.instance = instance
+            self.subscribe_handler(instance, plugin.priority)
+        return plugin.instance
+
+    def reload(self, name):
+        """ Reload the module of a plugin and replace the plugin instance by
+        a new one, e.g. to deploy a fix without restarting the client.
+
+        Plugins that were not loaded yet are just loaded. The
+        :py:meth:`.import_report` shows the cost of the reload afterwards.
+
+        Returns:
+            IRCHandler: the new plugin instance
+        """
+        plugin = self._plugins[name]
+        if plugin.instance is not None:
+            instance = self._instantiate(plugin, importlib.reload,
+                                         sys.modules[plugin.module_name])
+            self.unsubscribe_handler(plugin.instance)
+            plugin.instance = instance
+            self.subscribe_handler(instance, plugin.priority)
+        return self.load(name)
+
+    def unload(self, name):
+        """ Remove the instance of a loaded plugin from the bus.
+
+        The plugin stays registered and is instantiated again when one of
+        its events occurs or one of its commands is used. Its module is not
+        removed from ``sys.modules``.
+        """
+        plugin = self._plugins[name]
+        if plugin.instance is not None:
+            self.unsubscribe_handler(plugin.instance)
+            plugin.instance = None
+            for event, stub in plugin.stubs:
+                self.subscribe(event, stub, plugin.priority)
+
+    def load_all(self):
+        """ Load all registered plugins. """
+        for name in self._plugins:
+            self.load(name)
+
+    def plugin(self, name):
+        """ Return the instance of a loaded plugin or None. """
+        return self._plugins[name].instance
+
+    def import_report(self):
+        """ Report what importing the plugins cost.
+
+        Returns:
+            list of tuples: plugin name, time in seconds to import and
+            instantiate it (None if not loaded yet) and the number of modules
+            that were imported along with it, sorted by time (most expensive
+            first, plugins that were not loaded last).
+        """
+        return sorted(((plugin.name, plugin.load_time,
+                        plugin.imported_modules)
+                       for plugin in self._plugins.values()),
+                      key=lambda entry: (entry[1] is None, -(entry[1] or 0)))
+
+    def _instantiate(self, plugin, import_module, module):
+        """ Import a plugin's module via import_module(module), create an
+        instance of the plugin and record what it cost.
+        """
+        modules = len(sys.modules)
+        start = time.perf_counter()
+        instance = getattr(import_module(module), plugin.class_name)()
+        plugin.load_time = time.perf_counter() - start
+        plugin.imported_modules = len(sys.modules) - modules
+        return instance
+
+    def _event_stub(self, plugin, event):
+        def stub(*args, **kwargs):
+            instance = self.load(plugin.name)
+            # The plugin is subscribed now, but not for the event that is
+            # currently dispatched
+            getattr(instance, 'handle_' + event)(*args, **kwargs)
+        return stub
+
+    def _command_stub(self, plugin, method_name):
+        def stub(sender, channel, *args):
+            getattr(self.load(plugin.name), method_name)(sender, channel, *args)
+        return stub
+
+
+class _Plugin(object):
+    """ Metadata and state of a plugin registered at the PluginManager. """
+
+    def __init__(self, name, module_name, class_name, priority):
+        self.name = name
+        self.module_name = module_name
+        self.class_name = class_name
+        self.priority = priority
+        # (event, function) tuples that load the plugin
+        self.stubs = []
+        self.instance = None
+        self.load_time = None
+        self.imported_modules = None
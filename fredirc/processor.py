@@ -8,16 +8,36 @@ This module contains the MessageProcessor.
 
 __all__ = []
 
+import asyncio
 import re
+import time
 
 from fredirc import parsing
 from fredirc.errors import MessageHandlingError
 from fredirc.errors import ParserError
+from fredirc.handler import _ignores
 from fredirc.info import ChannelInfo
+from fredirc.info import SyncPolicy
+from fredirc.info import _ChannelDict
 from fredirc.messages import ChannelMode
 from fredirc.messages import Cmd
 from fredirc.messages import Rpl
 from fredirc.messages import Err
+from fredirc.task import Task
+
+# QUIT message of a user who was disconnected by a netsplit:
+# "<server still connected> <server that split off>"
+_NETSPLIT_QUIT = re.compile(r'^([\w*-]+(?:\.[\w*-]+)+) ([\w*-]+(?:\.[\w*-]+)+)$')
+
+# Replies with an entry of a mask list and the end of a list, mapped to the
+# channel mode of the list
+_MASK_LIST_REPLIES = {Rpl.BANLIST: ChannelMode.BAN,
+                      Rpl.EXCEPTLIST: ChannelMode.BAN_EXCEPTION,
+                      Rpl.INVITELIST: ChannelMode.INVITE_EXCEPTION}
+_END_OF_MASK_LIST_REPLIES = {Rpl.ENDOFBANLIST: ChannelMode.BAN,
+                             Rpl.ENDOFEXCEPTLIST: ChannelMode.BAN_EXCEPTION,
+                             Rpl.ENDOFINVITELIST: ChannelMode.INVITE_EXCEPTION}
+_MASK_LIST_MODES = frozenset(_MASK_LIST_REPLIES.values())
 
 
 class MessageProcessor(object):
@@ -27,13 +47,104 @@ class MessageProcessor(object):
     registered :py:class:`IRCHandler` is notified.
     """
 
-    def __init__(self, handler, state, logger):
+    def __init__(self, handler, state, logger, exception_handler=None):
         self._handler = handler
         self._state = state
         self._logger = logger
+        # Called with exceptions of the handler in calls the processor
+        # schedules itself. If None, they are raised into the event loop.
+        self._exception_handler = exception_handler
         # Channels whose information (like nick names) hasn't been received completely yet.
         # key: channel name, value: ChannelInfo
-        self._pending_channel_info = {}
+        self._pending_channel_info = _ChannelDict()
+        # Point in time (time.monotonic()) after which a pending channel is
+        # considered complete even without an ENDOFNAMES message.
+        # key: channel name, value: deadline
+        self._pending_channel_deadlines = {}
+        self._next_pending_deadline = None
+        # Number of channels the client joined (including rejoins of
+        # restored channels)
+        self._own_joins = 0
+        # Seconds to wait for the ENDOFNAMES message of a pending channel
+        self.pending_channel_timeout = 60.0
+        # Pass each NAMREPLY to handle_channel_members() as it arrives
+        self.stream_names = False
+        # SyncPolicy for channels without an explicit policy
+        self.sync_policy = SyncPolicy.FULL
+        # key: channel name, value: SyncPolicy (see _sync_policy_for())
+        self.channel_sync_policies = _ChannelDict()
+        # Coalesce QUITs and JOINs caused by netsplits into
+        # handle_netsplit() and handle_netjoin()
+        self.detect_netsplits = False
+        # Seconds to collect QUITs/JOINs of a netsplit before the handler is
+        # notified
+        self.netsplit_window = 1.0
+        # Seconds to remember users lost in a netsplit to detect their return
+        self.netsplit_memory = 3600.0
+        # Seconds after the first users of a netsplit returned, after which
+        # the users of that netsplit who did not return are forgotten
+        self.netjoin_grace = 60.0
+        # Collected netsplits and netjoins that have not been passed to the
+        # handler yet.
+        # key: (server, remote server), value: set of nicks
+        self._netsplits = {}
+        # key: (server, remote server), value: dict of channel -> set of nicks
+        self._netjoins = {}
+        self._netsplit_task = None
+        # Pass all changes of a MODE message (or of all MODE messages within
+        # mode_batch_window seconds) to handle_mode_changes() at once
+        self.batch_modes = False
+        self.mode_batch_window = 0.0
+        # Collected mode changes that have not been passed to the handler yet
+        # key: (channel, initiator), value: list of ChannelModeChange
+        self._mode_batches = {}
+        self._mode_batch_task = None
+        # Users that were lost in a netsplit.
+        # key: nick, value: (server, remote server)
+        self._split_nicks = {}
+        # key: (server, remote server), value: time.monotonic() of the split
+        self._split_times = {}
+        # key: (server, remote server), value: time.monotonic() of the first
+        # netjoin after the split
+        self._rejoin_times = {}
+        # Pass channel messages to handle_channel_messages() in batches,
+        # collected during an iteration of the event loop (or until
+        # message_batch_size messages are collected)
+        self.batch_messages = False
+        self.message_batch_size = 1000
+        # Collected channel messages as (time.time(), channel, sender,
+        # message) that have not been passed to the handler yet
+        self._message_batch = []
+        self._message_batch_handle = None
+        # HostmaskMatcher with users whose messages are dropped or None
+        self.ignore_list = None
+        # InboundRateLimiter for channel and private messages or None
+        self.rate_limiter = None
+        # Entries of mask lists (bans etc.) that are being received.
+        # key: (channel, mode), value: list of (mask, set by, set at)
+        self._mask_list_replies = {}
+
+    def _reset(self):
+        """ Forget everything that belongs to the current connection, i.e.
+        pending channels and collected netsplits, mode changes and mask
+        lists.
+        """
+        self._pending_channel_info.clear()
+        self._pending_channel_deadlines.clear()
+        self._next_pending_deadline = None
+        self._mask_list_replies.clear()
+        if self._netsplit_task:
+            self._netsplit_task.stop()
+            self._netsplit_task = None
+        self._netsplits.clear()
+        self._netjoins.clear()
+        self._split_nicks.clear()
+        self._split_times.clear()
+        self._rejoin_times.clear()
+        if self._mode_batch_task:
+            self._mode_batch_task.stop()
+            self._mode_batch_task = None
+        self._mode_batches.clear()
 
     def process(self, message):
         """ Main message processing method.
@@ -45,8 +156,21 @@ class MessageProcessor(object):
             message (str): complete, raw message as received from the server.
         """
         assert self._state.connected
+        if self._next_pending_deadline is not None and \
+           time.monotonic() >= self._next_pending_deadline:
+            self._expire_pending_channels()
         try:
             prefix, command, params = parsing.parse(message)
+            if self._message_batch and command != Cmd.PRIVMSG:
+                # Keep the order of messages and other events
+                self._flush_message_batch()
+            if (self._netsplits or self._netjoins) and \
+               command not in (Cmd.QUIT, Cmd.JOIN, Cmd.PING):
+                # Events after a netsplit must not reach the handler before it
+                self._flush_netsplits()
+            if self._mode_batches and command in (Cmd.PART, Cmd.KICK):
+                # Mode changes must not reach the handler after the user left
+                self._flush_mode_batches()
             three_digits = re.compile('[0-9][0-9][0-9]')
             if three_digits.match(command):
                 numeric_reply = int(command)
@@ -62,6 +186,12 @@ class MessageProcessor(object):
             elif command == Cmd.PING:
                 self._process_ping(params, message)
             elif command == Cmd.PRIVMSG:
+                if self.ignore_list and prefix and \
+                   self.ignore_list.match_prefix(prefix):
+                    return
+                if self.rate_limiter is not None and prefix and \
+                   not self._allow_by_rate(prefix, params):
+                    return
                 self._process_privmsg(prefix, params, message)
             elif command == Cmd.JOIN:
                 self._process_join(prefix, params)
@@ -95,6 +225,10 @@ class MessageProcessor(object):
     def _process_privmsg(self, prefix, params, raw_msg):
         if not len(params) == 2:
             raise MessageHandlingError(raw_msg)
+        if _ignores(self._handler, 'private_message') and \
+                _ignores(self._handler, 'channel_messages'
+                         if self.batch_messages else 'channel_message'):
+            return
         sender = None
         if prefix:
             sender = parsing.parse_user_prefix(prefix)[0]
@@ -103,11 +237,44 @@ class MessageProcessor(object):
             msg = params[1]
             for target in targets:
                 if target.nick and target.nick == self._state.nick:
+                    if self._message_batch:
+                        self._flush_message_batch()
                     self._handler.handle_private_message(msg, sender)
                 elif target.channel and \
                      target.channel in self._state.channels.keys():
-                    self._handler.handle_channel_message(
-                            target.channel, msg, sender)
+                    if self.batch_messages:
+                        self._add_to_message_batch(target.channel, msg, sender)
+                    else:
+                        self._handler.handle_channel_message(
+                                target.channel, msg, sender)
+
+    def _add_to_message_batch(self, channel, message, sender):
+        self._message_batch.append((time.time(), channel, sender, message))
+        if len(self._message_batch) >= self.message_batch_size:
+            self._flush_message_batch()
+        elif self._message_batch_handle is None:
+            self._message_batch_handle = asyncio.get_event_loop().call_soon(
+                self._flush_message_batch_guarded)
+
+    def _flush_message_batch_guarded(self):
+        """ Flush the message batch outside of process(), passing
+        exceptions to the exception handler.
+        """
+        try:
+            self._flush_message_batch()
+        except Exception as e:
+            if self._exception_handler is None:
+                raise
+            self._exception_handler(e)
+
+    def _flush_message_batch(self):
+        """ Pass all collected channel messages to the handler. """
+        if self._message_batch_handle is not None:
+            self._message_batch_handle.cancel()
+            self._message_batch_handle = None
+        if self._message_batch:
+            batch, self._message_batch = self._message_batch, []
+            self._handler.handle_channel_messages(batch)
 
     def _process_numeric_reply(self, num, prefix, params, raw_msg):
         self._handler.handle_response(num, raw_msg)
@@ -119,24 +286,142 @@ class MessageProcessor(object):
             self._state.server = prefix
             self._state.nick = params[0]
             self._handler.handle_register()
+        elif num == Rpl.ISUPPORT:
+            for key, value in parsing.parse_isupport(params).items():
+                if value is None:
+                    self._state.isupport.pop(key, None)
+                else:
+                    self._state.isupport[key] = value
+                if key == 'CASEMAPPING':
+                    self._set_casemapping(value or 'rfc1459')
         elif num == Rpl.TOPIC:
             self._set_topic(params[1], params[2])
+        elif num in _MASK_LIST_REPLIES:
+            mode = _MASK_LIST_REPLIES[num]
+            if len(params) >= 3:
+                set_by = params[3] if len(params) > 3 else None
+                set_at = int(params[4]) if len(params) > 4 and \
+                    params[4].isdigit() else None
+                self._mask_list_replies.setdefault(
+                    (params[1], mode), []).append(
+                        (params[2], set_by, set_at))
+        elif num in _END_OF_MASK_LIST_REPLIES:
+            mode = _END_OF_MASK_LIST_REPLIES[num]
+            channel = params[1]
+            entries = self._mask_list_replies.pop((channel, mode), [])
+            info = self._channel_info(channel)
+            if info is not None:
+                info._mask_list(mode)._replace(entries)
         elif num == Rpl.NAMREPLY:
             channel = parsing.parse_name_list(params)
             if channel.channel_name in self._pending_channel_info:
                 self._pending_channel_info[channel.channel_name]._add_nicks(*channel.nicks)
+                if self.stream_names and \
+                        not _ignores(self._handler, 'channel_members'):
+                    self._handler.handle_channel_members(
+                        channel.channel_name, channel.nicks)
         elif num == Rpl.ENDOFNAMES:
             channel = params[1]
             if channel.startswith('#') or \
                channel.startswith('+') or \
                channel.startswith('&'):
                 if channel in self._pending_channel_info:
-                    channel_info = self._pending_channel_info.pop(channel)
-                    self._state.channels[channel] = channel_info
-                    self._handler.handle_own_join(channel)
+                    self._complete_pending_channel(channel)
+
+    def _channel_info(self, channel):
+        """ Return the ChannelInfo of a joined or pending channel or None.
+
+        Channel names from JOIN messages keep their case, while channel names
+        from message targets are lower case.
+        """
+        casemapping = self._casemapping()
+        return self._state.channels.find(channel, casemapping) or \
+            self._pending_channel_info.find(channel, casemapping)
+
+    def _allow_by_rate(self, prefix, params):
+        """ Check a PRIVMSG against the rate limiter. """
+        nick, user, host = parsing.parse_user_prefix(prefix)
+        if nick == self._state.nick:
+            return True
+        casemapping = self._casemapping()
+        sender = parsing.irc_lower(
+            '{}@{}'.format(user or '*', host) if host else nick, casemapping)
+        channel = None
+        if params and params[0] and params[0][0] in \
+           self._state.isupport.get('CHANTYPES', '#&+!'):
+            channel = parsing.irc_lower(params[0], casemapping)
+        return self.rate_limiter.allow(sender, channel)
+
+    def _casemapping(self):
+        return self._state.isupport.get('CASEMAPPING') or 'rfc1459'
+
+    def _set_casemapping(self, casemapping):
+        if self.ignore_list is not None:
+            self.ignore_list.set_casemapping(casemapping)
+        for channels in (self._state.channels, self._pending_channel_info):
+            for info in channels.values():
+                info._set_casemapping(casemapping)
+
+    def _sync_policy_for(self, channel):
+        policy = self.channel_sync_policies.find(channel, self._casemapping())
+        return self.sync_policy if policy is None else policy
+
+    def _set_sync_policy(self, channel, policy):
+        """ Set the SyncPolicy of a channel, replacing the policy of the
+        same channel in another case.
+        """
+        casemapping = self._casemapping()
+        name = parsing.irc_lower(channel, casemapping)
+        for other in [other for other in self.channel_sync_policies
+                      if parsing.irc_lower(other, casemapping) == name]:
+            del self.channel_sync_policies[other]
+        self.channel_sync_policies[channel] = policy
+
+    def _add_pending_channel(self, channel, sync_policy):
+        self._pending_channel_info[channel] = ChannelInfo(
+            channel, sync_policy, self._casemapping())
+        deadline = time.monotonic() + self.pending_channel_timeout
+        self._pending_channel_deadlines[channel] = deadline
+        if self._next_pending_deadline is None or \
+           deadline < self._next_pending_deadline:
+            self._next_pending_deadline = deadline
+
+    def _complete_pending_channel(self, channel):
+        channel_info = self._pending_channel_info.pop(channel)
+        del self._pending_channel_deadlines[channel]
+        if not self._pending_channel_deadlines:
+            self._next_pending_deadline = None
+        self._state.channels[channel] = channel_info
+        self._own_joins += 1
+        if self._message_batch:
+            # Messages received earlier must not reach the handler later
+            self._flush_message_batch()
+        self._handler.handle_own_join(channel)
+
+    def _expire_pending_channels(self):
+        """ Complete all pending channels whose ENDOFNAMES message did not
+        arrive in time.
+
+        The client is in those channels (the server confirmed the JOIN), so
+        the members received so far are used.
+        """
+        now = time.monotonic()
+        expired = [channel for channel, deadline
+                   in self._pending_channel_deadlines.items()
+                   if deadline <= now]
+        for channel in expired:
+            self._logger.warning(('No end of member list received for {}. ' +
+                                  'Member list might be incomplete.').format(
+                                 channel))
+            self._complete_pending_channel(channel)
+        if self._pending_channel_deadlines:
+            self._next_pending_deadline = min(
+                self._pending_channel_deadlines.values())
 
     def _process_numeric_error(self, num, params, raw_msg):
         # Remove the first parameter which is always the message target
+        if _ignores(self._handler, 'error'):
+            return
         params = params[1:]
         param_names = Err.ERROR_PARAMETERS[num]
         kwargs = {}
@@ -153,15 +438,49 @@ class MessageProcessor(object):
         self._handler.handle_error(num, **kwargs)
 
     def _process_join(self, prefix, params):
-        nick = parsing.parse_user_prefix(prefix)[0]
+        nick, user, host = parsing.parse_user_prefix(prefix)
         channel = params[0]
         if self._state.nick == nick:
-            if channel not in self._state.channels.keys():
-                self._pending_channel_info[channel] = ChannelInfo(channel)
+            self._flush_netsplits()
+            # The prefix shows how the server presents the client to others
+            if host:
+                self._state.user = user
+                self._state.host = host
+            # Channels restored from a snapshot are synchronized again, but
+            # stay available until the new information is complete.
+            if channel not in self._state.channels.keys() or \
+               self._state.channels[channel].restored:
+                sync_policy = self._sync_policy_for(channel)
+                if sync_policy == SyncPolicy.NONE:
+                    # Nothing to wait for
+                    self._state.channels[channel] = ChannelInfo(
+                        channel, sync_policy, self._casemapping())
+                    self._own_joins += 1
+                    self._handler.handle_own_join(channel)
+                else:
+                    self._add_pending_channel(channel, sync_policy)
+        elif self.detect_netsplits and self._is_split_nick(nick):
+            servers = self._split_nicks[nick]
+            # The user might rejoin before the QUIT of the split was reported
+            if any(nick in nicks for nicks in self._netsplits.values()):
+                self._flush_netsplits()
+            channels = self._netjoins.setdefault(servers, {})
+            channels.setdefault(channel, set()).add(nick)
+            self._schedule_netsplit_flush()
         else:
+            self._flush_netsplits()
             self._state.channels[channel]._add_nicks(nick)
             self._handler.handle_join(channel, nick)
 
+    def _is_split_nick(self, nick):
+        """ Check whether a user was lost in a netsplit that is still
+        remembered.
+        """
+        if nick not in self._split_nicks:
+            return False
+        self._forget_netsplits(time.monotonic())
+        return nick in self._split_nicks
+
     def _process_part(self, prefix, params):
         nick = parsing.parse_user_prefix(prefix)[0]
         channel = params[0]
@@ -180,7 +499,7 @@ class MessageProcessor(object):
         old_nick = parsing.parse_user_prefix(prefix)[0]
         new_nick = params[0]
         for channel_info in self._state.channels.values():
-            if old_nick in channel_info.nicks:
+            if channel_info._has_nick(old_nick):
                 channel_info._remove_nick(old_nick)
                 channel_info._add_nicks(new_nick)
         if old_nick == self._state.nick:
@@ -202,8 +521,25 @@ class MessageProcessor(object):
             raise MessageHandlingError(raw_msg)
 
     def _process_channel_mode(self, channel, params, initiator):
-        mode_changes = parsing.parse_channel_mode_params(params)
+        mode_changes = parsing.parse_channel_mode_params(
+            params, self._state.isupport.get('CHANMODES'),
+            self._state.isupport.get('PREFIX'))
+        self._apply_mask_list_changes(channel, mode_changes, initiator)
+        if self.batch_modes:
+            self._apply_own_mode_changes(channel, mode_changes)
+            if _ignores(self._handler, 'mode_changes'):
+                return
+            if self.mode_batch_window > 0.0:
+                self._mode_batches.setdefault(
+                    (channel, initiator), []).extend(mode_changes)
+                self._schedule_mode_batch_flush()
+            else:
+                self._handler.handle_mode_changes(
+                    channel, mode_changes, initiator)
+            return
         for mode_change in mode_changes:
+            if not mode_change.params:
+                continue
             # Look for channel modes that affect users
             if mode_change.mode == ChannelMode.OPERATOR:
                 user = mode_change.params[0]
@@ -234,6 +570,61 @@ class MessageProcessor(object):
                     else:
                         self._handler.handle_lost_voice(channel, user, initiator)
 
+    def _apply_mask_list_changes(self, channel, mode_changes, initiator):
+        """ Update the cached bans, ban exceptions and invite exceptions of a
+        channel.
+        """
+        info = self._channel_info(channel)
+        if info is None:
+            return
+        now = int(time.time())
+        for mode_change in mode_changes:
+            if mode_change.mode in _MASK_LIST_MODES and mode_change.params:
+                mask_list = info._mask_list(mode_change.mode)
+                if mode_change.added:
+                    mask_list._add(mode_change.params[0], initiator, now)
+                else:
+                    mask_list._remove(mode_change.params[0])
+
+    def _apply_own_mode_changes(self, channel, mode_changes):
+        """ Update the client's operator and voice status in a channel
+        according to the final result of all given mode changes.
+        """
+        op = voice = None
+        for mode_change in mode_changes:
+            if mode_change.params and \
+               mode_change.params[0] == self._state.nick:
+                if mode_change.mode == ChannelMode.OPERATOR:
+                    op = mode_change.added
+                elif mode_change.mode == ChannelMode.VOICE:
+                    voice = mode_change.added
+        for status, channels in ((op, self._state.operator_in),
+                                 (voice, self._state.has_voice_in)):
+            if status and channel not in channels:
+                channels.append(channel)
+            elif status is False and channel in channels:
+                channels.remove(channel)
+
+    def _schedule_mode_batch_flush(self):
+        if not self._mode_batch_task:
+            def flush():
+                self._mode_batch_task = None
+                self._flush_mode_batches()
+            self._mode_batch_task = Task(self.mode_batch_window, False, flush)
+            self._mode_batch_task.start()
+
+    def _flush_mode_batches(self):
+        """ Pass all collected mode changes to the handler. """
+        if self._mode_batch_task:
+            self._mode_batch_task.stop()
+            self._mode_batch_task = None
+        batches, self._mode_batches = self._mode_batches, {}
+        if not self._state.connected:
+            return
+        for (channel, initiator), mode_changes in batches.items():
+            self._handler.handle_mode_changes(
+                channel, tuple(mode_changes), initiator)
+
     def _process_kick(self, prefix, params):
         if len(params) < 2:
             return  # TODO how to handle malformed messages in processor?
@@ -266,7 +657,86 @@ class MessageProcessor(object):
         quit_message = None
         if len(params) > 0:
             quit_message = params[0]
+        if self.detect_netsplits and quit_message:
+            match = _NETSPLIT_QUIT.match(quit_message)
+            if match and match.group(1) != match.group(2):
+                self._netsplits.setdefault(match.groups(), set()).add(nick)
+                self._schedule_netsplit_flush()
+                return
+        self._flush_netsplits()
         for channel_info in self._state.channels.values():
-            if nick in channel_info.nicks:
+            if channel_info._has_nick(nick):
                 channel_info._remove_nick(nick)
         self._handler.handle_quit(nick, quit_message)
+
+    def _schedule_netsplit_flush(self):
+        if not self._netsplit_task:
+            def flush():
+                self._netsplit_task = None
+                self._flush_netsplits()
+            self._netsplit_task = Task(self.netsplit_window, False, flush)
+            self._netsplit_task.start()
+
+    def _flush_netsplits(self):
+        """ Apply all collected netsplits and netjoins to the client state and
+        notify the handler.
+        """
+        if not self._netsplits and not self._netjoins:
+            return
+        if self._netsplit_task:
+            self._netsplit_task.stop()
+            self._netsplit_task = None
+        netsplits, self._netsplits = self._netsplits, {}
+        netjoins, self._netjoins = self._netjoins, {}
+        if not self._state.connected:
+            return
+        now = time.monotonic()
+        notify_splits = not _ignores(self._handler, 'netsplit')
+        notify_joins = not _ignores(self._handler, 'netjoin')
+        for servers, nicks in netsplits.items():
+            members = {}
+            for channel, channel_info in self._state.channels.items():
+                removed = channel_info._remove_nicks(nicks)
+                if removed and notify_splits:
+                    members[channel] = frozenset(removed)
+            for nick in nicks:
+                self._split_nicks[nick] = servers
+            self._split_times[servers] = now
+            self._rejoin_times.pop(servers, None)
+            if notify_splits:
+                self._handler.handle_netsplit(
+                    servers, frozenset(nicks), members)
+        for servers, channels in netjoins.items():
+            members = {}
+            nicks = set()
+            for channel, joined in channels.items():
+                if channel in self._state.channels:
+                    self._state.channels[channel]._add_nicks(*joined)
+                    if notify_joins:
+                        members[channel] = frozenset(joined)
+                    nicks.update(joined)
+            for nick in nicks:
+                self._split_nicks.pop(nick, None)
+            self._rejoin_times.setdefault(servers, now)
+            if nicks and notify_joins:
+                self._handler.handle_netjoin(servers, frozenset(nicks), members)
+        self._forget_netsplits(now)
+
+    def _forget_netsplits(self, now):
+        """ Forget users of netsplits that are older than netsplit_memory
+        and those who did not return with the servers of their netsplit
+        within netjoin_grace.
+        """
+        expired = set(servers for servers, split_time
+                      in self._split_times.items()
+                      if now - split_time > self.netsplit_memory)
+        expired.update(servers for servers, rejoin_time
+                       in self._rejoin_times.items()
+                       if now - rejoin_time > self.netjoin_grace)
+        if expired:
+            for servers in expired:
+                self._split_times.pop(servers, None)
+                self._rejoin_times.pop(servers, None)
+            self._split_nicks = {nick: servers for nick, servers
+                                 in self._split_nicks.items()
+                                 if servers not in expired}
@@ -0,0 +1,183 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Classes that limit the rate of incoming messages.
+"""
+
+__all__ = []
+
+import collections
+import time
+
+
+class RateLimiter(object):
+    """ Token buckets for many keys (like users or channels), of which only
+    the most recently used ones are kept.
+
+    Each key may pass ``burst`` times at once and afterwards once every
+    ``interval`` seconds. A key whose bucket is evicted starts with a full
+    bucket again, so ``max_keys`` should be larger than the number of keys
+    that are active at the same time.
+
+    Args:
+        burst (int): number of times a key may pass at once
+        interval (float): time in seconds until a key may pass once more when
+                          the burst is exhausted
+        max_keys (int): maximum number of keys to keep
+    """
+
+    def __init__(self, burst, interval, max_keys=10000):
+        if burst < 1:
+            raise ValueError('burst must be at least 1.')
+        if interval <= 0.0:
+            raise ValueError('interval must be greater than 0.')
+        if max_keys < 1:
+            raise ValueError('max_keys must be at least 1.')
+        self._burst = burst
+        self._interval = interval
+        self._max_keys = max_keys
+        # key: key, value: [tokens, time.monotonic() of the last update,
+        # number of rejections, rejections since the key last passed],
+        # least recently used first
+        self._buckets = collections.OrderedDict()
+        # Total number of rejections, including those of evicted keys
+        self.rejected = 0
+
+    def allow(self, key, now=None):
+        """ Take a token of a key.
+
+        Args:
+            key: the key
+            now (float): current time (:py:func:`time.monotonic`)
+        Returns:
+            bool: ``True`` if the key may pass, ``False`` if its rate is
+            exceeded
+        """
+        if now is None:
+            now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self._max_keys:
+                self._buckets.popitem(last=False)
+            bucket = [float(self._burst), now, 0, 0]
+            self._buckets[key] = bucket
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(bucket[0] + (now - bucket[1]) / self._interval,
+                            self._burst)
+            bucket[1] = now
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return True
+        bucket[2] += 1
+        bucket[3] += 1
+        self.rejected += 1
+        return False
+
+    def give_back(self, key):
+        """ Return the token a key took by its last :py:meth:`.allow`. """
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(bucket[0] + 1.0, self._burst)
+
+    def rejections(self):
+        """ Return the number of rejections per key that is still kept.
+
+        Returns:
+            dict: keys mapped to their number of rejections (keys without
+            rejections are omitted)
+        """
+        return {key: bucket[2] for key, bucket in self._buckets.items()
+                if bucket[2]}
+
+    def pop_recent_rejections(self, key):
+        """ Return and reset the number of rejections of a key since it last
+        passed.
+        """
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return 0
+        count, bucket[3] = bucket[3], 0
+        return count
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class InboundRateLimiter(object):
+    """ Limits the rate of channel and private messages per user and per
+    channel, so that a single user (or a crowd in a channel) can't flood the
+    handler.
+
+    Users are identified by ``user@host`` (or their nick, if the server does
+    not send the host), so changing the nick does not reset their limit.
+    Dropped messages are counted per user and channel and logged in one line
+    per user or channel once messages pass again.
+
+    Args:
+        logger (logging.Logger): logger for dropped messages
+        user_burst (int): number of messages a user may send at once
+        user_interval (float): time in seconds per message of a user when the
+                               burst is exhausted
+        channel_burst (int): number of messages that may arrive in a channel
+                             at once
+        channel_interval (float): time in seconds per message of a channel
+                                  when the burst is exhausted
+        max_entries (int): maximum number of users and of channels whose
+                           rate is tracked (least recently active ones are
+                           forgotten first)
+    """
+
+    def __init__(self, logger, user_burst=5, user_interval=1.0,
+                 channel_burst=20, channel_interval=0.25, max_entries=10000):
+        self._logger = logger
+        self._users = RateLimiter(user_burst, user_interval, max_entries)
+        self._channels = RateLimiter(channel_burst, channel_interval,
+                                     max_entries)
+
+    def allow(self, user, channel=None):
+        """ Check whether a message may be processed.
+
+        Args:
+            user (str): normalized ``user@host`` or nick of the sender
+            channel (str): normalized channel name or None for private
+                           messages
+        Returns:
+            bool: ``False`` if the message must be dropped
+        """
+        now = time.monotonic()
+        if not self._users.allow(user, now):
+            return False
+        if channel is not None and not self._channels.allow(channel, now):
+            # The user is not to blame
+            self._users.give_back(user)
+            return False
+        self._log_drops(self._users, user, 'from')
+        if channel is not None:
+            self._log_drops(self._channels, channel, 'in')
+        return True
+
+    @property
+    def dropped(self):
+        """ Total number of dropped messages. """
+        return self._users.rejected + self._channels.rejected
+
+    def stats(self):
+        """ Return the numbers of dropped messages.
+
+        Returns:
+            dict: the total number (``'dropped'``) and dicts with the numbers
+            per user (``'users'``) and per channel (``'channels'``) of users
+            and channels that are still tracked
+        """
+        return {'dropped': self.dropped,
+                'users': self._users.rejections(),
+                'channels': self._channels.rejections()}
+
+    def _log_drops(self, limiter, key, preposition):
+        count = limiter.pop_recent_rejections(key)
+        if count:
+            self._logger.info('Dropped {} message(s) {} {} (rate limit).'
+                              .format(count, preposition, key))
@@ -0,0 +1,125 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Functions to write the state of an IRCClient to disk and to restore it from
+there, so that a restarted client starts with warm channel information.
+"""
+
+__all__ = []
+
+import json
+import os
+import time
+
+from fredirc.info import ChannelInfo
+from fredirc.info import SyncPolicy
+
+# Increment whenever the layout of the snapshot changes.
+SNAPSHOT_VERSION = 2
+
+# Versions that can still be restored. Version 1 stored channels as
+# [topic, [nicks]].
+_COMPATIBLE_VERSIONS = frozenset((1, 2))
+
+
+def state_to_dict(state):
+    """ Convert the restorable parts of an IRCClientState into a dict
+    consisting only of JSON-compatible types.
+
+    Args:
+        state (IRCClientState): the state to convert
+    Returns:
+        dict
+    """
+    return {
+        'version': SNAPSHOT_VERSION,
+        'time': time.time(),
+        'server': state.server,
+        'isupport': state.isupport,
+        # channel name: [topic, [nicks], sync policy, member count]
+        'channels': {name: [info.topic, list(info.nicks), info.sync_policy,
+                            info.member_count]
+                     for name, info in state.channels.items()},
+    }
+
+
+def restore_state(state, data):
+    """ Restore channel and server information from a dict created by
+    :py:func:`state_to_dict` into an IRCClientState.
+
+    Restored channels are marked as :py:attr:`restored<.ChannelInfo.restored>`
+    until the server confirms them. Connection and registration flags, the nick
+    and operator/voice status are not restored, as they must always be
+    confirmed by the server first.
+
+    Args:
+        state (IRCClientState): the state to restore into
+        data (dict): the snapshot data
+    Returns:
+        bool: ``True`` if the data could be restored.
+    """
+    if not isinstance(data, dict) or \
+       data.get('version') not in _COMPATIBLE_VERSIONS:
+        return False
+    # Build everything first, so that invalid data leaves the state untouched
+    try:
+        isupport = dict(data['isupport'])
+        casemapping = isupport.get('CASEMAPPING') or 'rfc1459'
+        channels = {}
+        for name, entry in data['channels'].items():
+            if name in state.channels:
+                continue
+            if len(entry) == 2:
+                (topic, nicks), policy, count = entry, SyncPolicy.FULL, 0
+            else:
+                topic, nicks, policy, count = entry
+            info = ChannelInfo(name, policy, casemapping)
+            info._set_topic(topic)
+            info._add_nicks(*nicks)
+            if policy == SyncPolicy.COUNT:
+                info._count = count
+            info._restored = True
+            channels[name] = info
+    except (KeyError, TypeError, ValueError):
+        return False
+    state.isupport = isupport
+    state.channels.update(channels)
+    return True
+
+
+def write_snapshot(state, path):
+    """ Write a snapshot of the client state to a file.
+
+    The file is replaced atomically, so a crash during writing never leaves a
+    corrupted snapshot behind.
+
+    Args:
+        state (IRCClientState): the state to save
+        path (str): path of the snapshot file
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state_to_dict(state), f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(state, path):
+    """ Restore the client state from a snapshot file in a single read.
+
+    A file that is not a valid snapshot (e.g. truncated) is treated like a
+    missing one.
+
+    Args:
+        state (IRCClientState): the state to restore into
+        path (str): path of the snapshot file
+    Returns:
+        bool: ``True`` if a snapshot was found and restored.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return False
+    return restore_state(state, data)
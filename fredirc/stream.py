@@ -0,0 +1,241 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Streams of events of an IRCClient that are consumed with ``async for``.
+"""
+
+__all__ = ['Event', 'EventStream', 'Overflow']
+
+import asyncio
+import collections
+import inspect
+import time
+
+from fredirc.handler import IRCHandler
+
+
+class Overflow(object):
+    """ Policies for an :py:class:`.EventStream` whose queue is full, as its
+    consumer can't keep up with the events.
+    """
+
+    PAUSE = 'pause'
+    """ Stop reading from the server until the consumer took half of the
+    queued events (backpressure). Events of messages that were already
+    received are still queued, so the queue may exceed its size a little.
+    Note that the server disconnects clients that don't answer its PINGs
+    for too long. """
+
+    DROP_NEWEST = 'drop_newest'
+    """ Discard new events while the queue is full. """
+
+    DROP_OLDEST = 'drop_oldest'
+    """ Discard the oldest queued event for each new one. """
+
+
+class Event(object):
+    """ Base class of the events of an :py:class:`.EventStream`.
+
+    There is a subclass for each handler method of :py:class:`.IRCHandler`
+    (e.g. ``ChannelMessageEvent`` for
+    :py:meth:`handle_channel_message()<.IRCHandler.handle_channel_message>`)
+    with an attribute for each argument of the method (``channel``,
+    ``message`` and ``sender``). Keyword arguments of
+    :py:meth:`handle_error()<.IRCHandler.handle_error>` are collected in the
+    attribute ``params``.
+
+    Attributes:
+        name (str): name of the event, i.e. the handler method without the
+                    ``handle_`` prefix (e.g. ``'channel_message'``)
+        fields (tuple): names of the event's attributes besides
+                        ``timestamp``
+        timestamp (float): time of the event (:py:func:`time.time`)
+    """
+
+    __slots__ = ('timestamp',)
+    name = None
+    fields = ()
+    # Default values of the fields (_MISSING for required ones) and the
+    # field that collects keyword arguments (or None)
+    _defaults = ()
+    _var_keyword = None
+
+    def __init__(self, timestamp, args, kwargs):
+        self.timestamp = timestamp
+        values = list(self._defaults)
+        values[:len(args)] = args
+        if kwargs:
+            extra = {}
+            for key, value in kwargs.items():
+                if key in self.fields and key != self._var_keyword:
+                    values[self.fields.index(key)] = value
+                else:
+                    extra[key] = value
+            if self._var_keyword is not None:
+                values[self.fields.index(self._var_keyword)] = extra
+        for field, value in zip(self.fields, values):
+            setattr(self, field, value)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(field, getattr(self, field))
+            for field in self.fields))
+
+
+_MISSING = object()
+
+
+def _event_class(name):
+    """ Create the Event subclass for a handler method of IRCHandler. """
+    fields = []
+    defaults = []
+    var_keyword = None
+    parameters = inspect.signature(
+        getattr(IRCHandler, 'handle_' + name)).parameters
+    for param in list(parameters.values())[1:]:  # skip self
+        fields.append(param.name)
+        if param.kind == param.VAR_KEYWORD:
+            var_keyword = param.name
+            defaults.append({})
+        elif param.default is param.empty:
+            defaults.append(_MISSING)
+        else:
+            defaults.append(param.default)
+    class_name = ''.join(part.capitalize() for part in name.split('_')) + \
+        'Event'
+    return type(class_name, (Event,), {
+        '__slots__': tuple(fields),
+        '__doc__': 'Event of :py:meth:`.IRCHandler.handle_{}`.'.format(name),
+        'name': name,
+        'fields': tuple(fields),
+        '_defaults': tuple(defaults),
+        '_var_keyword': var_keyword,
+    })
+
+
+# key: event name, value: Event subclass
+_EVENT_CLASSES = {name[len('handle_'):]: _event_class(name[len('handle_'):])
+                  for name in dir(IRCHandler)
+                  if name.startswith('handle_') and
+                  name != 'handle_client_init'}
+
+
+class EventStream(object):
+    """ Events of an :py:class:`.IRCClient` as an asynchronous iterator.
+
+    Created by :py:meth:`IRCClient.events()<.IRCClient.events>`::
+
+        stream = client.events({'channel_message', 'join'})
+        async for event in stream:
+            if event.name == 'channel_message':
+                print(event.channel, event.sender, event.message)
+
+    The events (see :py:class:`.Event`) are queued until they are consumed,
+    in addition to being passed to the client's handler. If the queue is
+    full, events are handled according to the stream's
+    :py:class:`.Overflow` policy.
+
+    The stream receives events until it is closed via :py:meth:`.close`.
+    Afterwards the iteration ends once the queued events are consumed.
+
+    Attributes:
+        dropped (int): number of events that were discarded, as the queue
+                       was full
+    """
+
+    def __init__(self, client, names, filter, max_size, overflow):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1.')
+        if overflow not in (Overflow.PAUSE, Overflow.DROP_NEWEST,
+                            Overflow.DROP_OLDEST):
+            raise ValueError('Invalid overflow policy: {}'.format(overflow))
+        if names is not None:
+            names = frozenset(names)
+            unknown = names - frozenset(_EVENT_CLASSES)
+            if unknown:
+                raise ValueError('Unknown event(s): {}'.format(
+                    ', '.join(sorted(unknown))))
+        self._client = client
+        self._names = names
+        self._filter = filter
+        self._max_size = max_size
+        self._overflow = overflow
+        self._loop = asyncio.get_event_loop()
+        self._queue = collections.deque()
+        # Futures of consumers that wait for an event
+        self._waiters = collections.deque()
+        self._pausing = False
+        self._closed = False
+        self.dropped = 0
+
+    def wants(self, name):
+        """ Return True if the stream receives events with the name. """
+        return self._names is None or name in self._names
+
+    def close(self):
+        """ Stop receiving events. Has no effect if already closed. """
+        if self._closed:
+            return
+        self._closed = True
+        self._client._remove_stream(self)
+        self._release()
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(StopAsyncIteration())
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = self._loop.create_future() \
+            if hasattr(self._loop, 'create_future') else \
+            asyncio.Future(loop=self._loop)
+        if self._queue:
+            future.set_result(self._queue.popleft())
+            if self._pausing and len(self._queue) <= self._max_size // 2:
+                self._release()
+        elif self._closed:
+            future.set_exception(StopAsyncIteration())
+        else:
+            self._waiters.append(future)
+        return future
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _put(self, event):
+        """ Queue an event or pass it to a waiting consumer. """
+        if self._filter is not None and not self._filter(event):
+            return
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():  # i.e. not cancelled
+                waiter.set_result(event)
+                return
+        if len(self._queue) >= self._max_size:
+            if self._overflow == Overflow.DROP_NEWEST:
+                self.dropped += 1
+                return
+            elif self._overflow == Overflow.DROP_OLDEST:
+                self._queue.popleft()
+                self.dropped += 1
+            elif not self._pausing:
+                self._pausing = True
+                self._client._pause_for_stream(self)
+        self._queue.append(event)
+
+    def _release(self):
+        if self._pausing:
+            self._pausing = False
+            self._client._resume_for_stream(self)
+
+
+def _create_event(name, args, kwargs):
+    return _EVENT_CLASSES[name](time.time(), args, kwargs)
@@ -2,14 +2,96 @@
 #
 # Distributed under terms of the (2-clause) BSD license.
 
-""" This module provides a task class. """
+""" This module provides classes to schedule function calls. """
 
-__all__ = ['Task']
+__all__ = ['LoadSpreader',
+           'Overlap',
+           'Task',
+           'TaskStats',
+           'TimerHandle',
+           'TimerWheel',
+           'load_spreader']
 
 import asyncio
+import collections
+import math
+import random
 import types
 
 
+class Overlap(object):
+    """ Policies for a repeating :py:class:`.Task` whose run takes longer
+    than its interval.
+
+    A run is still in progress when the next one is due, if it is a
+    coroutine that has not finished or if a regular function returned after
+    the next deadline passed.
+    """
+
+    SKIP = 'skip'
+    """ Skip all runs that are due while a run is in progress. The next run
+    happens at the first deadline after the current run finished. """
+
+    QUEUE = 'queue'
+    """ Start runs that are due while a run is in progress one after another
+    as soon as the previous one finished. """
+
+    CONCURRENT = 'concurrent'
+    """ Start coroutine runs on time, even if previous runs are still in
+    progress. Regular functions can't run concurrently and behave like
+    :py:attr:`.QUEUE`. """
+
+
+class TaskStats(object):
+    """ Runtime statistics of a :py:class:`.Task`.
+
+    Times are measured with the clock of the event loop in seconds. The
+    runtime of a coroutine is the time until it finished.
+    Lateness is the time between the deadline of a run and its actual
+    start.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        """ Number of finished runs. """
+        self.skipped = 0
+        """ Number of runs that were skipped because of
+        :py:attr:`Overlap.SKIP<.Overlap.SKIP>`. """
+        self.failed = 0
+        """ Number of runs that raised an exception. """
+        self.total_runtime = 0.0
+        self.max_runtime = 0.0
+        self.last_runtime = 0.0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+        self.last_lateness = 0.0
+        self._started = 0
+
+    @property
+    def mean_runtime(self):
+        """ Average runtime of the finished runs. """
+        return self.total_runtime / self.runs if self.runs else 0.0
+
+    @property
+    def mean_lateness(self):
+        """ Average lateness of all started runs. """
+        return self.total_lateness / self._started if self._started else 0.0
+
+    def _add_lateness(self, lateness):
+        self._started += 1
+        self.last_lateness = lateness
+        self.total_lateness += lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+
+    def _add_runtime(self, runtime, failed=False):
+        self.runs += 1
+        if failed:
+            self.failed += 1
+        self.last_runtime = runtime
+        self.total_runtime += runtime
+        self.max_runtime = max(self.max_runtime, runtime)
+
+
 class Task(object):
     """A Task can be used to schedule a function that will be executed by the
     event loop.
@@ -23,9 +105,24 @@ class Task(object):
     2. Instantiate the task directly and provide a function as parameter to the
        constructor.
 
+    The function may also be a coroutine function. Its coroutine is then
+    scheduled as an asyncio task on each run.
+
     After initialization the Task must be started explicitly via
     :py:meth:`.start()`.
 
+    A repeating task is scheduled against fixed deadlines (the start time
+    plus multiples of the interval), so the runtime of the function does
+    not shift later runs. What happens if a run takes longer than the
+    interval is determined by the ``overlap`` policy.
+    Statistics about the runs are available via :py:attr:`.stats`.
+
+    Many tasks with the same interval that are started at the same time
+    would always run at the same moment. To avoid such load spikes, the
+    deadlines can be shifted by a fixed ``phase``, each run can be deferred
+    by a random ``jitter`` (without shifting later deadlines) or the phase
+    can be chosen by a :py:class:`.LoadSpreader`.
+
     Args:
         delay (float): Time (in seconds) to defer the execution of the task
                        after it is started or the interval for its repeated
@@ -33,22 +130,52 @@ class Task(object):
         repeat (bool): If ``True`` the task will run periodically until it is
                        stopped.
         func (function type): function that will be called (the actual task)
+        overlap (str): one of the policies defined by :py:class:`.Overlap`
+        phase (float): time in seconds added to all deadlines
+        jitter (float): maximum random time in seconds each run is deferred
+        spreader (LoadSpreader): spreader that chooses the phase of the task
+                                 (``phase`` is ignored then) and counts its
+                                 runs
     """
 
-    def __init__(self, delay, repeat=False, func=None):
+    def __init__(self, delay, repeat=False, func=None, overlap=Overlap.SKIP,
+                 phase=0.0, jitter=0.0, spreader=None):
         self._repeat = repeat
         if delay >= 0.0:
             self._delay = delay
         else:
             raise ValueError('delay must not be negative.')
+        if overlap not in (Overlap.SKIP, Overlap.QUEUE, Overlap.CONCURRENT):
+            raise ValueError('Invalid overlap policy: {}'.format(overlap))
+        self._overlap = overlap
+        if phase < 0.0 or jitter < 0.0:
+            raise ValueError('phase and jitter must not be negative.')
+        self._phase = phase
+        self._jitter = jitter
+        self._spreader = spreader
+        if spreader is not None:
+            self._phase = spreader._next_phase(delay)
         self._loop = asyncio.get_event_loop()
         self._handler = None
+        # Point in time (loop.time()) the next run is due and the time it is
+        # scheduled for (i.e. including the jitter)
+        self._deadline = None
+        self._scheduled = None
+        # Number of runs in progress and deadlines of runs waiting for them
+        self._running = 0
+        self._queued = collections.deque()
+        self._stats = TaskStats()
         if func:
             if isinstance(func, types.FunctionType):
                 self.run = func
             else:
                 raise TypeError('func is not a function type.')
 
+    @property
+    def stats(self):
+        """ :py:class:`.TaskStats` of this task. """
+        return self._stats
+
     def change_delay(self, delay):
         """ Change Task delay.
 
@@ -63,14 +190,69 @@ class Task(object):
         """ Method that is called on execution of the Task.
 
         Can be overwritten in subclasses or by passing a function to
-        the constructor.
+        the constructor. May return a coroutine.
         """
         pass
 
     def _run(self):
-        self.run()
-        if self._repeat:
-            self.start()
+        self._handler = None
+        deadline = self._scheduled
+        try:
+            if self._running and self._overlap != Overlap.CONCURRENT:
+                if self._overlap == Overlap.SKIP:
+                    self._stats.skipped += 1
+                else:
+                    self._queued.append(deadline)
+            else:
+                self._execute(deadline)
+        finally:
+            # Unless run() stopped or restarted the task
+            if self._repeat and self._handler is None and \
+                    self._deadline is not None:
+                self._schedule_next()
+
+    def _execute(self, deadline):
+        started = self._loop.time()
+        self._stats._add_lateness(max(started - deadline, 0.0))
+        if self._spreader is not None:
+            self._spreader._record(started)
+        self._running += 1
+        try:
+            result = self.run()
+        except Exception:
+            self._finish(started, True)
+            raise
+        if asyncio.iscoroutine(result):
+            future = _ensure_future(result, loop=self._loop)
+            future.add_done_callback(
+                lambda f: self._finish(
+                    started, f.cancelled() or f.exception() is not None))
+        else:
+            self._finish(started)
+
+    def _finish(self, started, failed=False):
+        self._running -= 1
+        self._stats._add_runtime(self._loop.time() - started, failed)
+        if self._queued and not self._running:
+            self._execute(self._queued.popleft())
+
+    def _schedule_next(self):
+        now = self._loop.time()
+        self._deadline += self._delay
+        if self._deadline <= now and self._delay > 0.0 and \
+                self._overlap == Overlap.SKIP:
+            # The last run (or the event loop) took longer than the interval.
+            # Otherwise the missed runs are caught up one after another.
+            missed = int((now - self._deadline) // self._delay) + 1
+            self._stats.skipped += missed
+            self._deadline += missed * self._delay
+        self._arm()
+
+    def _arm(self):
+        self._scheduled = self._deadline
+        if self._jitter > 0.0:
+            self._scheduled += random.uniform(0.0, self._jitter)
+        self._handler = self._loop.call_at(self._scheduled, self._run)
 
     def start(self):
         """ Start the task.
@@ -80,13 +262,342 @@ class Task(object):
         """
         if self._handler:
             self._handler.cancel()
-        self._handler = self._loop.call_later(self._delay, self._run)
+        self._deadline = self._loop.time() + self._delay + self._phase
+        self._arm()
 
     def stop(self):
         """ Stop the task.
 
         Will have no effect if task is not running. The task might be started
-        again later.
+        again later. Runs of a coroutine that are in progress are not
+        cancelled, but queued runs are discarded.
         """
         if self._handler:
             self._handler.cancel()
+            self._handler = None
+        self._deadline = None
+        self._queued.clear()
+
+
+class LoadSpreader(object):
+    """ Spreads the runs of repeating :py:class:`Tasks<.Task>` with the same
+    interval evenly across that interval and counts the runs per tick.
+
+    Pass the spreader to the tasks via their ``spreader`` argument. Each task
+    gets a phase, so that the runs of n tasks with the same interval are
+    about interval/n seconds apart, no matter how many tasks are added
+    later. The phases start at a random offset, so that the tasks of several
+    processes started at the same time do not run in lockstep either.
+
+    A spreader shared by all tasks of the process is available as
+    ``fredirc.load_spreader``.
+
+    Args:
+        resolution (float): duration in seconds of a tick for counting runs
+        history (int): number of ticks for which the counts are kept
+    """
+
+    def __init__(self, resolution=0.1, history=600):
+        if resolution <= 0.0:
+            raise ValueError('resolution must be positive.')
+        self._resolution = resolution
+        self._offset = random.random()
+        # key: interval, value: number of tasks added for that interval
+        self._tasks = collections.Counter()
+        # Entries: [tick, number of runs], only ticks with runs
+        self._counts = collections.deque(maxlen=history)
+
+    @property
+    def execution_counts(self):
+        """ Number of task runs per tick for the recent ticks with at least
+        one run.
+
+        list of tuples: start time of the tick (as given by ``loop.time()``)
+        and number of runs
+        """
+        return [(tick * self._resolution, count)
+                for tick, count in self._counts
+                if tick > self._counts[-1][0] - self._counts.maxlen]
+
+    @property
+    def peak(self):
+        """ Highest number of runs in a single tick of the recent ticks. """
+        return max([count for _, count in self.execution_counts] or [0])
+
+    def _next_phase(self, interval):
+        index = self._tasks[interval]
+        self._tasks[interval] += 1
+        return (self._offset + _van_der_corput(index)) % 1.0 * interval
+
+    def _record(self, now):
+        tick = int(now / self._resolution)
+        if self._counts and self._counts[-1][0] == tick:
+            self._counts[-1][1] += 1
+        else:
+            self._counts.append([tick, 1])
+
+
+def _van_der_corput(index):
+    """ Return the index-th element of the sequence 0, 1/2, 1/4, 3/4, 1/8,
+    5/8, ... which divides [0, 1) ever finer and evenly at any length.
+    """
+    result = 0.0
+    denominator = 1.0
+    while index:
+        denominator *= 2.0
+        index, remainder = divmod(index, 2)
+        result += remainder / denominator
+    return result
+
+
+load_spreader = LoadSpreader()
+
+
+# asyncio.async() was renamed to ensure_future() in Python 3.4.4
+_ensure_future = getattr(asyncio, 'ensure_future', None) or \
+    getattr(asyncio, 'async')
+
+
+class TimerWheel(object):
+    """ Schedules a large number of delayed function calls efficiently.
+
+    Instead of a timer of the event loop for each call, like
+    :py:class:`.Task` uses one, the calls are sorted into the slots of a
+    hierarchical timing wheel. The first level has a slot per tick, each
+    slot of a higher level covers a whole turn of the level below. When a
+    higher level slot is reached, its calls are moved down to the level
+    below, until they end up in the slot of the tick they are due.
+    Scheduling and cancelling a call take constant time, independently of
+    the number of pending calls.
+
+    Calls are run on the first tick after their delay elapsed, so they are
+    delayed by up to ``resolution`` seconds. The wheel keeps a single timer
+    in the event loop, which is set to the next tick that has calls to run
+    or to move, and none while no calls are pending.
+
+    .. note:: Like a Task, the wheel uses the event loop of the
+              :py:class:`.IRCClient` and only runs while the client runs.
+
+    Args:
+        resolution (float): duration of a tick in seconds
+        slots (int): number of slots per level
+        levels (int): number of levels. Calls that are due more than
+                      ``slots ** levels`` ticks in the future are kept in the
+                      last slot of the highest level until they fit.
+    """
+
+    # Minimum number of cancelled calls before they are removed from the
+    # slots at once
+    _COMPACT_MIN = 64
+
+    def __init__(self, resolution=0.05, slots=512, levels=3):
+        if resolution <= 0.0:
+            raise ValueError('resolution must be positive.')
+        if slots < 2:
+            raise ValueError('slots must be at least 2.')
+        if levels < 1:
+            raise ValueError('levels must be at least 1.')
+        self._resolution = resolution
+        self._loop = asyncio.get_event_loop()
+        self._size = slots
+        self._levels = [[[] for _ in range(slots)] for _ in range(levels)]
+        # Number of ticks covered by a slot of each level
+        self._spans = [slots ** level for level in range(levels)]
+        self._start = self._loop.time()
+        # Number of the last tick that was processed
+        self._tick = 0
+        self._pending = 0
+        # Number of cancelled calls that are still in a slot
+        self._cancelled = 0
+        self._handle = None
+        # Tick the timer of the event loop is set to
+        self._armed = None
+
+    def schedule(self, delay, func, *args):
+        """ Schedule a function call.
+
+        Args:
+            delay (float): time in seconds after which func is called
+            func (callable): the function to call
+            args: arguments for the function call
+        Returns:
+            :py:class:`.TimerHandle`: handle to cancel the call
+        """
+        if delay < 0.0:
+            raise ValueError('delay must not be negative.')
+        now = self._loop.time()
+        if self._handle is None:
+            # Skip ticks that passed while no call was pending
+            self._tick = max(self._tick, int((now - self._start) /
+                                             self._resolution))
+        due = max(int(math.ceil((now + delay - self._start) /
+                                self._resolution)),
+                  self._tick + 1)
+        timer = TimerHandle(self, due, func, args)
+        visit = self._insert(timer)
+        self._pending += 1
+        if self._handle is None or \
+                self._armed is not None and visit < self._armed:
+            self._arm(visit)
+        return timer
+
+    def __len__(self):
+        """ Number of pending calls. """
+        return self._pending
+
+    def _pending_calls(self):
+        """ Return the pending calls as (seconds until the call is due,
+        handle) tuples, ordered by their due time.
+        """
+        now = self._loop.time()
+        calls = [(max(self._start + timer._tick * self._resolution - now,
+                      0.0), timer)
+                 for slots in self._levels for slot in slots
+                 for timer in slot if timer._func is not None]
+        calls.sort(key=lambda call: call[1]._tick)
+        return calls
+
+    def _insert(self, timer):
+        """ Put a call into its slot and return the tick the slot is
+        reached.
+        """
+        size = self._size
+        due = timer._tick
+        if due - self._tick < size:
+            self._levels[0][due % size].append(timer)
+            return due
+        for level, span in enumerate(self._spans):
+            if due - self._tick < span * size:
+                break
+        else:
+            # Beyond the highest level, wait in its last slot
+            due = self._tick + span * size - 1
+        self._levels[level][due // span % size].append(timer)
+        return due // span * span
+
+    def _cancel(self, timer):
+        timer._func = None
+        timer._args = None
+        self._pending -= 1
+        self._cancelled += 1
+        if self._cancelled > self._COMPACT_MIN and \
+                self._cancelled > self._pending:
+            for slots in self._levels:
+                for slot in slots:
+                    slot[:] = [timer for timer in slot
+                               if timer._func is not None]
+            self._cancelled = 0
+
+    def _next_visit(self):
+        """ Return the next tick that reaches a non-empty slot or None. """
+        size = self._size
+        visit = None
+        for slots, span in zip(self._levels, self._spans):
+            first = self._tick // span + 1
+            if visit is not None and first * span >= visit:
+                # Slots of higher levels are reached even later
+                break
+            for turn in range(first, first + size):
+                if visit is not None and turn * span >= visit:
+                    break
+                if slots[turn % size]:
+                    visit = turn * span
+                    break
+        return visit
+
+    def _arm(self, tick):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._armed = tick
+        self._handle = self._loop.call_at(
+            self._start + tick * self._resolution, self._advance)
+
+    def _advance(self):
+        """ Run all calls that are due, tick by tick, and set the timer of
+        the event loop to the next tick with calls.
+        """
+        # The event loop may run timers a little early
+        current = max(int((self._loop.time() - self._start) /
+                          self._resolution), self._armed)
+        # Calls scheduled by the callbacks don't set the timer, it is set
+        # below
+        self._armed = None
+        while self._pending:
+            visit = self._next_visit()
+            if visit is None or visit > current:
+                break
+            self._visit(visit)
+        visit = self._next_visit() if self._pending else None
+        if visit is not None:
+            self._arm(visit)
+        else:
+            self._handle = None
+            if self._cancelled:
+                for slots in self._levels:
+                    for slot in slots:
+                        del slot[:]
+                self._cancelled = 0
+
+    def _visit(self, tick):
+        size = self._size
+        # Calls scheduled by the callbacks are due on the next tick at the
+        # earliest
+        self._tick = tick
+        # Move the calls of the higher levels down. Those that are due now
+        # end up in the slot of the first level that is run below.
+        for level in range(1, len(self._levels)):
+            span = self._spans[level]
+            if tick % span:
+                break
+            slots = self._levels[level]
+            index = tick // span % size
+            timers = slots[index]
+            if timers:
+                slots[index] = []
+                for timer in timers:
+                    if timer._func is None:
+                        self._cancelled -= 1
+                    else:
+                        self._insert(timer)
+        slots = self._levels[0]
+        timers = slots[tick % size]
+        slots[tick % size] = []
+        for timer in timers:
+            func = timer._func
+            if func is None:
+                self._cancelled -= 1
+                continue
+            if timer._tick > tick:
+                # Waited beyond the highest level
+                self._insert(timer)
+                continue
+            args = timer._args
+            timer._func = None
+            timer._args = None
+            self._pending -= 1
+            try:
+                func(*args)
+            except Exception as e:
+                self._loop.call_exception_handler({
+                    'message': 'Exception in TimerWheel callback',
+                    'exception': e})
+
+
+class TimerHandle(object):
+    """ Handle of a function call scheduled via
+    :py:meth:`TimerWheel.schedule()<.TimerWheel.schedule>`.
+    """
+
+    __slots__ = ('_wheel', '_tick', '_func', '_args')
+
+    def __init__(self, wheel, tick, func, args):
+        self._wheel = wheel
+        # Tick the call is due
+        self._tick = tick
+        self._func = func
+        self._args = args
+
+    def cancel(self):
+        """ Cancel the call. Has no effect if it already happened. """
+        if self._func is not None:
+            self._wheel._cancel(self)
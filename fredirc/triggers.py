@@ -0,0 +1,333 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+"""
+Matching of many keywords and regular expressions against channel messages.
+"""
+
+__all__ = ['TriggerEngine']
+
+import itertools
+import re
+
+from fredirc.handler import IRCHandler
+
+# Number of regular expressions that are combined into one pattern
+_REGEX_CHUNK_SIZE = 100
+
+# Backreferences refer to the wrong group in a combined pattern
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+class TriggerEngine(IRCHandler):
+    """ An :py:class:`.IRCHandler` that calls functions when channel messages
+    contain certain keywords or match regular expressions.
+
+    Keywords are compiled into Aho-Corasick automata, so a message is
+    scanned once for all keywords, in time proportional to its length and
+    independent of the number of keywords. Regular expressions are combined
+    into alternations of up to 100 expressions that reject non-matching
+    messages with a single search each; only the expressions of an
+    alternation that matched are tested individually.
+
+    Triggers that apply to all channels and those of each channel are kept
+    apart, so a message is only matched against the triggers of all channels
+    and those of its own channel.
+
+    Triggers can be added and removed at any time. Adding a keyword only
+    links the new nodes of its automaton, removing one is immediate. Adding
+    or removing a regular expression only recompiles its own alternation.
+
+    Use the engine as the client's handler, subscribe it to an
+    :py:class:`.EventBus` or call :py:meth:`.scan` from your own handler.
+    """
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        # key: trigger id, value: _Trigger
+        self._triggers = {}
+        # Keywords of the triggers of all channels and per channel.
+        # key: None or normalized channel name, value: _Automaton
+        self._automata = {}
+        # Chunks of regex triggers of all channels and per channel.
+        # key: None or normalized channel name, value: list of [list of
+        # trigger ids, compiled alternation (None if it must be recompiled,
+        # False if the expressions can't be combined), flags of the
+        # expressions (None for expressions that are never combined)]
+        self._regex_chunks = {}
+
+    def add_keyword(self, keyword, func, channels=None, whole_word=False):
+        """ Add a trigger for a keyword (case-insensitive).
+
+        Args:
+            keyword (str): the keyword
+            func (callable): function that is called with the channel, the
+                             message, the sender and the keyword, if a message
+                             contains the keyword
+            channels (iterable of str): channels the trigger applies to or
+                                        None for all channels
+            whole_word (bool): only match the keyword if it is not part of a
+                               longer word
+        Returns:
+            int: id of the trigger (see :py:meth:`.remove`)
+        """
+        if not keyword:
+            raise ValueError('keyword must not be empty.')
+        trigger = _Trigger(next(self._ids), func, channels, keyword,
+                           whole_word=whole_word)
+        for scope in trigger.scopes():
+            automaton = self._automata.get(scope)
+            if automaton is None:
+                automaton = self._automata[scope] = _Automaton()
+            trigger.locations.append(
+                (scope, automaton.add(keyword.lower(), trigger.id)))
+        self._triggers[trigger.id] = trigger
+        return trigger.id
+
+    def add_regex(self, pattern, func, channels=None, flags=re.IGNORECASE):
+        """ Add a trigger for a regular expression.
+
+        Args:
+            pattern (str): the regular expression
+            func (callable): function that is called with the channel, the
+                             message, the sender and the match object of the
+                             first match, if the regular expression matches
+                             somewhere in a message
+            channels (iterable of str): channels the trigger applies to or
+                                        None for all channels
+            flags (int): flags for :py:func:`re.compile`
+        Returns:
+            int: id of the trigger (see :py:meth:`.remove`)
+        """
+        regex = re.compile(pattern, flags)
+        trigger = _Trigger(next(self._ids), func, channels, regex=regex)
+        chunk_flags = None if _BACKREFERENCE.search(pattern) else regex.flags
+        for scope in trigger.scopes():
+            chunks = self._regex_chunks.setdefault(scope, [])
+            for chunk in chunks:
+                if chunk[2] == chunk_flags and \
+                        len(chunk[0]) < _REGEX_CHUNK_SIZE:
+                    break
+            else:
+                chunk = [[], None, chunk_flags]
+                chunks.append(chunk)
+            chunk[0].append(trigger.id)
+            chunk[1] = None if chunk_flags is not None else False
+            trigger.locations.append((scope, chunk))
+        self._triggers[trigger.id] = trigger
+        return trigger.id
+
+    def remove(self, trigger_id):
+        """ Remove a trigger. Has no effect if it does not exist. """
+        trigger = self._triggers.pop(trigger_id, None)
+        if trigger is None:
+            return
+        for scope, location in trigger.locations:
+            if trigger.regex is None:
+                automaton = self._automata[scope]
+                automaton.discard(location, trigger_id)
+                if not automaton.keywords and scope is not None:
+                    del self._automata[scope]
+            else:
+                location[0].remove(trigger_id)
+                if location[1] is not False:
+                    location[1] = None
+                if not location[0]:
+                    chunks = self._regex_chunks[scope]
+                    chunks.remove(location)
+                    if not chunks:
+                        del self._regex_chunks[scope]
+
+    def scan(self, message, channel=None):
+        """ Find the triggers that match a message.
+
+        Args:
+            message (str): the message
+            channel (str): channel of the message. Triggers restricted to
+                           other channels are ignored.
+        Returns:
+            list of tuples: trigger id and the keyword or match object, in the
+            order the triggers were added
+        """
+        matches = {}
+        scopes = (None,) if channel is None else (None, channel.lower())
+        for scope in scopes:
+            self._scan_keywords(message, scope, matches)
+            self._scan_regexes(message, scope, matches)
+        return sorted(matches.items())
+
+    def handle_channel_message(self, channel, message, sender=None):
+        for trigger_id, match in self.scan(message, channel):
+            trigger = self._triggers.get(trigger_id)
+            if trigger is not None:  # unless removed by a previous trigger
+                trigger.func(channel, message, sender, match)
+
+    def _scan_keywords(self, message, scope, matches):
+        automaton = self._automata.get(scope)
+        if automaton is None or not automaton.keywords:
+            return
+        message = message.lower()
+        for trigger_id, end in automaton.scan(message):
+            if trigger_id not in matches:
+                trigger = self._triggers[trigger_id]
+                if trigger.matches_at(message, end):
+                    matches[trigger_id] = trigger.keyword
+
+    def _scan_regexes(self, message, scope, matches):
+        for chunk in self._regex_chunks.get(scope, ()):
+            if chunk[1] is None:
+                try:
+                    chunk[1] = re.compile('|'.join(
+                        '(?:{})'.format(
+                            self._triggers[trigger_id].regex.pattern)
+                        for trigger_id in chunk[0]), chunk[2])
+                except re.error:
+                    # e.g. the same group name in several expressions
+                    chunk[1] = False
+            if chunk[1] and not chunk[1].search(message):
+                continue
+            for trigger_id in chunk[0]:
+                match = self._triggers[trigger_id].regex.search(message)
+                if match:
+                    matches[trigger_id] = match
+
+
+class _Automaton(object):
+    """ Aho-Corasick automaton of keywords, whose links are kept up to date
+    while keywords are added.
+    """
+
+    def __init__(self):
+        # Node 0 is the root. For each node: transitions (dict: char ->
+        # node), failure link, depth, ids of the keyword triggers ending
+        # there (None if no keyword ever ended there) and the nearest node on
+        # the failure path that had keywords ending there (or None)
+        self.goto = [{}]
+        self.fail = [0]
+        self.depth = [0]
+        self.out = [None]
+        self.out_link = [None]
+        # Reversed failure links.
+        # key: node, value: set of the nodes whose failure link points to it
+        self._fail_children = {}
+        # Number of keywords
+        self.keywords = 0
+
+    def add(self, keyword, trigger_id):
+        """ Add a (lower case) keyword and return the node it ends at. """
+        node = 0
+        for c in keyword:
+            next_node = self.goto[node].get(c)
+            if next_node is None:
+                next_node = self._add_node(node, c)
+            node = next_node
+        if self.out[node] is None:
+            self.out[node] = set()
+            self._link_outputs(node)
+        self.out[node].add(trigger_id)
+        self.keywords += 1
+        return node
+
+    def discard(self, node, trigger_id):
+        # Output links to the node stay valid, even if it has no keywords
+        # any more
+        self.out[node].discard(trigger_id)
+        self.keywords -= 1
+
+    def scan(self, message):
+        """ Yield the trigger id and the end index of all keywords in a
+        (lower case) message.
+        """
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        out_link = self.out_link
+        state = 0
+        for i, c in enumerate(message):
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+            node = state if out[state] is not None else out_link[state]
+            while node is not None:
+                for trigger_id in out[node]:
+                    yield trigger_id, i
+                node = out_link[node]
+
+    def _add_node(self, parent, c):
+        goto = self.goto
+        fail = self.fail
+        depth = self.depth
+        node = len(goto)
+        goto[parent][c] = node
+        goto.append({})
+        depth.append(depth[parent] + 1)
+        self.out.append(None)
+        target = 0
+        if parent:
+            state = fail[parent]
+            while state and c not in goto[state]:
+                state = fail[state]
+            target = goto[state].get(c, 0)
+        fail.append(target)
+        self.out_link.append(target if self.out[target] is not None else
+                             self.out_link[target])
+        self._fail_children.setdefault(target, set()).add(node)
+        # The new node is now the longest suffix of the c-children of the
+        # nodes whose failure path passes the parent. Below a node that has
+        # a c-child, the c-children have even longer suffixes.
+        stack = list(self._fail_children.get(parent, ()))
+        while stack:
+            state = stack.pop()
+            child = goto[state].get(c)
+            if child is None:
+                stack.extend(self._fail_children.get(state, ()))
+            elif depth[fail[child]] < depth[node]:
+                self._fail_children[fail[child]].discard(child)
+                self._fail_children.setdefault(node, set()).add(child)
+                # The output link stays the same, as no keyword ends at the
+                # new node yet
+                fail[child] = node
+        return node
+
+    def _link_outputs(self, node):
+        """ Point the output links of the nodes whose failure path reaches
+        the node before any other node with keywords to it.
+        """
+        stack = list(self._fail_children.get(node, ()))
+        while stack:
+            state = stack.pop()
+            self.out_link[state] = node
+            if self.out[state] is None:
+                stack.extend(self._fail_children.get(state, ()))
+
+
+class _Trigger(object):
+    """ A keyword or regular expression registered at the TriggerEngine. """
+
+    def __init__(self, trigger_id, func, channels, keyword=None, regex=None,
+                 whole_word=False):
+        self.id = trigger_id
+        self.func = func
+        self.channels = frozenset(channel.lower() for channel in channels) \
+            if channels is not None else None
+        self.keyword = keyword
+        self.regex = regex
+        self.whole_word = whole_word
+        # Scopes (None or channel) with the node of the automaton (keywords)
+        # or the chunk (regular expressions) of the trigger
+        self.locations = []
+
+    def scopes(self):
+        """ Return None for triggers of all channels or their channels. """
+        return (None,) if self.channels is None else sorted(self.channels)
+
+    def matches_at(self, message, end):
+        """ Check the word boundaries of a keyword match ending at index
+        end of the message.
+        """
+        if not self.whole_word:
+            return True
+        start = end - len(self.keyword) + 1
+        return (start == 0 or not message[start - 1].isalnum()) and \
+            (end + 1 == len(message) or not message[end + 1].isalnum())
@@ -0,0 +1,17 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import logging
+from unittest import mock
+
+from fredirc.client import IRCClient
+
+
+def create_client(handler, nick='bot', server='irc.example.com', **kwargs):
+    """ Create an IRCClient that does not log into irc.log in the current
+    directory.
+    """
+    with mock.patch('logging.FileHandler',
+                    lambda path: logging.NullHandler()):
+        return IRCClient(handler, nick, server, **kwargs)
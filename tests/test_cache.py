@@ -0,0 +1,84 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import asyncio
+import unittest
+from unittest import mock
+
+from fredirc.cache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = 0
+
+    def compute(self, value):
+        self.calls += 1
+        return value * 2
+
+    def test_results_are_cached_until_they_expire(self):
+        cache = ResponseCache(ttl=10.0)
+        with mock.patch('time.monotonic') as monotonic:
+            monotonic.return_value = 100.0
+            self.assertEqual(cache.get('a', self.compute, 1), 2)
+            monotonic.return_value = 105.0
+            self.assertEqual(cache.get('a', self.compute, 1), 2)
+            self.assertIn('a', cache)
+            monotonic.return_value = 111.0
+            self.assertNotIn('a', cache)
+            self.assertEqual(cache.get('a', self.compute, 1), 2)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2,
+                                         'coalesced': 0, 'evictions': 0,
+                                         'size': 1})
+
+    def test_least_recently_used_result_is_evicted(self):
+        cache = ResponseCache(max_size=2)
+        cache.get('a', self.compute, 1)
+        cache.get('b', self.compute, 2)
+        cache.get('a', self.compute, 1)
+        cache.get('c', self.compute, 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_running_coroutines_are_shared(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.addCleanup(loop.close)
+        cache = ResponseCache()
+
+        def slow():
+            self.calls += 1
+            return asyncio.sleep(0.01, result='done')
+
+        first = cache.get('a', slow)
+        second = cache.get('a', slow)
+        self.assertIs(first, second)
+        self.assertEqual(loop.run_until_complete(first), 'done')
+        self.assertEqual(cache.get('a', slow), 'done')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cache.coalesced, 1)
+
+    def test_failed_coroutines_are_not_cached(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.addCleanup(loop.close)
+        cache = ResponseCache()
+
+        def fail():
+            future = asyncio.Future()
+            future.set_exception(RuntimeError('broken'))
+            return asyncio.wait_for(future, None)
+
+        future = cache.get('a', fail)
+        with self.assertRaises(RuntimeError):
+            loop.run_until_complete(future)
+        self.assertNotIn('a', cache)
+        self.assertEqual(len(cache._pending), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
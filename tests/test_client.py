@@ -0,0 +1,193 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import asyncio
+import unittest
+from unittest import mock
+
+from fredirc.handler import IRCHandler
+
+from tests import create_client
+
+
+class _Recorder(IRCHandler):
+
+    def __init__(self):
+        self.pings = []
+
+    def handle_ping(self, server):
+        self.pings.append(server)
+
+
+class PauseEventsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.handler = _Recorder()
+        self.client = create_client(self.handler)
+        self.client._state.connected = True
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_oldest_events_are_dropped_with_one_warning(self):
+        self.client.pause_events(max_events=3)
+        for i in range(1000):
+            self.client.data_received('PING :{}\r\n'.format(i).encode())
+        self.assertEqual(self.handler.pings, [])
+        with self.assertLogs(self.client._logger, 'WARNING') as logs:
+            self.client.resume_events()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('997', logs.output[0])
+        self.assertEqual(self.handler.pings, ['997', '998', '999'])
+        self.client.data_received(b'PING :next\r\n')
+        self.assertEqual(self.handler.pings[-1], 'next')
+
+    def test_resume_with_new_handler(self):
+        self.client.pause_events()
+        self.client.data_received(b'PING :a\r\n')
+        handler = _Recorder()
+        self.client.resume_events(handler)
+        self.assertEqual(handler.pings, ['a'])
+        self.assertEqual(self.handler.pings, [])
+
+
+class _JoinRecorder(IRCHandler):
+
+    def __init__(self):
+        self.joins = []
+
+    def handle_own_join(self, channel):
+        self.joins.append(channel)
+
+
+class DisconnectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.handler = _JoinRecorder()
+        self.client = create_client(self.handler)
+        self.client._state.connected = True
+        self.client._state.nick = 'bot'
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_pending_join_is_forgotten(self):
+        processor = self.client._processor
+        processor.detect_netsplits = True
+        with mock.patch('time.monotonic') as monotonic:
+            monotonic.return_value = 100.0
+            self.client.data_received(
+                b':bot!u@h JOIN #stale\r\n'
+                b':srv 353 bot = #stale :bot alice\r\n'
+                b':srv 367 bot #stale *!*@spam op 1400000000\r\n'
+                b':alice!u@h QUIT :hub.example.com leaf.example.com\r\n')
+            self.client.connection_lost(None)
+            self.assertEqual(processor._pending_channel_info, {})
+            self.assertEqual(processor._mask_list_replies, {})
+            self.assertEqual(processor._netsplits, {})
+            # Reconnect, long after the member list would have expired
+            self.client._state.connected = True
+            self.client._state.nick = 'bot'
+            monotonic.return_value = 1000.0
+            self.client.data_received(b'PING :srv\r\n')
+        self.assertEqual(self.handler.joins, [])
+        self.assertNotIn('#stale', self.client._state.channels)
+
+
+class _FailingBatchHandler(IRCHandler):
+
+    def handle_channel_messages(self, messages):
+        raise RuntimeError('bad batch')
+
+
+class MessageBatchExceptionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client = create_client(_FailingBatchHandler())
+        self.client._state.connected = True
+        self.client._state.nick = 'bot'
+        self.client.data_received(
+            b':bot!u@h JOIN #a\r\n:srv 366 bot #a :End of /NAMES list.\r\n')
+        self.client.enable_message_batching(True)
+        self.client.terminate = mock.Mock()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_exception_in_scheduled_flush_terminates_client(self):
+        self.client.data_received(b':alice!u@h PRIVMSG #a :hello\r\n')
+        with self.assertLogs(self.client._logger, 'CRITICAL'):
+            self.loop.run_until_complete(asyncio.sleep(0))
+        self.client.terminate.assert_called_once_with()
+
+
+class BroadcastTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client = create_client(IRCHandler())
+        self.client._state.connected = True
+        self.client._state.nick = 'bot'
+        self.client._transport = mock.Mock()
+        self.channels = ['#channel{}'.format(i) for i in range(10)]
+
+    def tearDown(self):
+        self.loop.close()
+
+    def isupport(self, tokens):
+        self.client.data_received(
+            ':srv 005 bot CHANLIMIT=#:250 PREFIX=(ov)@+ {} '
+            ':are supported by this server\r\n'.format(tokens).encode())
+
+    def sent_targets(self):
+        return [call[0][0].decode().split(' ')[2].split(',')
+                for call in self.client._transport.write.call_args_list]
+
+    def test_targmax(self):
+        self.isupport('TARGMAX=NOTICE:2,PRIVMSG:4,JOIN: MAXTARGETS=1')
+        self.assertEqual(self.client._max_targets('PRIVMSG'), 4)
+        self.assertIsNone(self.client._max_targets('JOIN'))
+        self.client.broadcast('hi', *self.channels)
+        self.assertEqual([len(t) for t in self.sent_targets()], [4, 4, 2])
+        self.assertEqual(sum(self.sent_targets(), []), self.channels)
+
+    def test_maxtargets(self):
+        self.isupport('MAXTARGETS=3')
+        self.assertEqual(self.client._max_targets('PRIVMSG'), 3)
+        self.client.broadcast('hi', *self.channels)
+        self.assertEqual([len(t) for t in self.sent_targets()],
+                         [3, 3, 3, 1])
+
+    def test_no_target_limit(self):
+        self.isupport('TARGMAX=PRIVMSG:')
+        self.client.broadcast('hi', *self.channels)
+        self.assertEqual(self.sent_targets(), [self.channels])
+
+    def test_line_length(self):
+        self.isupport('TARGMAX=PRIVMSG:')
+        channels = ['#' + str(i) * 100 for i in range(10)]
+        self.client.broadcast('hi', *channels)
+        for call in self.client._transport.write.call_args_list:
+            line = call[0][0]
+            room = self.client._max_privmsg_text_length('')
+            self.assertLessEqual(len(line.split(b' ')[2]) + len(b'hi'), room)
+        self.assertEqual(sum(self.sent_targets(), []), channels)
+        self.assertGreater(len(self.sent_targets()), 1)
+
+    def test_one_target_per_line_without_tokens(self):
+        self.isupport('MODES=4')
+        self.assertEqual(self.client._max_targets('PRIVMSG'), 1)
+        self.client.broadcast('hi', *self.channels)
+        self.assertEqual(self.sent_targets(), [[c] for c in self.channels])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import asyncio
+import unittest
+from unittest import mock
+
+from fredirc.commands import CommandRouter
+
+
+class CommandRouterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.router = CommandRouter(prefixes=('!', '.'))
+        self.calls = []
+
+    def record(self, sender, channel, *args):
+        self.calls.append((sender, channel) + args)
+
+    def test_route(self):
+        self.router.add_command('say', self.record, aliases=('s',),
+                                min_args=1, max_args=2)
+        self.assertTrue(self.router.route('!SAY hello big world', 'nick',
+                                          '#a'))
+        self.assertTrue(self.router.route('.s hi', 'nick'))
+        self.assertTrue(self.router.route('!say', 'nick'))
+        self.assertFalse(self.router.route('!sayx', 'nick'))
+        self.assertFalse(self.router.route('say hi', 'nick'))
+        self.assertEqual(self.calls, [('nick', '#a', 'hello', 'big world'),
+                                      ('nick', None, 'hi')])
+        self.router.remove_command('s')
+        self.assertFalse(self.router.route('!say hi', 'nick'))
+
+    def test_cooldown(self):
+        self.router.add_command('ping', self.record, cooldown=10.0)
+        with mock.patch('time.monotonic') as monotonic:
+            for now, sender, channel in [(100.0, 'a', '#a'),
+                                         (105.0, 'b', '#a'),
+                                         (105.0, 'b', None),
+                                         (111.0, 'c', '#a')]:
+                monotonic.return_value = now
+                self.router.route('!ping', sender, channel)
+        self.assertEqual(self.calls, [('a', '#a'), ('b', None), ('c', '#a')])
+
+    def test_cooldowns_are_forgotten_when_over(self):
+        self.router.add_command('ping', self.record, cooldown=10.0)
+        command = self.router._commands['ping']
+        with mock.patch('time.monotonic') as monotonic:
+            for i in range(1000):
+                monotonic.return_value = float(i)
+                self.router.route('!ping', 'nick{}'.format(i))
+        self.assertEqual(len(self.calls), 1000)
+        self.assertEqual(len(command.last_executed), 10)
+
+    def test_failed_coroutine_is_logged(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.addCleanup(loop.close)
+        client = mock.Mock()
+        self.router.handle_client_init(client)
+
+        def fail(sender, channel):
+            future = asyncio.Future()
+            future.set_exception(RuntimeError('broken'))
+            return future
+
+        def answer(sender, channel):
+            future = asyncio.Future()
+            loop.call_soon(future.set_result, 'pong')
+            return future
+
+        self.router.add_command('fail', fail, reply=True)
+        self.router.add_command('ping', answer, reply=True)
+        self.router.route('!fail', 'nick', '#a')
+        self.router.route('!ping', 'nick', '#a')
+        loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual(client._logger.error.call_count, 1)
+        client.send_message.assert_called_once_with('#a', 'pong')
+
+
+if __name__ == '__main__':
+    unittest.main()
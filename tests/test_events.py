@@ -0,0 +1,85 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import logging
+import unittest
+from unittest import mock
+
+from fredirc.client import IRCClientState
+from fredirc.events import EventBus
+from fredirc.handler import IRCHandler
+from fredirc.handler import _ignores
+from fredirc.info import ChannelInfo
+from fredirc.processor import MessageProcessor
+
+
+class _Handler(IRCHandler):
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def handle_join(self, channel, nick):
+        self.calls.append(('handler', channel, nick))
+
+
+class EventBusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = EventBus()
+        self.calls = []
+
+    def test_priorities_and_order(self):
+        self.bus.subscribe('join', lambda c, n: self.calls.append('low'), -1)
+        self.bus.subscribe('join', lambda c, n: self.calls.append('first'))
+        self.bus.subscribe('join', lambda c, n: self.calls.append('second'))
+        self.bus.subscribe('join', lambda c, n: self.calls.append('high'), 1)
+        self.bus.handle_join('#a', 'nick')
+        self.assertEqual(self.calls, ['high', 'first', 'second', 'low'])
+
+    def test_filters(self):
+        self.bus.subscribe('join', lambda c, n: self.calls.append(n),
+                           channel='#A', nick='Alice')
+        self.bus.handle_join('#a', 'bob')
+        self.bus.handle_join('#b', 'alice')
+        self.bus.handle_join('#a', 'alice')
+        self.assertEqual(self.calls, ['alice'])
+        with self.assertRaises(ValueError):
+            self.bus.subscribe('ping', print, channel='#a')
+        with self.assertRaises(ValueError):
+            self.bus.subscribe('no_such_event', print)
+
+    def test_handlers(self):
+        handler = _Handler(self.calls)
+        self.bus.subscribe_handler(handler)
+        self.assertFalse(self.bus.has_listeners('part'))
+        self.bus.handle_join('#a', 'nick')
+        self.bus.unsubscribe_handler(handler)
+        self.bus.handle_join('#a', 'nick')
+        self.assertEqual(self.calls, [('handler', '#a', 'nick')])
+
+    def test_events_without_listeners_are_ignored(self):
+        self.assertTrue(_ignores(self.bus, 'join'))
+        self.bus.subscribe('join', print)
+        self.assertFalse(_ignores(self.bus, 'join'))
+        self.bus.unsubscribe('join', print)
+        self.assertTrue(_ignores(self.bus, 'join'))
+
+    def test_arguments_of_ignored_events_are_not_built(self):
+        state = IRCClientState()
+        state.connected = True
+        state.nick = 'bot'
+        state.channels['#a'] = ChannelInfo('#a')
+        processor = MessageProcessor(self.bus, state, logging.getLogger())
+        message = ':nick!user@host PRIVMSG #a :hello'
+        with mock.patch('fredirc.parsing.parse_message_target') as parse:
+            processor.process(message)
+            self.assertFalse(parse.called)
+        self.bus.subscribe('channel_message',
+                           lambda *args: self.calls.append(args))
+        processor.process(message)
+        self.assertEqual(self.calls, [('#a', 'hello', 'nick')])
+
+
+if __name__ == '__main__':
+    unittest.main()
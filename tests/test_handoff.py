@@ -0,0 +1,206 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from fredirc import handoff
+from fredirc.client import IRCClientState
+from fredirc.handler import BaseIRCHandler, IRCHandler
+from fredirc.info import ChannelInfo
+from fredirc.processor import MessageProcessor
+
+from tests import create_client
+
+# The successor answers channel messages until it is told 'bye'
+SUCCESSOR = '''
+import asyncio
+import sys
+from fredirc import BaseIRCHandler, IRCClient
+
+class Successor(BaseIRCHandler):
+
+    def handle_channel_message(self, channel, message, sender=None):
+        if message == 'bye':
+            self.client.terminate()
+        else:
+            self.client.send_message(channel, 'ack ' + message)
+
+asyncio.set_event_loop(asyncio.new_event_loop())
+IRCClient(Successor(), 'other', 'unused').run(handoff_path=sys.argv[1],
+                                              handoff_timeout=20)
+'''
+
+
+class _Recorder(IRCHandler):
+
+    def __init__(self):
+        self.events = []
+
+    def handle_netsplit(self, servers, nicks, members):
+        self.events.append(('netsplit', set(nicks)))
+
+    def handle_mode_changes(self, channel, changes, initiator):
+        self.events.append(('modes', channel, len(changes)))
+
+    def handle_own_join(self, channel):
+        self.events.append(('own_join', channel))
+
+
+def _processor(handler):
+    state = IRCClientState()
+    state.connected = True
+    state.nick = 'bot'
+    info = ChannelInfo('#a')
+    info._add_nicks('bot', 'alice', 'bob')
+    state.channels['#a'] = info
+    processor = MessageProcessor(handler, state, logging.getLogger('test'))
+    processor.detect_netsplits = True
+    processor.netsplit_window = 10.0
+    processor.batch_modes = True
+    processor.mode_batch_window = 10.0
+    return processor
+
+
+class HandoffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def _hand_over(self, processor):
+        handler = _Recorder()
+        successor = _processor(handler)
+        data = json.loads(json.dumps(handoff.processor_to_dict(processor)))
+        self.assertTrue(handoff.restore_processor(successor, data))
+        return successor, handler
+
+    def test_work_in_progress_is_passed_on(self):
+        recorder = _Recorder()
+        processor = _processor(recorder)
+        processor._state.channels['#a']._mask_list('b')._replace(
+            [('*!*@spam', 'alice', 1400000000)])
+        for message in (':bot!u@h JOIN #b',
+                        ':srv 353 bot = #b :bot carol',
+                        ':srv MODE #a +v bob',
+                        ':alice!u@h QUIT :hub.example.com leaf.example.com'):
+            processor.process(message)
+        self.assertEqual(recorder.events, [])
+        successor, handler = self._hand_over(processor)
+
+        self.assertEqual(set(successor._pending_channel_info['#b'].nicks),
+                         {'bot', 'carol'})
+        self.assertEqual(
+            successor._state.channels['#a'].bans.info('*!*@SPAM'),
+            ('alice', 1400000000))
+        successor.process(':srv 366 bot #b :End of /NAMES list.')
+        self.assertIn('#b', successor._state.channels)
+        self.assertIn(('own_join', '#b'), handler.events)
+        successor._flush_netsplits()
+        successor._flush_mode_batches()
+        self.assertIn(('netsplit', {'alice'}), handler.events)
+        self.assertIn(('modes', '#a', 1), handler.events)
+
+    def test_invalid_data_leaves_processor_untouched(self):
+        processor = _processor(_Recorder())
+        processor.process(':bot!u@h JOIN #b')
+        data = handoff.processor_to_dict(processor)
+        data['netsplits'] = [None]
+        successor = _processor(_Recorder())
+        self.assertFalse(handoff.restore_processor(successor, data))
+        self.assertEqual(len(successor._pending_channel_info), 0)
+
+
+@unittest.skipUnless(handoff.is_supported(), 'no Unix sockets')
+class LiveHandoffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server, client_sock = socket.socketpair()
+        self.server.settimeout(10)
+        self.received = self.server.makefile('rb')
+        self.client = create_client(BaseIRCHandler())
+        self.loop.run_until_complete(self.loop.create_connection(
+            lambda: self.client, sock=client_sock))
+
+    def tearDown(self):
+        self.received.close()
+        self.server.close()
+        self.loop.close()
+        print(open(os.path.join(self.tmp.name, "irc.log")).read()) if os.path.exists(os.path.join(self.tmp.name, "irc.log")) else None
+        self.tmp.cleanup()
+
+    def send(self, *lines):
+        self.server.sendall(''.join(lines).encode())
+        self.loop.run_until_complete(asyncio.sleep(0.1))
+
+    def read_until(self, text):
+        """ Return the lines the server receives up to the one containing
+        text.
+        """
+        lines = []
+        while not lines or text not in lines[-1]:
+            line = self.received.readline()
+            self.assertTrue(line, 'connection closed')
+            lines.append(line.decode().rstrip('\r\n'))
+        return lines
+
+    def start_successor(self, path):
+        script = os.path.join(self.tmp.name, 'successor.py')
+        with open(script, 'w') as f:
+            f.write(SUCCESSOR)
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(
+            os.path.dirname(os.path.abspath(__file__))))
+        successor = subprocess.Popen([sys.executable, script, path],
+                                     cwd=self.tmp.name, env=env)
+        self.addCleanup(successor.wait, 10)
+        self.addCleanup(successor.kill)
+        deadline = time.monotonic() + 10
+        while not os.path.exists(path):
+            self.assertLess(time.monotonic(), deadline)
+            self.assertIsNone(successor.poll())
+            time.sleep(0.05)
+        return successor
+
+    def test_successor_keeps_talking_to_server(self):
+        self.send(':srv 001 bot :Welcome\r\n',
+                  ':bot!u@h JOIN #a\r\n',
+                  ':srv 353 bot = #a :bot alice\r\n',
+                  ':srv 366 bot #a :End of /NAMES list.\r\n')
+        self.client.enable_command_coalescing(True, 10.0)
+        self.client.join('#b')
+        self.client.send_message('#a', 'later', delay=0.5)
+        self.send(':alice!u@h PRIVMSG #a :hel')
+        path = os.path.join(self.tmp.name, 'handoff.sock')
+        successor = self.start_successor(path)
+
+        self.loop.call_soon(self.client.hand_off, path)
+        self.loop.run_forever()
+        self.assertIn('JOIN #b', self.read_until('JOIN #b')[-1])
+        # The partial line is completed and answered by the successor,
+        # which also sends the delayed message
+        self.server.sendall(b'lo\r\n')
+        self.assertEqual(self.read_until('ack hello')[-1],
+                         ':bot PRIVMSG #a :ack hello')
+        self.assertEqual(self.read_until('later')[-1],
+                         ':bot PRIVMSG #a :later')
+        self.server.sendall(b':alice!u@h PRIVMSG #a :bye\r\n')
+        self.assertEqual(successor.wait(10), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import random
+import re
+import unittest
+
+from fredirc.hostmask import HostmaskMatcher
+
+
+class HostmaskMatcherTest(unittest.TestCase):
+
+    def test_incomplete_masks_are_completed(self):
+        matcher = HostmaskMatcher()
+        self.assertEqual(matcher.add('Nick'), 'nick!*@*')
+        self.assertEqual(matcher.add('user@host'), '*!user@host')
+        self.assertEqual(matcher.add('nick!user'), 'nick!user@*')
+        self.assertIn('NICK', matcher)
+        self.assertEqual(len(matcher), 3)
+
+    def test_match(self):
+        matcher = HostmaskMatcher()
+        matcher.add('*!*@*.example.com', 'domain')
+        matcher.add('alice', 'alice')
+        matcher.add('*!~spam@*', 'spam')
+        matcher.add('b?b!*@*', 'bob')
+        self.assertEqual(
+            sorted(matcher.match('alice', 'a', 'host.example.com')),
+            ['alice', 'domain'])
+        self.assertEqual(sorted(matcher.match('bob', '~spam', 'example.com')),
+                         ['bob', 'spam'])
+        self.assertEqual(matcher.match('carol', 'c', 'example.org'), [])
+        self.assertEqual(matcher.match_prefix('ALICE!a@EXAMPLE.com'),
+                         ['alice'])
+
+    def test_casemapping(self):
+        matcher = HostmaskMatcher()
+        matcher.add('nick[away]')
+        self.assertEqual(len(matcher.match('NICK{AWAY}')), 1)
+        matcher.set_casemapping('ascii')
+        self.assertEqual(matcher.match('NICK{AWAY}'), [])
+        self.assertEqual(len(matcher.match('NICK[AWAY]')), 1)
+
+    def test_remove(self):
+        matcher = HostmaskMatcher()
+        matcher.add('*!*@*.example.com')
+        matcher.add('alice')
+        matcher.remove('*!*@*.EXAMPLE.com')
+        matcher.remove('unknown')
+        self.assertEqual(list(matcher), ['alice!*@*'])
+        self.assertEqual(matcher.match('bob', 'b', 'a.example.com'), [])
+        self.assertEqual(matcher._by_host, {})
+
+    def test_index_agrees_with_plain_matching(self):
+        rng = random.Random(42)
+        parts = ['a', 'b', 'ab', '*', '?', 'a*', '*b', 'x.a', '*.a.b']
+        masks = {'{}!{}@{}'.format(*(rng.choice(parts) for _ in range(3)))
+                 for _ in range(200)}
+        matcher = HostmaskMatcher()
+        for mask in masks:
+            matcher.add(mask)
+        for _ in range(200):
+            nick, user, host = (rng.choice(['a', 'b', 'ab', 'x.a', 'c.a.b'])
+                                for _ in range(3))
+            hostmask = '{}!{}@{}'.format(nick, user, host)
+            expected = {mask for mask in masks if re.match(
+                ''.join('.*' if c == '*' else '.' if c == '?' else
+                        re.escape(c) for c in mask) + r'\Z', hostmask)}
+            self.assertEqual(set(matcher.match(nick, user, host)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import logging
+import unittest
+
+from fredirc.client import IRCClientState
+from fredirc.handler import IRCHandler
+from fredirc.info import ChannelInfo
+from fredirc.info import _ChannelDict
+from fredirc.messages import ChannelMode
+from fredirc.processor import MessageProcessor
+
+
+class ChannelDictTest(unittest.TestCase):
+
+    def test_find(self):
+        channels = _ChannelDict({'#Foo[1]': ChannelInfo('#Foo[1]')})
+        channels['#Bar'] = ChannelInfo('#Bar')
+        self.assertIs(channels.find('#foo{1}'), channels['#Foo[1]'])
+        self.assertIsNone(channels.find('#foo{1}', 'ascii'))
+        self.assertIs(channels.find('#FOO[1]', 'ascii'), channels['#Foo[1]'])
+        del channels['#Bar']
+        self.assertIsNone(channels.find('#bar'))
+        channels.pop('#Foo[1]')
+        self.assertIsNone(channels.find('#foo[1]'))
+        channels.update({'#Baz': ChannelInfo('#Baz')})
+        self.assertEqual(channels.find('#BAZ').name, '#Baz')
+        channels.clear()
+        self.assertIsNone(channels.find('#baz'))
+
+
+class MaskListCasemappingTest(unittest.TestCase):
+
+    def setUp(self):
+        state = IRCClientState()
+        state.connected = True
+        state.nick = 'bot'
+        state.channels['#Chan'] = ChannelInfo('#Chan')
+        self.state = state
+        self.processor = MessageProcessor(IRCHandler(), state,
+                                          logging.getLogger())
+
+    def test_mode_changes_for_target_in_other_case(self):
+        self.processor.process(':op!u@h MODE #chan +b nick[1]!*@*')
+        bans = self.state.channels['#Chan'].bans
+        self.assertEqual(list(bans), ['nick[1]!*@*'])
+        # rfc1459: [ is the upper case of {
+        self.assertEqual(bans.match('NICK{1}', 'u', 'h'), ['nick[1]!*@*'])
+
+    def test_server_casemapping_is_used(self):
+        self.processor.process(':server 005 bot CASEMAPPING=ascii :are '
+                               'supported')
+        self.processor.process(':op!u@h MODE #chan +b nick[1]!*@*')
+        bans = self.state.channels['#Chan'].bans
+        self.assertEqual(bans.match('NICK{1}', 'u', 'h'), [])
+        self.assertEqual(bans.match('NICK[1]', 'u', 'h'), ['nick[1]!*@*'])
+        info = ChannelInfo('#x', casemapping='ascii')
+        mask_list = info._mask_list(ChannelMode.BAN)
+        self.assertEqual(mask_list._matcher._casemapping, 'ascii')
+
+
+class MaskListColonTest(unittest.TestCase):
+
+    def setUp(self):
+        state = IRCClientState()
+        state.connected = True
+        state.nick = 'bot'
+        state.channels['#chan'] = ChannelInfo('#chan')
+        self.info = state.channels['#chan']
+        self.processor = MessageProcessor(IRCHandler(), state,
+                                          logging.getLogger())
+
+    def test_ipv6_masks_from_mode(self):
+        self.processor.process(
+            ':op!u@h MODE #chan +bb *!*@2001:db8::1 ~a:account')
+        self.assertEqual(list(self.info.bans),
+                         ['*!*@2001:db8::1', '~a:account'])
+        self.assertTrue(self.info.is_banned('nick', 'u', '2001:db8::1'))
+        self.assertFalse(self.info.is_banned('nick', 'u', '2001:db8::2'))
+        self.processor.process(':op!u@h MODE #chan -b *!*@2001:db8::1')
+        self.assertFalse(self.info.is_banned('nick', 'u', '2001:db8::1'))
+
+    def test_ipv6_masks_from_ban_list(self):
+        for message in (
+                ':srv 367 bot #chan *!*@2001:db8::* op!u@h 1400000000',
+                ':srv 367 bot #chan *!*@::ffff:10.0.0.1 op 1400000001',
+                ':srv 368 bot #chan :End of channel ban list'):
+            self.processor.process(message)
+        bans = self.info.bans
+        self.assertTrue(bans.complete)
+        self.assertEqual(bans.info('*!*@2001:db8::*'),
+                         ('op!u@h', 1400000000))
+        self.assertEqual(self.info.matching_bans('nick', 'u', '2001:db8::5'),
+                         ['*!*@2001:db8::*'])
+        self.assertTrue(self.info.is_banned('x', 'y', '::ffff:10.0.0.1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
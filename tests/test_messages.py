@@ -0,0 +1,67 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import unittest
+
+from fredirc import messages
+
+PREFIX = ':nick!~user@host.example.com'
+
+
+class SplitTextTest(unittest.TestCase):
+
+    def test_short_text_is_one_line(self):
+        self.assertEqual(messages.split_text('hello world', 400),
+                         [b'hello world'])
+
+    def test_empty_text(self):
+        self.assertEqual(messages.split_text('', 400), [b''])
+
+    def test_line_breaks(self):
+        self.assertEqual(messages.split_text('a\r\nb\rc\n\nd', 400),
+                         [b'a', b'b', b'c', b'd'])
+
+    def test_control_codes_are_kept(self):
+        for text in ('hello \x1ditalic\x1d world', '\x02bold\x02 \x0304red',
+                     'a\x1cb\x1ec\x85d e'):
+            self.assertEqual(messages.split_text(text, 400),
+                             [text.encode('utf-8')])
+
+    def test_split_at_space(self):
+        self.assertEqual(messages.split_text('aaaa bbbb cccc', 9),
+                         [b'aaaa bbbb', b'cccc'])
+
+    def test_long_word_is_split(self):
+        self.assertEqual(messages.split_text('a' * 10, 4),
+                         [b'aaaa', b'aaaa', b'aa'])
+
+    def test_multi_byte_characters_at_512_byte_boundary(self):
+        target = '#channel'
+        overhead = len('{} PRIVMSG {} :\r\n'.format(PREFIX, target).encode())
+        max_bytes = messages.MAX_MESSAGE_LENGTH - overhead
+        # Three byte characters, with one ASCII character in front, so that
+        # characters cross the limit, mixed with formatting codes
+        text = 'x' + '\x02€€€\x02' * 200
+        lines = messages.split_text(text, max_bytes)
+        self.assertEqual(b''.join(lines).decode('utf-8'), text)
+        for line in lines:
+            line.decode('utf-8')  # no character was cut
+            message = messages.privmsg(target, line, PREFIX[1:])
+            self.assertLessEqual(len(message), messages.MAX_MESSAGE_LENGTH)
+        # As few lines as possible
+        total = len(text.encode('utf-8'))
+        self.assertLessEqual(len(lines), -(-total // (max_bytes - 2)))
+
+    def test_four_byte_characters(self):
+        text = '\U0001F600' * 10
+        lines = messages.split_text(text, 6)
+        self.assertEqual(lines, ['\U0001F600'.encode('utf-8')] * 10)
+
+    def test_invalid_limit(self):
+        with self.assertRaises(ValueError):
+            messages.split_text('text', 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import asyncio
+import logging
+import unittest
+
+from fredirc.client import IRCClientState
+from fredirc.handler import IRCHandler
+from fredirc.info import ChannelInfo
+from fredirc.processor import MessageProcessor
+
+SPLIT = ':{} QUIT :hub.example.com leaf.example.com'
+
+
+class _Recorder(IRCHandler):
+
+    def __init__(self):
+        self.events = []
+
+    def handle_netsplit(self, servers, nicks, members):
+        self.events.append(('netsplit', set(nicks)))
+
+    def handle_netjoin(self, servers, nicks, members):
+        self.events.append(('netjoin', set(nicks)))
+
+    def handle_join(self, channel, nick):
+        self.events.append(('join', nick))
+
+    def handle_got_op(self, channel, nick, initiator):
+        self.events.append(('got_op', nick))
+
+
+class NetsplitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.handler = _Recorder()
+        state = IRCClientState()
+        state.connected = True
+        state.nick = 'bot'
+        info = ChannelInfo('#a')
+        info._add_nicks('bot', 'alice', 'bob')
+        state.channels['#a'] = info
+        self.processor = MessageProcessor(
+            self.handler, state, logging.getLogger('test'))
+        self.processor.detect_netsplits = True
+        self.processor.netsplit_window = 10.0
+
+    def tearDown(self):
+        self.loop.close()
+
+    def process(self, *messages):
+        for message in messages:
+            self.processor.process(message)
+
+    def test_quits_are_coalesced(self):
+        self.process(SPLIT.format('alice!u@h'), SPLIT.format('bob!u@h'))
+        self.assertEqual(self.handler.events, [])
+        self.processor._flush_netsplits()
+        self.assertEqual(self.handler.events,
+                         [('netsplit', {'alice', 'bob'})])
+
+    def test_mode_flushes_netsplit(self):
+        self.process(SPLIT.format('alice!u@h'),
+                     ':srv MODE #a +o bob')
+        self.assertEqual(self.handler.events,
+                         [('netsplit', {'alice'}), ('got_op', 'bob')])
+
+    def test_netjoin_then_mode_keeps_order(self):
+        self.process(SPLIT.format('alice!u@h'))
+        self.processor._flush_netsplits()
+        self.process(':alice!u@h JOIN #a', ':srv MODE #a +o alice')
+        self.assertEqual(self.handler.events[1:],
+                         [('netjoin', {'alice'}), ('got_op', 'alice')])
+
+    def test_users_who_did_not_return_are_forgotten(self):
+        self.process(SPLIT.format('alice!u@h'), SPLIT.format('bob!u@h'))
+        self.processor._flush_netsplits()
+        self.process(':alice!u@h JOIN #a')
+        self.processor._flush_netsplits()
+        # bob did not come back with the servers
+        self.processor.netjoin_grace = -1.0
+        self.process(':bob!u@h JOIN #a')
+        self.assertEqual(self.handler.events[-1], ('join', 'bob'))
+
+
+if __name__ == '__main__':
+    unittest.main()
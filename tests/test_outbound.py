@@ -0,0 +1,231 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from fredirc.messages import ChannelMode
+from fredirc.outbound import CommandCoalescer
+from fredirc.outbound import FloodControl
+from fredirc.outbound import OutboundQueue
+from fredirc.parsing import ChannelModeChange
+
+
+class FloodControlTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.written = []
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_burst_then_rate(self):
+        flood_control = FloodControl(self.written.append, 3, 0.05)
+        for i in range(5):
+            flood_control.send(i)
+        self.assertEqual(self.written, [0, 1, 2])
+        self.assertEqual(len(flood_control), 2)
+        self.loop.run_until_complete(asyncio.sleep(0.08))
+        self.assertEqual(self.written, [0, 1, 2, 3])
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertEqual(self.written, [0, 1, 2, 3, 4])
+
+    def test_clear(self):
+        flood_control = FloodControl(self.written.append, 1, 10.0)
+        for i in range(3):
+            flood_control.send(i)
+        self.assertEqual(flood_control.clear(), [1, 2])
+        self.assertEqual(len(flood_control), 0)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            FloodControl(self.written.append, 0)
+        with self.assertRaises(ValueError):
+            FloodControl(self.written.append, 1, -1.0)
+
+
+class CommandCoalescerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.sent = []
+        self.targets = None
+        self.modes = None
+        self.casemapping = 'rfc1459'
+
+    def tearDown(self):
+        self.loop.close()
+
+    def coalescer(self, window=10.0):
+        return CommandCoalescer(
+            lambda message: self.sent.append(message.decode().rstrip()),
+            window, lambda command: self.targets, lambda: self.modes,
+            lambda: self.casemapping)
+
+    def test_channels_are_packed_up_to_line_length(self):
+        coalescer = self.coalescer()
+        channels = ['#channel{:040}'.format(i) for i in range(30)]
+        left = ['&' + channel[1:] for channel in channels]
+        coalescer.join(channels)
+        coalescer.part(left, 'bye')
+        self.assertEqual(self.sent, [])
+        coalescer.flush()
+        joins = [line for line in self.sent if line.startswith('JOIN')]
+        parts = [line for line in self.sent if line.startswith('PART')]
+        self.assertEqual(len(joins), 3)
+        self.assertEqual(len(parts), 3)
+        for line in self.sent:
+            self.assertLessEqual(len(line) + 2, 512)
+        self.assertEqual(
+            [c for line in joins for c in line.split(' ')[1].split(',')],
+            channels)
+        self.assertEqual(
+            [c for line in parts for c in line.split(' ')[1].split(',')],
+            left)
+        self.assertTrue(all(line.endswith(' :bye') for line in parts))
+
+    def test_channels_are_packed_up_to_max_targets(self):
+        self.targets = 2
+        coalescer = self.coalescer()
+        coalescer.join(['#a', '#b', '#c'])
+        coalescer.join(['#d', '#B'])
+        coalescer.flush()
+        self.assertEqual(self.sent, ['JOIN #a,#B', 'JOIN #c,#d'])
+
+    def test_channel_names_use_casemapping(self):
+        coalescer = self.coalescer()
+        coalescer.join(['#a[b]', '#A{B}'])
+        coalescer.flush()
+        self.assertEqual(self.sent, ['JOIN #A{B}'])
+        self.casemapping = 'ascii'
+        coalescer.join(['#a[b]', '#A{B}'])
+        coalescer.flush()
+        self.assertEqual(self.sent[1:], ['JOIN #a[b],#A{B}'])
+
+    def test_modes_are_grouped(self):
+        self.modes = 3
+        coalescer = self.coalescer()
+        for nick in ('a', 'b', 'c', 'd'):
+            coalescer.mode('#x', ChannelModeChange(
+                True, ChannelMode.OPERATOR, (nick,)))
+        coalescer.mode('#X', ChannelModeChange(
+            False, ChannelMode.VOICE, ('e',)))
+        coalescer.flush()
+        self.assertEqual(self.sent, ['MODE #x +ooo a b c', 'MODE #x +o-v d e'])
+
+    def test_last_change_of_mode_and_nick_wins(self):
+        coalescer = self.coalescer()
+        coalescer.mode('#x', ChannelModeChange(
+            True, ChannelMode.OPERATOR, ('nick[1]',)))
+        coalescer.mode('#x', ChannelModeChange(
+            True, ChannelMode.VOICE, ('nick[1]',)))
+        coalescer.mode('#x', ChannelModeChange(
+            False, ChannelMode.OPERATOR, ('NICK{1}',)))
+        coalescer.flush()
+        self.assertEqual(self.sent, ['MODE #x +v-o nick[1] NICK{1}'])
+
+    def test_part_and_rejoin_keep_their_order(self):
+        coalescer = self.coalescer()
+        coalescer.join(['#a', '#b'])
+        coalescer.part(['#A'], 'bye')
+        self.assertEqual(self.sent, ['JOIN #a,#b'])
+        coalescer.join(['#a'])
+        self.assertEqual(self.sent, ['JOIN #a,#b', 'PART #A :bye'])
+        coalescer.flush()
+        self.assertEqual(self.sent[2:], ['JOIN #a'])
+
+    def test_commands_are_sent_after_window(self):
+        coalescer = self.coalescer(window=0.05)
+        coalescer.join(['#a'])
+        coalescer.join(['#b'])
+        self.assertEqual(self.sent, [])
+        self.loop.run_until_complete(asyncio.sleep(0.1))
+        self.assertEqual(self.sent, ['JOIN #a,#b'])
+
+
+class OutboundQueueTest(unittest.TestCase):
+
+    def test_pop_sendable_targets(self):
+        queue = OutboundQueue()
+        queue.put('#a', b'1\r\n')
+        queue.put('#b', b'2\r\n')
+        queue.put('#a', b'3\r\n')
+        self.assertTrue(queue.has_target('#a'))
+        self.assertEqual(queue.pop(lambda target: target == '#b'),
+                         [b'2\r\n'])
+        self.assertFalse(queue.has_target('#b'))
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(queue.pop(lambda target: True), [b'1\r\n', b'3\r\n'])
+        self.assertEqual(len(queue), 0)
+
+    def test_max_size_drops_oldest(self):
+        queue = OutboundQueue(max_size=2)
+        queue.put('#a', b'1\r\n')
+        queue.put('#b', b'2\r\n')
+        queue.put('#a', b'3\r\n')
+        self.assertEqual(queue.dropped, 1)
+        self.assertEqual(queue.pop(lambda target: True), [b'2\r\n', b'3\r\n'])
+
+    def test_expired_messages_are_discarded(self):
+        queue = OutboundQueue(ttl=-1.0)
+        queue.put('#a', b'1\r\n')
+        self.assertFalse(queue.has_target('#a'))
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(queue.pop(lambda target: True), [])
+
+    def test_clear(self):
+        queue = OutboundQueue(ttl=60.0)
+        queue.put('#a', b'1\r\n')
+        queue.put('#b', b'2\r\n', ttl=5.0)
+        queue.put('#a', b'3\r\n', ttl=-1.0)
+        messages = queue.clear()
+        self.assertEqual([message[:2] for message in messages],
+                         [('#a', b'1\r\n'), ('#b', b'2\r\n')])
+        self.assertAlmostEqual(messages[0][2], 60.0, delta=1.0)
+        self.assertAlmostEqual(messages[1][2], 5.0, delta=1.0)
+        self.assertEqual(len(queue), 0)
+        self.assertFalse(queue.has_target('#a'))
+
+    def test_file_survives_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'queue')
+            queue = OutboundQueue(path=path)
+            for i in range(5):
+                queue.put('#a' if i % 2 else '#b', '{}\r\n'.format(i).encode())
+            queue.pop(lambda target: target == '#a')
+            queue = OutboundQueue(path=path)
+            self.assertEqual(len(queue), 3)
+            queue.put('#c', b'5\r\n')
+            self.assertEqual(OutboundQueue(path=path).pop(lambda t: True),
+                             [b'0\r\n', b'2\r\n', b'4\r\n', b'5\r\n'])
+
+    def test_file_is_appended_and_compacted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'queue')
+            queue = OutboundQueue(path=path)
+            for i in range(1000):
+                queue.put('#a', b'message\r\n')
+                queue.pop(lambda target: True)
+            # Removed messages don't pile up in the file
+            self.assertLess(os.path.getsize(path), 10000)
+            self.assertEqual(len(OutboundQueue(path=path)), 0)
+
+    def test_stuck_target_does_not_slow_down_others(self):
+        queue = OutboundQueue(max_size=100000)
+        for _ in range(50000):
+            queue.put('#stuck', b'message\r\n')
+        start = time.perf_counter()
+        for _ in range(1000):
+            queue.has_target('#other')
+        self.assertLess(time.perf_counter() - start, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
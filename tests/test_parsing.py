@@ -0,0 +1,55 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import unittest
+
+from fredirc import parsing
+
+ISUPPORT = (':srv 005 bot CHANLIMIT=#:250 PREFIX=(ov)@+ MODES=4 '
+            'CASEMAPPING=rfc1459 TARGMAX=PRIVMSG:4,NOTICE:4,JOIN: '
+            'NETWORK=Example\\x20Net :are supported by this server')
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_prefix_command_and_params(self):
+        self.assertEqual(
+            parsing.parse(':nick!u@h PRIVMSG #a :hello: world :)'),
+            ('nick!u@h', 'PRIVMSG', ['#a', 'hello: world :)']))
+        self.assertEqual(parsing.parse('PING :srv'), (None, 'PING', ['srv']))
+        self.assertEqual(parsing.parse('QUIT'), (None, 'QUIT', None))
+
+    def test_colons_inside_middle_params(self):
+        self.assertEqual(
+            parsing.parse(':srv MODE #a +bb *!*@2001:db8::1 ~a:account'),
+            ('srv', 'MODE', ['#a', '+bb', '*!*@2001:db8::1', '~a:account']))
+        self.assertEqual(
+            parsing.parse(':srv 367 bot #a *!*@2001:db8::1 op!u@h 1400000000'),
+            ('srv', '367', ['bot', '#a', '*!*@2001:db8::1', 'op!u@h',
+                            '1400000000']))
+
+    def test_isupport(self):
+        tokens = parsing.parse_isupport(parsing.parse(ISUPPORT)[2])
+        self.assertEqual(tokens, {
+            'CHANLIMIT': '#:250',
+            'PREFIX': '(ov)@+',
+            'MODES': '4',
+            'CASEMAPPING': 'rfc1459',
+            'TARGMAX': 'PRIVMSG:4,NOTICE:4,JOIN:',
+            'NETWORK': 'Example Net',
+        })
+
+    def test_negated_isupport_token(self):
+        tokens = parsing.parse_isupport(
+            parsing.parse(':srv 005 bot -EXCEPTS :are supported')[2])
+        self.assertEqual(tokens, {'EXCEPTS': None})
+
+    def test_targmax(self):
+        tokens = parsing.parse_isupport(parsing.parse(ISUPPORT)[2])
+        self.assertEqual(parsing.parse_targmax(tokens['TARGMAX']),
+                         {'PRIVMSG': 4, 'NOTICE': 4, 'JOIN': None})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import os
+import sys
+import tempfile
+import unittest
+
+from fredirc.plugins import PluginManager
+
+PLUGIN = '''
+from fredirc.handler import IRCHandler
+
+calls = []
+VERSION = {version}
+
+class Greeter(IRCHandler):
+
+    def handle_join(self, channel, nick):
+        calls.append(('join', VERSION, channel, nick))
+
+    def handle_part(self, channel, nick, message=None):
+        calls.append(('part', VERSION, channel, nick))
+
+    def greet(self, sender, channel, *args):
+        calls.append(('greet', VERSION, sender, channel) + args)
+'''
+
+
+class PluginManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.module = 'fredirc_test_plugin_{}'.format(id(self))
+        self.write_plugin(1)
+        sys.path.insert(0, self.tmp.name)
+        self.manager = PluginManager()
+        self.manager.register('greeter', self.module + ':Greeter',
+                              events=['join'], commands={'hi': 'greet'})
+
+    def tearDown(self):
+        sys.path.remove(self.tmp.name)
+        sys.modules.pop(self.module, None)
+        self.tmp.cleanup()
+
+    def write_plugin(self, version):
+        path = os.path.join(self.tmp.name, self.module + '.py')
+        with open(path, 'w') as f:
+            f.write(PLUGIN.format(version=version))
+        # Don't let a cached version with the same mtime win
+        os.utime(path, (version, version))
+
+    @property
+    def calls(self):
+        return sys.modules[self.module].calls
+
+    def test_plugin_is_imported_on_first_event(self):
+        self.manager.handle_part('#a', 'alice')
+        self.assertNotIn(self.module, sys.modules)
+        self.assertEqual(self.manager.import_report(),
+                         [('greeter', None, None)])
+        self.manager.handle_join('#a', 'alice')
+        self.assertEqual(self.calls, [('join', 1, '#a', 'alice')])
+        # All handler methods are subscribed now
+        self.manager.handle_part('#a', 'alice')
+        self.manager.handle_join('#b', 'bob')
+        self.assertEqual(self.calls[1:], [('part', 1, '#a', 'alice'),
+                                          ('join', 1, '#b', 'bob')])
+        (name, load_time, imported_modules), = self.manager.import_report()
+        self.assertEqual(name, 'greeter')
+        self.assertGreater(load_time, 0.0)
+        self.assertGreaterEqual(imported_modules, 1)
+
+    def test_plugin_is_imported_on_first_command(self):
+        self.manager.handle_channel_message('#a', 'hello', 'alice')
+        self.assertNotIn(self.module, sys.modules)
+        self.manager.handle_channel_message('#a', '!hi there', 'alice')
+        self.assertEqual(self.calls, [('greet', 1, 'alice', '#a', 'there')])
+        self.assertIsNotNone(self.manager.plugin('greeter'))
+
+    def test_register_errors(self):
+        with self.assertRaises(ValueError):
+            self.manager.register('greeter', self.module + ':Greeter')
+        with self.assertRaises(ValueError):
+            self.manager.register('other', self.module)
+
+    def test_reload(self):
+        old = self.manager.load('greeter')
+        self.assertGreaterEqual(self.manager.import_report()[0][2], 1)
+        self.write_plugin(2)
+        new = self.manager.reload('greeter')
+        self.assertIsNot(new, old)
+        self.assertIs(self.manager.plugin('greeter'), new)
+        # The report shows the reload, which imports no new modules
+        self.assertEqual(self.manager.import_report()[0][2], 0)
+        self.manager.handle_join('#a', 'alice')
+        self.manager.handle_channel_message('#a', '!hi', 'alice')
+        self.assertEqual(self.calls, [('join', 2, '#a', 'alice'),
+                                      ('greet', 2, 'alice', '#a')])
+
+    def test_unload(self):
+        self.manager.load('greeter')
+        self.manager.unload('greeter')
+        self.assertIsNone(self.manager.plugin('greeter'))
+        self.manager.handle_part('#a', 'alice')
+        self.assertEqual(self.calls, [])
+        # Used again, the plugin is loaded again
+        self.manager.handle_join('#a', 'alice')
+        self.manager.handle_join('#a', 'bob')
+        self.assertEqual(self.calls, [('join', 1, '#a', 'alice'),
+                                      ('join', 1, '#a', 'bob')])
+        self.assertIsNotNone(self.manager.plugin('greeter'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import asyncio
+import logging
+import unittest
+from unittest import mock
+
+from fredirc.client import IRCClientState
+from fredirc.handler import IRCHandler
+from fredirc.info import ChannelInfo
+from fredirc.info import SyncPolicy
+from fredirc.processor import MessageProcessor
+
+
+class _Recorder(IRCHandler):
+
+    def __init__(self):
+        self.events = []
+
+    def handle_channel_messages(self, messages):
+        self.events.append(('messages', [m[3] for m in messages]))
+
+    def handle_private_message(self, message, sender=None):
+        self.events.append(('private', message))
+
+    def handle_own_join(self, channel):
+        self.events.append(('own_join', channel))
+
+    def handle_part(self, channel, nick, message=None):
+        self.events.append(('part', channel, nick))
+
+    def handle_mode_changes(self, channel, changes, initiator):
+        self.events.append(('modes', channel, initiator, [
+            ('+' if c.added else '-') + c.mode + ' ' + ' '.join(c.params or ())
+            for c in changes]))
+
+
+class MessageBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.handler = _Recorder()
+        state = IRCClientState()
+        state.connected = True
+        state.nick = 'bot'
+        state.channels['#a'] = ChannelInfo('#a')
+        self.processor = MessageProcessor(
+            self.handler, state, logging.getLogger('test'))
+        self.processor.batch_messages = True
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_batch_is_flushed_once_per_iteration(self):
+        self.processor.process(':alice!u@h PRIVMSG #a :1')
+        self.processor.process(':bob!u@h PRIVMSG #a :2')
+        self.assertEqual(self.handler.events, [])
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(self.handler.events, [('messages', ['1', '2'])])
+
+    def test_other_events_keep_their_order(self):
+        self.processor.process(':alice!u@h PRIVMSG #a :1')
+        self.processor.process(':alice!u@h PRIVMSG bot :2')
+        self.assertEqual(self.handler.events,
+                         [('messages', ['1']), ('private', '2')])
+
+    def test_batch_is_flushed_before_expired_own_join(self):
+        with mock.patch('time.monotonic') as monotonic:
+            monotonic.return_value = 100.0
+            self.processor.process(':bot!u@h JOIN #b')
+            self.processor.process(':alice!u@h PRIVMSG #a :1')
+            monotonic.return_value = 200.0
+            self.processor.process(':alice!u@h PRIVMSG #a :2')
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(self.handler.events,
+                         [('messages', ['1']), ('own_join', '#b'),
+                          ('messages', ['2'])])
+
+
+class ModeBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.handler = _Recorder()
+        self.state = IRCClientState()
+        self.state.connected = True
+        self.state.nick = 'bot'
+        for channel in ('#a', '#b'):
+            info = ChannelInfo(channel)
+            info._add_nicks('bot', 'alice', 'bob')
+            self.state.channels[channel] = info
+        self.processor = MessageProcessor(
+            self.handler, self.state, logging.getLogger('test'))
+        self.processor.batch_modes = True
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_changes_of_a_message_are_passed_at_once(self):
+        self.processor.process(':alice!u@h MODE #a +ov-v bob bob bob')
+        self.processor.process(':alice!u@h MODE #a +o bot')
+        self.assertEqual(self.handler.events, [
+            ('modes', '#a', 'alice', ['+o bob', '+v bob', '-v bob']),
+            ('modes', '#a', 'alice', ['+o bot'])])
+
+    def test_changes_within_window_are_collected(self):
+        self.processor.mode_batch_window = 0.05
+        self.processor.process(':alice!u@h MODE #a +o bob')
+        self.processor.process(':bob!u@h MODE #a +v alice')
+        self.processor.process(':alice!u@h MODE #b +v bob')
+        self.processor.process(':alice!u@h MODE #a -o bob')
+        self.assertEqual(self.handler.events, [])
+        self.loop.run_until_complete(asyncio.sleep(0.1))
+        self.assertEqual(sorted(self.handler.events), [
+            ('modes', '#a', 'alice', ['+o bob', '-o bob']),
+            ('modes', '#a', 'bob', ['+v alice']),
+            ('modes', '#b', 'alice', ['+v bob'])])
+
+    def test_batch_is_flushed_before_part(self):
+        self.processor.mode_batch_window = 10.0
+        self.processor.process(':alice!u@h MODE #a +v bob')
+        self.processor.process(':bob!u@h PART #a')
+        self.assertEqual(self.handler.events, [
+            ('modes', '#a', 'alice', ['+v bob']), ('part', '#a', 'bob')])
+        self.assertIsNone(self.processor._mode_batch_task)
+
+    def test_list_and_prefix_modes_are_mixed(self):
+        self.processor.mode_batch_window = 10.0
+        self.processor.process(':alice!u@h MODE #a +bov *!*@spam bot bob')
+        self.processor.process(':alice!u@h MODE #a -b+e *!*@spam *!*@ok')
+        # Cached lists and the client's status are up to date before the
+        # batch is passed on
+        info = self.state.channels['#a']
+        self.assertEqual(list(info.bans), [])
+        self.assertEqual(info.ban_exceptions.info('*!*@ok')[0], 'alice')
+        self.assertEqual(self.state.operator_in, ['#a'])
+        self.assertEqual(self.handler.events, [])
+        self.processor._flush_mode_batches()
+        self.assertEqual(self.handler.events, [
+            ('modes', '#a', 'alice', ['+b *!*@spam', '+o bot', '+v bob',
+                                      '-b *!*@spam', '+e *!*@ok'])])
+
+
+class SyncPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = _Recorder()
+        self.state = IRCClientState()
+        self.state.connected = True
+        self.state.nick = 'bot'
+        self.processor = MessageProcessor(
+            self.handler, self.state, logging.getLogger('test'))
+
+    def join(self, channel, *nicks):
+        self.processor.process(':bot!u@h JOIN {}'.format(channel))
+        self.processor.process(':srv 353 bot = {} :bot {}'.format(
+            channel, ' '.join(nicks)))
+        self.processor.process(':srv 366 bot {} :End of /NAMES list.'.format(
+            channel))
+        return self.state.channels[channel]
+
+    def test_count(self):
+        self.processor._set_sync_policy('#a', SyncPolicy.COUNT)
+        info = self.join('#a', 'alice', 'bob', 'carol')
+        self.assertEqual(info.sync_policy, SyncPolicy.COUNT)
+        self.assertEqual(info.member_count, 4)
+        self.assertEqual(list(info.nicks), [])
+        self.processor.process(':dave!u@h JOIN #a')
+        self.processor.process(':alice!u@h PART #a')
+        self.processor.process(':bob!u@h KICK #a carol :bye')
+        self.assertEqual(info.member_count, 3)
+        self.assertIn(('own_join', '#a'), self.handler.events)
+
+    def test_none(self):
+        self.processor.sync_policy = SyncPolicy.NONE
+        self.processor.process(':bot!u@h JOIN #a')
+        # The member list isn't waited for
+        self.assertEqual(self.handler.events, [('own_join', '#a')])
+        info = self.state.channels['#a']
+        self.processor.process(':srv 353 bot = #a :bot alice bob')
+        self.processor.process(':srv 366 bot #a :End of /NAMES list.')
+        self.processor.process(':dave!u@h JOIN #a')
+        self.processor.process(':alice!u@h PART #a')
+        self.processor.process(':bob!u@h KICK #a dave :bye')
+        self.assertIsNone(info.member_count)
+        self.assertEqual(list(info.nicks), [])
+        self.assertEqual(self.handler.events,
+                         [('own_join', '#a'), ('part', '#a', 'alice')])
+
+    def test_channel_policies_use_casemapping(self):
+        self.processor.sync_policy = SyncPolicy.NONE
+        self.processor._set_sync_policy('#a[1]', SyncPolicy.FULL)
+        self.processor._set_sync_policy('#A{1}', SyncPolicy.COUNT)
+        self.assertEqual(len(self.processor.channel_sync_policies), 1)
+        self.assertEqual(self.join('#a[1]').sync_policy, SyncPolicy.COUNT)
+        self.state.isupport['CASEMAPPING'] = 'ascii'
+        self.assertEqual(self.join('#A[1]').sync_policy, SyncPolicy.NONE)
+        self.assertEqual(self.join('#a{1}').sync_policy, SyncPolicy.COUNT)
+
+if __name__ == '__main__':
+    unittest.main()
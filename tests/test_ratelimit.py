@@ -0,0 +1,106 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import logging
+import unittest
+
+from fredirc.client import IRCClientState
+from fredirc.handler import IRCHandler
+from fredirc.info import ChannelInfo
+from fredirc.processor import MessageProcessor
+from fredirc.ratelimit import InboundRateLimiter
+from fredirc.ratelimit import RateLimiter
+
+# The dropped messages are logged, but nowhere
+logging.getLogger('test.ratelimit').addHandler(logging.NullHandler())
+logging.getLogger('test.ratelimit').propagate = False
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        limiter = RateLimiter(2, 1.0)
+        self.assertTrue(limiter.allow('a', 0.0))
+        self.assertTrue(limiter.allow('a', 0.0))
+        self.assertFalse(limiter.allow('a', 0.5))
+        self.assertTrue(limiter.allow('a', 1.0))
+        self.assertFalse(limiter.allow('a', 1.0))
+        # Other keys have their own bucket
+        self.assertTrue(limiter.allow('b', 1.0))
+        self.assertEqual(limiter.rejections(), {'a': 2})
+        self.assertEqual(limiter.rejected, 2)
+
+    def test_least_recently_used_key_is_evicted(self):
+        limiter = RateLimiter(1, 10.0, max_keys=2)
+        limiter.allow('a', 0.0)
+        limiter.allow('b', 0.0)
+        limiter.allow('a', 0.0)
+        limiter.allow('c', 0.0)
+        self.assertEqual(len(limiter), 2)
+        self.assertEqual(set(limiter.rejections()), {'a'})
+        # b starts with a full bucket again
+        self.assertTrue(limiter.allow('b', 0.0))
+
+    def test_recent_rejections_are_reset(self):
+        limiter = RateLimiter(1, 10.0)
+        for _ in range(3):
+            limiter.allow('a', 0.0)
+        self.assertEqual(limiter.pop_recent_rejections('a'), 2)
+        self.assertEqual(limiter.pop_recent_rejections('a'), 0)
+        self.assertEqual(limiter.pop_recent_rejections('unknown'), 0)
+        self.assertEqual(limiter.rejections(), {'a': 2})
+
+
+class _Recorder(IRCHandler):
+
+    def __init__(self):
+        self.messages = []
+
+    def handle_channel_message(self, channel, message, sender=None):
+        self.messages.append(message)
+
+    def handle_private_message(self, message, sender=None):
+        self.messages.append(message)
+
+
+class InboundRateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = _Recorder()
+        state = IRCClientState()
+        state.connected = True
+        state.nick = 'bot'
+        state.channels['#chan'] = ChannelInfo('#chan')
+        logger = logging.getLogger('test.ratelimit')
+        self.processor = MessageProcessor(self.handler, state, logger)
+        self.processor.rate_limiter = InboundRateLimiter(
+            logger, user_burst=2, user_interval=60.0, channel_burst=3,
+            channel_interval=60.0)
+
+    def test_user_is_limited_across_nick_changes(self):
+        self.processor.process(':alice!u@h PRIVMSG bot :1')
+        self.processor.process(':alice!u@h PRIVMSG bot :2')
+        self.processor.process(':bob!u@h PRIVMSG bot :3')
+        self.assertEqual(self.handler.messages, ['1', '2'])
+
+    def test_channel_limit_does_not_count_for_the_user(self):
+        for i, nick in enumerate(('a', 'b', 'c', 'd')):
+            self.processor.process(
+                ':{0}!{0}@h PRIVMSG #chan :{1}'.format(nick, i))
+        self.processor.process(':d!d@h PRIVMSG bot :private')
+        self.processor.process(':d!d@h PRIVMSG bot :private')
+        self.assertEqual(self.handler.messages,
+                         ['0', '1', '2', 'private', 'private'])
+        self.assertEqual(self.processor.rate_limiter.stats(),
+                         {'dropped': 1, 'users': {},
+                          'channels': {'#chan': 1}})
+
+    def test_empty_target_is_no_channel(self):
+        self.processor.rate_limiter.allow = \
+            lambda user, channel=None: self.assertIsNone(channel) or True
+        self.processor._allow_by_rate('alice!u@h', ['', 'text'])
+
+
+if __name__ == '__main__':
+    unittest.main()
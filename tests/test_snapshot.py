@@ -0,0 +1,138 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from fredirc import snapshot
+from fredirc.client import IRCClientState
+from fredirc.handler import IRCHandler
+from fredirc.info import ChannelInfo
+from fredirc.info import SyncPolicy
+
+from tests import create_client
+
+
+def _state_with_channels():
+    state = IRCClientState()
+    state.server = 'irc.example.com'
+    state.isupport = {'CHANTYPES': '#&', 'NICKLEN': '30'}
+    full = ChannelInfo('#full')
+    full._set_topic('Topic of #full')
+    full._add_nicks('alice', 'bob')
+    state.channels['#full'] = full
+    count = ChannelInfo('#count', SyncPolicy.COUNT)
+    count._add_nicks('alice', 'bob', 'carol')
+    state.channels['#count'] = count
+    state.channels['#none'] = ChannelInfo('#none', SyncPolicy.NONE)
+    return state
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = json.loads(json.dumps(
+            snapshot.state_to_dict(_state_with_channels())))
+        state = IRCClientState()
+        self.assertTrue(snapshot.restore_state(state, data))
+        self.assertEqual(state.isupport, {'CHANTYPES': '#&', 'NICKLEN': '30'})
+        self.assertEqual(set(state.channels), {'#full', '#count', '#none'})
+        full = state.channels['#full']
+        self.assertEqual(full.topic, 'Topic of #full')
+        self.assertEqual(set(full.nicks), {'alice', 'bob'})
+        self.assertTrue(full.restored)
+        count = state.channels['#count']
+        self.assertEqual(count.sync_policy, SyncPolicy.COUNT)
+        self.assertEqual(count.member_count, 3)
+        self.assertEqual(state.channels['#none'].sync_policy,
+                         SyncPolicy.NONE)
+
+    def test_live_channels_are_kept(self):
+        data = snapshot.state_to_dict(_state_with_channels())
+        state = IRCClientState()
+        live = ChannelInfo('#full')
+        live._add_nicks('dave')
+        state.channels['#full'] = live
+        snapshot.restore_state(state, data)
+        self.assertIs(state.channels['#full'], live)
+        self.assertFalse(live.restored)
+
+    def test_unknown_version_is_rejected(self):
+        data = snapshot.state_to_dict(_state_with_channels())
+        data['version'] = -1
+        state = IRCClientState()
+        self.assertFalse(snapshot.restore_state(state, data))
+        self.assertEqual(state.channels, {})
+        self.assertEqual(state.isupport, {})
+
+    def test_version_1_is_restored(self):
+        data = {'version': 1, 'time': 0, 'server': None,
+                'isupport': {'NICKLEN': '9'},
+                'channels': {'#old': ['Old topic', ['alice']]}}
+        state = IRCClientState()
+        self.assertTrue(snapshot.restore_state(state, data))
+        old = state.channels['#old']
+        self.assertEqual(old.sync_policy, SyncPolicy.FULL)
+        self.assertEqual(set(old.nicks), {'alice'})
+
+    def test_invalid_data_leaves_state_untouched(self):
+        data = snapshot.state_to_dict(_state_with_channels())
+        data['channels']['#broken'] = ['topic']
+        state = IRCClientState()
+        self.assertFalse(snapshot.restore_state(state, data))
+        self.assertEqual(state.channels, {})
+        self.assertEqual(state.isupport, {})
+
+    def test_file_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state.json')
+            state = IRCClientState()
+            self.assertFalse(snapshot.read_snapshot(state, path))
+            snapshot.write_snapshot(_state_with_channels(), path)
+            self.assertFalse(os.path.exists(path + '.tmp'))
+            self.assertTrue(snapshot.read_snapshot(state, path))
+            self.assertEqual(len(state.channels), 3)
+
+    def test_invalid_files_are_ignored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state.json')
+            for content in ('{"version": 2, "chan', '[1, 2]', 'null'):
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                state = IRCClientState()
+                self.assertFalse(snapshot.read_snapshot(state, path))
+                self.assertEqual(state.channels, {})
+
+
+class ClientSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'state.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+        self.loop.close()
+
+    def test_snapshot_is_written_when_connection_is_lost(self):
+        client = create_client(IRCHandler())
+        client.enable_state_snapshots(self.path, interval=3600.0)
+        client._snapshot_task.stop()
+        client._state.connected = True
+        client._state.registered = True
+        client._state.channels['#a'] = ChannelInfo('#a')
+        client.connection_lost(None)
+        self.assertEqual(client._state.channels, {})
+        state = IRCClientState()
+        self.assertTrue(snapshot.read_snapshot(state, self.path))
+        self.assertEqual(set(state.channels), {'#a'})
+
+
+if __name__ == '__main__':
+    unittest.main()
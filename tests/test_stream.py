@@ -0,0 +1,95 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import asyncio
+import unittest
+from unittest import mock
+
+from fredirc.handler import IRCHandler
+from fredirc.stream import Overflow
+
+from tests import create_client
+
+
+class _Handler(IRCHandler):
+
+    def __init__(self):
+        self.pings = []
+
+    def handle_ping(self, server):
+        if server == 'bad':
+            raise RuntimeError('bad ping')
+        self.pings.append(server)
+
+
+class EventStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.handler = _Handler()
+        self.client = create_client(self.handler)
+        self.client._state.connected = True
+        self.client._transport = mock.Mock()
+        self.client.terminate = mock.Mock()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def receive(self, *servers):
+        self.client.data_received(''.join(
+            'PING :{}\r\n'.format(server) for server in servers).encode())
+
+    def next_event(self, stream):
+        return self.loop.run_until_complete(stream.__anext__())
+
+    def test_events_are_queued_and_passed_to_handler(self):
+        stream = self.client.events({'ping'})
+        self.receive('a', 'b')
+        self.assertEqual(self.handler.pings, ['a', 'b'])
+        event = self.next_event(stream)
+        self.assertEqual((event.name, event.server), ('ping', 'a'))
+        self.assertEqual(self.next_event(stream).server, 'b')
+        stream.close()
+        with self.assertRaises(StopAsyncIteration):
+            self.next_event(stream)
+
+    def test_unknown_event_names_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.client.events({'no_such_event'})
+
+    def test_drop_policies(self):
+        newest = self.client.events(max_size=2,
+                                    overflow=Overflow.DROP_NEWEST)
+        oldest = self.client.events(max_size=2,
+                                    overflow=Overflow.DROP_OLDEST)
+        self.receive('a', 'b', 'c')
+        self.assertEqual([e.server for e in newest._queue], ['a', 'b'])
+        self.assertEqual([e.server for e in oldest._queue], ['b', 'c'])
+        self.assertEqual((newest.dropped, oldest.dropped), (1, 1))
+
+    def test_pause_stops_reading_until_half_is_consumed(self):
+        stream = self.client.events(max_size=2)
+        self.receive('a', 'b', 'c', 'd')
+        self.client._transport.pause_reading.assert_called_once_with()
+        # Lines after the one that filled the queue wait in the buffer
+        self.assertEqual(self.handler.pings, ['a', 'b', 'c'])
+        self.next_event(stream)
+        self.next_event(stream)
+        self.client._transport.resume_reading.assert_called_once_with()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(self.handler.pings, ['a', 'b', 'c', 'd'])
+
+    def test_exception_after_resume_terminates_client(self):
+        stream = self.client.events(max_size=1)
+        self.receive('a', 'b', 'bad')
+        self.next_event(stream)
+        with self.assertLogs(self.client._logger, 'CRITICAL'):
+            self.next_event(stream)
+            self.loop.run_until_complete(asyncio.sleep(0))
+        self.client.terminate.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,349 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import asyncio
+import heapq
+import itertools
+import random
+import unittest
+
+from fredirc.task import LoadSpreader
+from fredirc.task import Overlap
+from fredirc.task import Task
+from fredirc.task import TimerWheel
+
+
+class _FakeHandle(object):
+
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _FakeLoop(asyncio.AbstractEventLoop):
+    """ Event loop with a manual clock that only runs timers. """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.wakeups = 0
+        self.errors = []
+        self._timers = []
+        self._sequence = itertools.count()
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback, *args):
+        handle = _FakeHandle(callback, args)
+        heapq.heappush(self._timers, (when, next(self._sequence), handle))
+        return handle
+
+    def call_exception_handler(self, context):
+        self.errors.append(context)
+
+    def advance(self, seconds):
+        end = self.now + seconds
+        while self._timers and self._timers[0][0] <= end:
+            when, _, handle = heapq.heappop(self._timers)
+            if handle.cancelled:
+                continue
+            self.now = max(self.now, when)
+            self.wakeups += 1
+            handle.callback(*handle.args)
+        self.now = end
+
+
+class TaskTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = _FakeLoop()
+        asyncio.set_event_loop(self.loop)
+        self.starts = []
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+
+    def task(self, runtime, overlap=Overlap.SKIP):
+        def run():
+            self.starts.append(self.loop.now - start)
+            self.loop.now += runtime
+        start = self.loop.now
+        return Task(1.0, True, run, overlap)
+
+    def test_runtime_does_not_shift_deadlines(self):
+        task = self.task(0.3)
+        task.start()
+        self.loop.advance(5.5)
+        self.assertEqual(self.starts, [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(task.stats.runs, 5)
+        self.assertAlmostEqual(task.stats.mean_runtime, 0.3)
+
+    def test_late_run_does_not_shift_deadlines(self):
+        task = self.task(0.0)
+        task.start()
+        self.loop.advance(0.9)
+        # The loop was blocked for half a second when the run was due
+        self.loop.now += 0.6
+        self.loop.advance(2.0)
+        self.assertEqual(self.starts, [1.5, 2.0, 3.0])
+        self.assertAlmostEqual(task.stats.max_lateness, 0.5)
+
+    def test_skip_drops_missed_runs(self):
+        task = self.task(2.5, Overlap.SKIP)
+        task.start()
+        self.loop.advance(6.0)
+        self.assertEqual(self.starts, [1.0, 4.0])
+        self.assertEqual(task.stats.skipped, 4)
+
+    def test_queue_catches_up_missed_runs(self):
+        task = self.task(2.5, Overlap.QUEUE)
+        task.start()
+        self.loop.advance(6.0)
+        # The runs due at 1.0 to 6.0 start one after another
+        self.assertEqual(self.starts, [1.0, 3.5, 6.0, 8.5, 11.0, 13.5])
+        self.assertEqual(task.stats.skipped, 0)
+
+    def test_regular_functions_do_not_run_concurrently(self):
+        task = self.task(2.5, Overlap.CONCURRENT)
+        task.start()
+        self.loop.advance(6.0)
+        self.assertEqual(self.starts, [1.0, 3.5, 6.0, 8.5, 11.0, 13.5])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            Task(-1.0)
+        with self.assertRaises(ValueError):
+            Task(1.0, overlap='never')
+
+
+class LoadSpreaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = _FakeLoop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+
+    def test_phases_are_spread_evenly(self):
+        for count in (2, 4, 8):
+            spreader = LoadSpreader()
+            phases = sorted(Task(2.0, True, spreader=spreader)._phase
+                            for _ in range(count))
+            gaps = [b - a for a, b in zip(phases, phases[1:])]
+            gaps.append(phases[0] + 2.0 - phases[-1])
+            for gap in gaps:
+                self.assertAlmostEqual(gap, 2.0 / count)
+
+    def test_each_interval_is_spread_on_its_own(self):
+        spreader = LoadSpreader()
+        spreader._offset = 0.1
+        self.assertAlmostEqual(
+            Task(1.0, True, spreader=spreader)._phase, 0.1)
+        self.assertAlmostEqual(
+            Task(10.0, True, spreader=spreader)._phase, 1.0)
+        self.assertAlmostEqual(
+            Task(1.0, True, spreader=spreader)._phase, 0.6)
+
+    def test_spread_tasks_do_not_run_at_once(self):
+        spreader = LoadSpreader(resolution=0.1)
+        tasks = [Task(1.0, True, lambda: None, spreader=spreader)
+                 for _ in range(8)]
+        for task in tasks:
+            task.start()
+        self.loop.advance(10.0)
+        self.assertEqual(sum(count for _, count in spreader.execution_counts),
+                         sum(task.stats.runs for task in tasks))
+        self.assertEqual(spreader.peak, 1)
+
+    def test_tasks_without_spreader_run_at_once(self):
+        starts = []
+        tasks = [Task(1.0, True, lambda: starts.append(self.loop.now))
+                 for _ in range(10)]
+        for task in tasks:
+            task.start()
+        self.loop.advance(3.5)
+        self.assertEqual(len(set(starts)), 3)
+
+    def test_jitter_does_not_shift_deadlines(self):
+        starts = []
+        task = Task(1.0, True, lambda: starts.append(self.loop.now - start),
+                    jitter=0.5)
+        start = self.loop.now
+        task.start()
+        self.loop.advance(20.5)
+        self.assertEqual(len(starts), 20)
+        for i, when in enumerate(starts, 1):
+            self.assertGreaterEqual(when, i)
+            self.assertLessEqual(when, i + 0.5)
+
+
+class CoroutineTaskTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_task(self, overlap):
+        """ Run a task whose coroutine takes longer than its interval and
+        return the number of runs in progress at each start.
+        """
+        running = []
+
+        def run():
+            running.append(task._running)
+            return asyncio.sleep(0.12)
+        task = Task(0.05, True, run, overlap)
+        task.start()
+        self.loop.run_until_complete(asyncio.sleep(0.35))
+        task.stop()
+        self.loop.run_until_complete(asyncio.sleep(0.15))
+        return task, running
+
+    def test_skip(self):
+        task, running = self.run_task(Overlap.SKIP)
+        self.assertEqual(set(running), {1})
+        self.assertGreater(task.stats.skipped, 0)
+
+    def test_queue(self):
+        task, running = self.run_task(Overlap.QUEUE)
+        self.assertEqual(set(running), {1})
+        self.assertEqual(task.stats.skipped, 0)
+        self.assertGreater(len(running), 1)
+
+    def test_concurrent(self):
+        task, running = self.run_task(Overlap.CONCURRENT)
+        self.assertGreater(max(running), 1)
+        self.assertEqual(task.stats.runs, len(running))
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = _FakeLoop()
+        asyncio.set_event_loop(self.loop)
+        self.calls = []
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+
+    def record(self, name):
+        self.calls.append((name, self.loop.now))
+
+    def test_calls_run_in_order_after_their_delay(self):
+        wheel = TimerWheel(resolution=0.1, slots=4, levels=2)
+        start = self.loop.now
+        delays = [random.uniform(0.0, 5.0) for _ in range(200)]
+        for delay in delays:
+            wheel.schedule(delay, self.record, delay)
+        self.assertEqual(len(wheel), 200)
+        self.loop.advance(6.0)
+        self.assertEqual(len(wheel), 0)
+        self.assertEqual(sorted(delay for delay, _ in self.calls),
+                         sorted(delays))
+        self.assertEqual([when for _, when in self.calls],
+                         sorted(when for _, when in self.calls))
+        for delay, when in self.calls:
+            self.assertGreaterEqual(when - start, delay - 1e-6)
+            self.assertLess(when - start, delay + 0.1 + 1e-6)
+
+    def test_timer_is_only_set_for_ticks_with_calls(self):
+        wheel = TimerWheel(resolution=0.01, slots=16, levels=3)
+        wheel.schedule(30.0, self.record, 'a')
+        wheel.schedule(30.0, self.record, 'b')
+        self.loop.advance(31.0)
+        self.assertEqual([name for name, _ in self.calls], ['a', 'b'])
+        # One wakeup per level instead of one per tick
+        self.assertLessEqual(self.loop.wakeups, 3)
+
+    def test_delays_beyond_the_highest_level(self):
+        wheel = TimerWheel(resolution=0.1, slots=4, levels=2)
+        wheel.schedule(100.0, self.record, 'late')
+        wheel.schedule(1.0, self.record, 'early')
+        self.loop.advance(99.0)
+        self.assertEqual([name for name, _ in self.calls], ['early'])
+        self.loop.advance(2.0)
+        self.assertEqual([name for name, _ in self.calls], ['early', 'late'])
+
+    def test_earlier_call_resets_timer(self):
+        wheel = TimerWheel(resolution=0.1)
+        wheel.schedule(10.0, self.record, 'late')
+        wheel.schedule(0.5, self.record, 'early')
+        self.loop.advance(1.0)
+        self.assertEqual([name for name, _ in self.calls], ['early'])
+
+    def test_cancel(self):
+        wheel = TimerWheel(resolution=0.1, slots=4, levels=2)
+        timers = [wheel.schedule(i * 0.3, self.record, i) for i in range(200)]
+        for timer in timers[1::2]:
+            timer.cancel()
+            timer.cancel()
+        self.assertEqual(len(wheel), 100)
+        self.loop.advance(100.0)
+        self.assertEqual([i for i, _ in self.calls], list(range(0, 200, 2)))
+        timers[0].cancel()
+        self.assertEqual(len(wheel), 0)
+
+    def test_pending_calls(self):
+        wheel = TimerWheel(resolution=0.1, slots=4, levels=2)
+        late = wheel.schedule(2.0, self.record, 'late')
+        wheel.schedule(0.5, self.record, 'early').cancel()
+        soon = wheel.schedule(0.3, self.record, 'soon')
+        self.loop.advance(0.2)
+        calls = wheel._pending_calls()
+        self.assertEqual([timer for _, timer in calls], [soon, late])
+        self.assertAlmostEqual(calls[0][0], 0.1)
+        self.assertAlmostEqual(calls[1][0], 1.8)
+
+    def test_callbacks_may_schedule_calls(self):
+        wheel = TimerWheel(resolution=0.1)
+
+        def repeat(count):
+            self.record(count)
+            if count:
+                wheel.schedule(0.0, repeat, count - 1)
+        wheel.schedule(0.0, repeat, 3)
+        self.loop.advance(1.0)
+        self.assertEqual([count for count, _ in self.calls], [3, 2, 1, 0])
+        self.assertEqual(len(set(when for _, when in self.calls)), 4)
+
+    def test_exception_in_callback(self):
+        wheel = TimerWheel(resolution=0.1)
+        wheel.schedule(0.1, lambda: 1 / 0)
+        wheel.schedule(0.1, self.record, 'after')
+        self.loop.advance(1.0)
+        self.assertEqual(len(self.loop.errors), 1)
+        self.assertEqual([name for name, _ in self.calls], ['after'])
+
+    def test_idle_wheel_has_no_timer(self):
+        wheel = TimerWheel(resolution=0.1)
+        wheel.schedule(0.1, self.record, 'a')
+        self.loop.advance(1.0)
+        self.assertIsNone(wheel._handle)
+        self.loop.advance(1000.0)
+        start = self.loop.now
+        wheel.schedule(0.25, self.record, 'b')
+        self.loop.advance(1.0)
+        self.assertAlmostEqual(self.calls[-1][1] - start, 0.3)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            TimerWheel(resolution=0.0)
+        with self.assertRaises(ValueError):
+            TimerWheel(slots=1)
+        with self.assertRaises(ValueError):
+            TimerWheel(levels=0)
+        with self.assertRaises(ValueError):
+            TimerWheel().schedule(-1.0, self.record)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# Copyright (c) 2014 Tobias Marquardt
+#
+# Distributed under terms of the (2-clause) BSD license.
+
+import random
+import re
+import unittest
+
+from fredirc.triggers import TriggerEngine
+
+
+def _ignore(channel, message, sender, match):
+    pass
+
+
+class TriggerEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = TriggerEngine()
+
+    def test_keywords_match_like_find(self):
+        # A small alphabet yields many keywords that are suffixes of others,
+        # which have to be linked while keywords are added between scans
+        random.seed(1)
+        keywords = {}
+        for _ in range(300):
+            keyword = ''.join(random.choice('abc')
+                              for _ in range(random.randint(1, 6)))
+            keywords[self.engine.add_keyword(keyword, _ignore)] = keyword
+            if random.random() < 0.2:
+                trigger_id = random.choice(list(keywords))
+                self.engine.remove(trigger_id)
+                del keywords[trigger_id]
+            message = ''.join(random.choice('abcd') for _ in range(30))
+            expected = sorted((trigger_id, keyword)
+                              for trigger_id, keyword in keywords.items()
+                              if keyword in message)
+            self.assertEqual(self.engine.scan(message.upper()), expected)
+
+    def test_whole_word(self):
+        trigger_id = self.engine.add_keyword('cat', _ignore, whole_word=True)
+        self.assertEqual(self.engine.scan('the cat.'), [(trigger_id, 'cat')])
+        self.assertEqual(self.engine.scan('Cat'), [(trigger_id, 'cat')])
+        self.assertEqual(self.engine.scan('concatenate'), [])
+
+    def test_channels(self):
+        everywhere = self.engine.add_keyword('foo', _ignore)
+        only_a = self.engine.add_keyword('foo', _ignore, channels=['#A'])
+        regex = self.engine.add_regex('ba+r', _ignore, channels=['#a', '#b'])
+        self.assertEqual(self.engine.scan('foo baar', '#a')[:2],
+                         [(everywhere, 'foo'), (only_a, 'foo')])
+        self.assertEqual(self.engine.scan('foo baar', '#b')[0],
+                         (everywhere, 'foo'))
+        self.assertEqual(self.engine.scan('baar', '#b')[0][0], regex)
+        self.assertEqual(self.engine.scan('foo baar'),
+                         [(everywhere, 'foo')])
+        self.engine.remove(only_a)
+        self.engine.remove(regex)
+        self.assertEqual(self.engine.scan('foo baar', '#a'),
+                         [(everywhere, 'foo')])
+
+    def test_regexes(self):
+        ids = [self.engine.add_regex(r'x{}y'.format(i), _ignore)
+               for i in range(250)]
+        backreference = self.engine.add_regex(r'(\w)\1', _ignore)
+        matches = self.engine.scan('X7Y and x123y')
+        self.assertEqual([trigger_id for trigger_id, _ in matches],
+                         [ids[7], ids[123]])
+        self.assertEqual(self.engine.scan('aa')[0][0], backreference)
+        self.engine.remove(ids[7])
+        self.assertEqual(self.engine.scan('x7y'), [])
+        with self.assertRaises(re.error):
+            self.engine.add_regex('(', _ignore)
+
+    def test_handle_channel_message(self):
+        calls = []
+        first = self.engine.add_keyword(
+            'hi', lambda *args: (calls.append(args),
+                                 self.engine.remove(second)))
+        second = self.engine.add_keyword('hi', lambda *args: calls.append(1))
+        self.engine.handle_channel_message('#a', 'hi there', 'nick')
+        self.assertEqual(calls, [('#a', 'hi there', 'nick', 'hi')])
+        self.engine.remove(first)
+        self.assertEqual(self.engine.scan('hi'), [])
+
+    def test_empty_keyword(self):
+        with self.assertRaises(ValueError):
+            self.engine.add_keyword('', _ignore)
+
+
+if __name__ == '__main__':
+    unittest.main()